@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Benchmarks for the shell's parser, command lookup, completion,
+command dispatch, buffered console output and the file commands cat,
+grep, wc, printhex and ls. All inputs are generated in a temporary
+directory, so the results are reproducible. Results are written as
+JSON and can be compared with those of an earlier run.
+
+Runs on any system with Python 2.7, Pythonista's console and editor
+modules are not needed.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import imp
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIN = os.path.join(ROOT, "bin")
+USR_BIN = os.path.join(ROOT, "usr", "bin")
+
+sys.path.insert(0, BIN)
+sh = imp.load_source("sh", os.path.join(BIN, "sh.py"))
+
+import _shcomplete
+import _shhash
+import _shio
+import _shregistry
+
+# Command lines for the parser benchmarks
+PARSE_LINES = {
+    "short": "ls -l /tmp",
+    "long": "echo " + " ".join("word{}".format(i) for i in range(500)),
+    "quoted": "echo " + " ".join("'single {0}' \"double {0}\" back\\ slash\\ {0}".format(i) for i in range(150)),
+    "variables": "echo " + " ".join("$HOME ${BENCHVAR}x \"$BENCHVAR/$HOME\"" for i in range(150)),
+}
+
+SIZES = [10000, 100000] # Lines and directory entries for the file benchmarks
+FULL_SIZES = SIZES + [1000000]
+
+class NullWriter(object):
+    """Output stream that only counts the bytes written to it and the
+    write calls.
+    """
+    
+    encoding = "utf-8"
+    
+    def __init__(self):
+        self.count = 0
+        self.calls = 0
+    
+    def write(self, data):
+        self.count += len(data)
+        self.calls += 1
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        pass
+    
+    def isatty(self):
+        return False
+
+def measure(func, repeat, number=1):
+    """Call func number times, repeat times over, and return the best
+    and median time per call in seconds.
+    """
+    
+    times = sorted(t / number for t in timeit.repeat(func, repeat=repeat, number=number))
+    return {"best": times[0], "median": times[len(times) // 2], "repeat": repeat, "number": number}
+
+def run_quiet(filename, args):
+    """Run the command script at filename with stdout discarded,
+    ignoring its SystemExit.
+    """
+    
+    old = sys.stdout.redirect(NullWriter())
+    try:
+        _shregistry.run(filename, args)
+    except SystemExit:
+        pass
+    finally:
+        sys.stdout.redirect(old)
+
+def bench_parse(results, repeat):
+    os.environ["BENCHVAR"] = "value"
+    for name, line in sorted(PARSE_LINES.items()):
+        def parse(line=line):
+            # Clear the lexer cache, so every call lexes again
+            sh._lexcache.clear()
+            sh.parse_cmd(line)
+        results["parse_cmd/" + name] = measure(parse, repeat, number=20)
+        results["parse_cmd/" + name + "/cached"] = measure(lambda line=line: sh.parse_cmd(line), repeat, number=20)
+
+def bench_find_in_path(results, tmp, repeat):
+    # 200 directories, every fourth missing, the command is in the last
+    dirs = [os.path.join(tmp, "path", "d{:03d}".format(i)) for i in range(200)]
+    for i, d in enumerate(dirs):
+        if i % 4:
+            os.makedirs(d)
+            for j in range(20):
+                open(os.path.join(d, "cmd{}_{}.py".format(i, j)), "w").close()
+    open(os.path.join(dirs[-1], "target.py"), "w").close()
+    
+    old_path = os.environ.get("PATH", "")
+    os.environ["PATH"] = os.pathsep.join(dirs)
+    try:
+        def cold():
+            _shhash.CommandHash().resolve("target")
+        results["find_in_path/cold"] = measure(cold, repeat)
+        table = _shhash.CommandHash()
+        results["find_in_path/hashed"] = measure(lambda: table.resolve("target"), repeat, number=100)
+        results["find_in_path/missing"] = measure(lambda: table.resolve("nosuchcommand"), repeat, number=10)
+    finally:
+        os.environ["PATH"] = old_path
+
+def bench_complete(results, tmp, repeat):
+    # 50 directories of 100 commands each, 10000 names with the .py forms
+    dirs = [os.path.join(tmp, "complete", "d{:02d}".format(i)) for i in range(50)]
+    for i, d in enumerate(dirs):
+        os.makedirs(d)
+        for j in range(100):
+            open(os.path.join(d, "cmd{}_{}.py".format(i, j)), "w").close()
+    
+    completer = _shcomplete.Completer(lambda: dirs)
+    results["complete/cold"] = measure(lambda: _shcomplete.Completer(lambda: dirs).refresh(), repeat)
+    completer.refresh()
+    results["complete/refresh"] = measure(completer.refresh, repeat, number=100)
+    results["complete/command"] = measure(lambda: completer.complete("cmd4_"), repeat, number=100)
+    results["complete/path"] = measure(lambda: completer.complete("ls " + dirs[0] + "/cmd0_1"), repeat, number=100)
+
+def bench_dispatch(results, tmp, repeat):
+    bindir = os.path.join(tmp, "dispatch")
+    os.makedirs(bindir)
+    with open(os.path.join(bindir, "noop.py"), "w") as f:
+        f.write("def main(args):\n    pass\n")
+    with open(os.path.join(bindir, "noscript.py"), "w") as f:
+        f.write("x = 1\n")
+    
+    # PATH is cleared, it may contain system commands with the same names
+    old_paths = os.environ.get("PYPATH", ""), os.environ.get("PATH", "")
+    os.environ["PYPATH"] = os.pathsep.join([bindir, BIN, USR_BIN])
+    os.environ["PATH"] = ""
+    old = sys.stdout.redirect(NullWriter())
+    try:
+        commands = [("noop", ["x"]), ("noscript", ["x"]), ("echo", ["x"]),
+                    ("pwd", []), ("touch", ["-c", os.path.join(bindir, "noop.py")])]
+        for name, args in commands:
+            results["dispatch/" + name] = measure(lambda: sh.run_command([name] + args), repeat, number=50)
+        results["dispatch/parse+run"] = measure(
+            lambda: sh.run_pipeline(sh.parse_pipeline("noop a b c")), repeat, number=50)
+    finally:
+        sys.stdout.redirect(old)
+        os.environ["PYPATH"], os.environ["PATH"] = old_paths
+
+def bench_console(results, tmp, repeat):
+    # A command printing many small pieces, and cat writing large blocks
+    printer = os.path.join(tmp, "printlines.py")
+    with open(printer, "w") as f:
+        f.write("for i in range(10000):\n    print('line', i, 'of the console benchmark')\n")
+    textfile = os.path.join(tmp, "console.txt")
+    with open(textfile, "wb") as f:
+        f.writelines(b"line %d of the console benchmark\n" % i for i in range(10000))
+    cat = os.path.join(BIN, "cat.py")
+    
+    for name, filename, args in [("print", printer, []), ("cat-n", cat, ["-n", textfile])]:
+        for mode in ("direct", "buffered"):
+            console = NullWriter()
+            def run(mode=mode, filename=filename, args=args):
+                console.calls = 0
+                if mode == "buffered":
+                    stream = _shio.ConsoleWriter(console, timed=False, stats=_shio.ConsoleStats())
+                else:
+                    stream = console
+                old = sys.stdout.redirect(stream)
+                try:
+                    _shregistry.run(filename, args)
+                except SystemExit:
+                    pass
+                finally:
+                    sys.stdout.redirect(old)
+                    stream.flush()
+            result = measure(run, repeat)
+            result["console_writes"] = console.calls
+            results["console/{}/{}".format(name, mode)] = result
+
+def bench_files(results, tmp, sizes, repeat):
+    cat = os.path.join(BIN, "cat.py")
+    grep = os.path.join(BIN, "grep.py")
+    wc = os.path.join(BIN, "wc.py")
+    printhex = os.path.join(USR_BIN, "printhex.py")
+    ls = os.path.join(BIN, "ls.py")
+    
+    for size in sizes:
+        textfile = os.path.join(tmp, "lines{}.txt".format(size))
+        with open(textfile, "wb") as f:
+            f.writelines(b"line %d of the benchmark file, with some text\n" % i for i in range(size))
+        mb = os.path.getsize(textfile) / 1024 / 1024
+        
+        for name, args in [("cat", [textfile]), ("cat-r", ["-r", textfile]), ("cat-n", ["-n", textfile])]:
+            result = measure(lambda: run_quiet(cat, args), repeat)
+            result["mb_per_s"] = mb / result["best"]
+            results["{}/{}".format(name, size)] = result
+        
+        for name, command, args in [("grep-F", grep, ["-F", "line 5", textfile]),
+                                    ("grep-E", grep, ["-n", r"line \d+5 of", textfile]),
+                                    ("wc", wc, [textfile]), ("wc-l", wc, ["-l", textfile])]:
+            result = measure(lambda: run_quiet(command, args), repeat)
+            result["mb_per_s"] = mb / result["best"]
+            results["{}/{}".format(name, size)] = result
+        
+        # printhex output is much bigger than its input, so only dump a
+        # part of the file
+        length = min(os.path.getsize(textfile), size * 16)
+        result = measure(lambda: run_quiet(printhex, ["-n", unicode(length), textfile]), repeat)
+        result["mb_per_s"] = length / 1024 / 1024 / result["best"]
+        results["printhex/{}".format(size)] = result
+        
+        listdir = os.path.join(tmp, "dir{}".format(size))
+        os.makedirs(listdir)
+        for i in range(size):
+            open(os.path.join(listdir, "file{:07d}".format(i)), "w").close()
+        for name, args in [("ls", [listdir]), ("ls-F", ["-F", listdir]), ("ls-l", ["-l", listdir])]:
+            result = measure(lambda: run_quiet(ls, args), repeat)
+            result["entries_per_s"] = size / result["best"]
+            results["{}/{}".format(name, size)] = result
+
+def metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT).strip().decode("ascii")
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(results, old):
+    """Print the change of every benchmark's best time against the old
+    results.
+    """
+    
+    for name, result in sorted(results.items()):
+        if name in old:
+            change = (result["best"] / old[name]["best"] - 1) * 100
+            print("{:<32} {:>10.6f}s {:>+8.1f}%".format(name, result["best"], change), file=sys.stderr)
+        else:
+            print("{:<32} {:>10.6f}s      new".format(name, result["best"]), file=sys.stderr)
+
+def main(args):
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("-o", "--output", action="store", type=unicode,
+                   help="write the JSON results to this file instead of stdout")
+    p.add_argument("-c", "--compare", action="store", type=unicode,
+                   help="compare with the results in this JSON file")
+    p.add_argument("-r", "--repeat", action="store", default=5, type=int,
+                   help="number of measurements per benchmark, defaults to 5")
+    p.add_argument("--full", action="store_true",
+                   help="include files and directories with 1M lines and entries")
+    p.add_argument("-k", "--only", action="store", nargs="+", default=None,
+                   choices=["parse", "path", "complete", "dispatch", "console", "files"],
+                   help="only run these groups of benchmarks")
+    ns = p.parse_args(args)
+    
+    groups = ns.only or ["parse", "path", "complete", "dispatch", "console", "files"]
+    streams = _shio.install()
+    tmp = tempfile.mkdtemp(prefix="shbench")
+    old_cwd = os.getcwd()
+    results = {}
+    try:
+        os.chdir(tmp)
+        if "parse" in groups:
+            bench_parse(results, ns.repeat)
+        if "path" in groups:
+            bench_find_in_path(results, tmp, ns.repeat)
+        if "complete" in groups:
+            bench_complete(results, tmp, ns.repeat)
+        if "dispatch" in groups:
+            bench_dispatch(results, tmp, ns.repeat)
+        if "console" in groups:
+            bench_console(results, tmp, ns.repeat)
+        if "files" in groups:
+            bench_files(results, tmp, FULL_SIZES if ns.full else SIZES, ns.repeat)
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(tmp)
+        sys.stdin, sys.stdout, sys.stderr = streams
+    
+    output = json.dumps({"meta": metadata(), "results": results}, indent=2, sort_keys=True)
+    if ns.output:
+        with open(ns.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    
+    if ns.compare:
+        with open(ns.compare) as f:
+            compare(results, json.load(f)["results"])
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Fast argument parsing for commands.
+
+A command creates its Parser once at module level and declares its
+options with add_argument, using the same arguments as argparse.
+Commands with a main function stay loaded, so the parser is only built
+once, and parse_args handles the common cases (flags, options with a
+value, combined short flags and plain positional arguments) without
+argparse.
+
+argparse is only imported and the equivalent ArgumentParser built when
+it is needed: for -h and --help, for errors, so their messages are the
+usual ones, and for anything the fast parser doesn't understand, like
+abbreviated long options.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import os
+import sys
+import threading
+
+# Actions and positional nargs the fast parser handles, anything else is
+# always parsed by argparse
+FAST_ACTIONS = {"store", "store_true", "store_false", "store_const", "append", "count"}
+MIN_NARGS = {None: 1, "?": 0, "*": 0, "+": 1}
+
+class _Fallback(Exception):
+    """Raised when the arguments need to be parsed by argparse.
+    """
+
+class Namespace(object):
+    """Parsed arguments as attributes, like argparse.Namespace.
+    """
+    
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+    
+    def __repr__(self):
+        return "Namespace({})".format(", ".join(
+            "{}={!r}".format(name, value) for name, value in sorted(self.__dict__.items())
+        ))
+    
+    def __eq__(self, other):
+        return vars(self) == vars(other)
+    
+    def __ne__(self, other):
+        return not self == other
+    
+    def __contains__(self, name):
+        return name in self.__dict__
+
+class Argument(object):
+    """One option or positional argument, from the arguments of
+    add_argument.
+    """
+    
+    def __init__(self, names, kwargs):
+        self.names = names
+        self.action = kwargs.get("action", "store")
+        self.nargs = kwargs.get("nargs")
+        self.type = kwargs.get("type")
+        self.choices = kwargs.get("choices")
+        self.const = kwargs.get("const")
+        self.required = kwargs.get("required", False)
+        self.positional = not names[0].startswith("-")
+        
+        if self.positional:
+            self.dest = names[0]
+        elif "dest" in kwargs:
+            self.dest = kwargs["dest"]
+        else:
+            long = [name for name in names if name.startswith("--")]
+            self.dest = (long or names)[0].lstrip("-").replace("-", "_")
+        
+        if "default" in kwargs:
+            default = kwargs["default"]
+        elif self.action == "store_true":
+            default = False
+        elif self.action == "store_false":
+            default = True
+        else:
+            default = None
+        if isinstance(default, basestring) and self.type is not None:
+            # argparse converts string defaults as well
+            default = self.type(default)
+        self.default = default
+        
+        if self.action not in FAST_ACTIONS:
+            self.fast = False
+        elif self.positional:
+            self.fast = self.action == "store" and (self.nargs in MIN_NARGS or isinstance(self.nargs, int))
+        else:
+            self.fast = self.nargs is None
+    
+    @property
+    def takes_value(self):
+        return self.action in ("store", "append")
+    
+    def convert(self, value):
+        """Convert a string from the command line, raising _Fallback if
+        it is invalid.
+        """
+        
+        if self.type is not None:
+            try:
+                value = self.type(value)
+            except (TypeError, ValueError):
+                raise _Fallback()
+        if self.choices is not None and value not in self.choices:
+            raise _Fallback()
+        return value
+
+class Parser(object):
+    """Drop-in replacement for argparse.ArgumentParser that only uses
+    argparse when it has to. kwargs are passed to ArgumentParser.
+    
+    Without a prog argument, the program name in usage and error
+    messages is the name of the file that creates the parser. Commands
+    in pipelines and jobs run without setting sys.argv, so it can't be
+    taken from there like argparse does.
+    """
+    
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        if "prog" not in kwargs:
+            filename = sys._getframe(1).f_globals.get("__file__")
+            if filename:
+                kwargs["prog"] = os.path.basename(filename)
+        self.calls = []
+        self.options = {}
+        self.positionals = []
+        self.arguments = []
+        self.fast = True
+        self._argparser = None
+        self._lock = threading.Lock()
+    
+    def add_argument(self, *names, **kwargs):
+        """Declare an option or positional argument, see
+        argparse.ArgumentParser.add_argument.
+        """
+        
+        self.calls.append((names, kwargs))
+        self._argparser = None
+        
+        arg = Argument(names, kwargs)
+        self.arguments.append(arg)
+        self.fast = self.fast and arg.fast
+        if arg.positional:
+            self.positionals.append(arg)
+        else:
+            for name in names:
+                self.options[name] = arg
+    
+    def argparser(self):
+        """Return the equivalent argparse.ArgumentParser, building it the
+        first time.
+        """
+        
+        with self._lock:
+            if self._argparser is None:
+                import argparse
+                
+                parser = argparse.ArgumentParser(**self.kwargs)
+                for names, kwargs in self.calls:
+                    parser.add_argument(*names, **kwargs)
+                self._argparser = parser
+        
+        if "prog" not in self.kwargs:
+            # Created outside a file, like a new ArgumentParser
+            self._argparser.prog = os.path.basename(sys.argv[0])
+        return self._argparser
+    
+    def error(self, message):
+        """Print the usage and message to stderr and exit with status 2.
+        """
+        
+        self.argparser().error(message)
+    
+    def print_help(self, file=None):
+        self.argparser().print_help(file)
+    
+    def parse_args(self, args=None):
+        """Parse the list of strings args, sys.argv[1:] by default, and
+        return a Namespace. Exits like argparse for errors and --help.
+        """
+        
+        if args is None:
+            args = sys.argv[1:]
+        if self.fast:
+            try:
+                return self._parse(args)
+            except _Fallback:
+                pass
+        return self.argparser().parse_args(args)
+    
+    def _store(self, values, arg, value):
+        if arg.action == "store":
+            values[arg.dest] = arg.convert(value)
+        elif arg.action == "append":
+            values[arg.dest] = list(values[arg.dest] or []) + [arg.convert(value)]
+        elif arg.action == "store_true":
+            values[arg.dest] = True
+        elif arg.action == "store_false":
+            values[arg.dest] = False
+        elif arg.action == "store_const":
+            values[arg.dest] = arg.const
+        elif arg.action == "count":
+            values[arg.dest] = (values[arg.dest] or 0) + 1
+    
+    def _parse(self, args):
+        values = {}
+        for arg in self.arguments:
+            # The first default for a dest wins, as in argparse
+            values.setdefault(arg.dest, list(arg.default) if isinstance(arg.default, list) else arg.default)
+        seen = set()
+        
+        # Positional arguments in more than one group are matched
+        # differently by argparse, they are left to it
+        strings = []
+        groups = 0
+        last_positional = False
+        
+        i = 0
+        while i < len(args):
+            string = args[i]
+            i += 1
+            
+            if string == "--":
+                # argparse has its own idea of how -- is matched
+                raise _Fallback()
+            elif not string.startswith("-") or string == "-":
+                groups += not last_positional
+                last_positional = True
+                strings.append(string)
+                continue
+            
+            last_positional = False
+            if string.startswith("--"):
+                name, eq, value = string.partition("=")
+                arg = self.options.get(name)
+                if arg is None or bool(eq) and not arg.takes_value:
+                    raise _Fallback()
+                if arg.takes_value and not eq:
+                    if i >= len(args) or args[i].startswith("-"):
+                        raise _Fallback()
+                    value = args[i]
+                    i += 1
+                self._store(values, arg, value)
+                seen.add(arg)
+            else:
+                # One or more short options, the last may have a value
+                for j in range(1, len(string)):
+                    arg = self.options.get("-" + string[j])
+                    if arg is None:
+                        raise _Fallback()
+                    seen.add(arg)
+                    if arg.takes_value:
+                        value = string[j+1:]
+                        if not value:
+                            if i >= len(args) or args[i].startswith("-"):
+                                raise _Fallback()
+                            value = args[i]
+                            i += 1
+                        self._store(values, arg, value)
+                        break
+                    self._store(values, arg, None)
+        
+        if groups > 1:
+            raise _Fallback()
+        
+        for arg in self.arguments:
+            if arg.required and arg not in seen:
+                raise _Fallback()
+        
+        self._assign(values, strings)
+        return Namespace(**values)
+    
+    def _assign(self, values, strings):
+        """Distribute the positional strings over the positional
+        arguments, each taking as many as it can while leaving enough
+        for the following ones.
+        """
+        
+        mins = [arg.nargs if isinstance(arg.nargs, int) else MIN_NARGS[arg.nargs] for arg in self.positionals]
+        pos = 0
+        for k, arg in enumerate(self.positionals):
+            available = len(strings) - pos - sum(mins[k+1:])
+            if available < mins[k]:
+                raise _Fallback()
+            
+            if arg.nargs is None or isinstance(arg.nargs, int):
+                count = mins[k]
+            elif arg.nargs == "?":
+                count = min(available, 1)
+            else:
+                count = available
+            
+            chunk = [arg.convert(string) for string in strings[pos:pos+count]]
+            pos += count
+            
+            if arg.nargs is None:
+                values[arg.dest] = chunk[0]
+            elif arg.nargs == "?":
+                if chunk:
+                    values[arg.dest] = chunk[0]
+            elif chunk or values[arg.dest] is None:
+                values[arg.dest] = chunk
+        
+        if pos < len(strings):
+            # Unrecognized arguments
+            raise _Fallback()
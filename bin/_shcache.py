@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Cache of compiled code objects for scripts run by the shell.
+
+Code objects are kept in a bounded LRU cache keyed by the script's
+absolute path, modification time and size, so a script is recompiled
+only when it has been changed. If the SHCACHE environment variable
+names a directory, compiled code is also stored there in marshal
+format, so a freshly started shell does not have to recompile
+everything.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import hashlib
+import imp
+import marshal
+import os
+import threading
+
+MAXSIZE = 128 # Maximum number of code objects kept in memory
+MAGIC = imp.get_magic() # Marks disk cache files of this Python version
+
+class CodeCache(object):
+    """Bounded LRU cache of code objects compiled from script files.
+    """
+    
+    def __init__(self, maxsize=MAXSIZE):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.diskhits = 0
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    @property
+    def cachedir(self):
+        """The on-disk cache directory, or None if disabled.
+        """
+        return os.environ.get("SHCACHE", "") or None
+    
+    def get(self, filename):
+        """Return the code object for the script at filename, compiling
+        it if it is not cached or the file has changed since.
+        """
+        
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        key = (path, st.st_mtime, st.st_size)
+        
+        with self.lock:
+            code = self.entries.pop(key, None)
+            if code is not None:
+                # Re-insert to mark as most recently used
+                self.entries[key] = code
+                self.hits += 1
+                return code
+            self.misses += 1
+        
+        code = self._load(key)
+        if code is None:
+            with open(path, "rU") as f:
+                code = compile(f.read(), path, "exec", dont_inherit=True)
+            self._store(key, code)
+        else:
+            with self.lock:
+                self.diskhits += 1
+        
+        with self.lock:
+            # Drop outdated entries for the same file
+            for old in [k for k in self.entries if k[0] == path]:
+                del self.entries[old]
+            self.entries[key] = code
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        
+        return code
+    
+    def clear(self, disk=False):
+        """Remove all entries from the cache. If disk is true, the
+        on-disk cache files are deleted as well.
+        """
+        
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.diskhits = 0
+        
+        if disk and self.cachedir and os.path.isdir(self.cachedir):
+            for name in os.listdir(self.cachedir):
+                if name.endswith(".shc"):
+                    os.remove(os.path.join(self.cachedir, name))
+    
+    def _diskpath(self, path):
+        digest = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        return os.path.join(self.cachedir, digest + ".shc")
+    
+    def _load(self, key):
+        """Load the code object for key from the disk cache, or return
+        None if there is no valid cache file.
+        """
+        
+        if not self.cachedir:
+            return None
+        
+        try:
+            with open(self._diskpath(key[0]), "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                if tuple(marshal.load(f)) != key:
+                    return None
+                return marshal.load(f)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+    
+    def _store(self, key, code):
+        """Write code to the disk cache, if enabled. Failures are
+        ignored, the disk cache is only an optimization.
+        """
+        
+        if not self.cachedir:
+            return
+        
+        diskpath = self._diskpath(key[0])
+        tmppath = "{}.{}.tmp".format(diskpath, os.getpid())
+        try:
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir)
+            with open(tmppath, "wb") as f:
+                f.write(MAGIC)
+                marshal.dump(key, f)
+                marshal.dump(code, f)
+            os.rename(tmppath, diskpath)
+        except (IOError, OSError):
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+
+# Shared by the shell and all commands running in it
+cache = CodeCache()
+
+def compile_file(filename):
+    """Return the (possibly cached) code object for the script at
+    filename.
+    """
+    return cache.get(filename)
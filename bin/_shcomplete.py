@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Completion of command names and paths for the interactive shell.
+
+Command names come from all directories of the command search path, as
+both name and name.py, and are kept in a prefix trie. Before every
+completion the directories are checked, and only those whose
+modification time changed are listed again, so a completion costs one
+stat per directory plus the trie lookup. Names starting with _ or . are
+support modules and hidden files and are left out, as are compiled
+.pyc and .pyo files.
+
+Paths are completed from the listing of the directory being typed in,
+which is kept in a trie of its own as long as the directory doesn't
+change. Directories get a trailing /.
+
+Completer.complete is the entry point for a line editor. On platforms
+with the readline module, install_readline binds it to Tab, and
+read_line reads a line with it.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import os
+import re
+import sys
+import threading
+
+import _shfs
+import _shhash
+
+MAXDIRS = 64 # Number of directory listings kept for path completion
+BOUNDARY = " |<>&" # Characters that end a word on the command line
+SPECIAL_RE = re.compile(r"""([\\ '"|<>&])""") # Characters to escape in completions
+ESCAPED_RE = re.compile(r"\\(.)")
+
+class _Node(object):
+    __slots__ = ("children", "count", "word")
+    
+    def __init__(self):
+        self.children = {}
+        self.count = 0
+        self.word = None
+
+class Trie(object):
+    """Prefix tree of strings. A string can be added several times and
+    stays in the trie until it has been discarded as often. Results of
+    complete are cached until the trie changes.
+    """
+    
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+        self.cache = {}
+    
+    def __len__(self):
+        return self.size
+    
+    def _find(self, word):
+        node = self.root
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+    
+    def __contains__(self, word):
+        node = self._find(word)
+        return node is not None and node.count > 0
+    
+    def add(self, word):
+        node = self.root
+        for char in word:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+        node.count += 1
+        if node.count == 1:
+            node.word = word
+            self.size += 1
+            self.cache.clear()
+    
+    def discard(self, word):
+        path = []
+        node = self.root
+        for char in word:
+            child = node.children.get(char)
+            if child is None:
+                return
+            path.append((node, char))
+            node = child
+        if node.count == 0:
+            return
+        
+        node.count -= 1
+        if node.count:
+            return
+        node.word = None
+        self.size -= 1
+        self.cache.clear()
+        # Remove the nodes that no longer lead anywhere
+        for parent, char in reversed(path):
+            child = parent.children[char]
+            if child.count or child.children:
+                break
+            del parent.children[char]
+    
+    def complete(self, prefix):
+        """Return a sorted list of all strings starting with prefix.
+        """
+        
+        try:
+            return list(self.cache[prefix])
+        except KeyError:
+            pass
+        
+        words = []
+        node = self._find(prefix)
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            if node.count:
+                words.append(node.word)
+            stack.extend(node.children.values())
+        words.sort()
+        self.cache[prefix] = words
+        return list(words)
+
+def common_prefix(words):
+    """Return the longest common prefix of words.
+    """
+    
+    if not words:
+        return ""
+    first, last = min(words), max(words)
+    i = 0
+    while i < len(first) and i < len(last) and first[i] == last[i]:
+        i += 1
+    return first[:i]
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, UnicodeError):
+        return None
+
+def _command_names(path):
+    """Return the set of command names for the files in directory path.
+    """
+    
+    names = set()
+    try:
+        for entry in _shfs.scandir(path):
+            if entry.name.startswith(("_", ".")) or entry.name.endswith((".pyc", ".pyo")):
+                continue
+            try:
+                if entry.is_dir():
+                    continue
+            except OSError:
+                continue
+            names.add(entry.name)
+            if entry.name.endswith(".py"):
+                names.add(entry.name[:-3])
+    except (OSError, UnicodeError):
+        pass
+    return frozenset(names)
+
+def _escape(word):
+    # Checking first is much faster for the common case of nothing to escape
+    return SPECIAL_RE.sub(r"\\\1", word) if SPECIAL_RE.search(word) else word
+
+def _word_start(text):
+    """Return the index where the last word in text starts. Backslash
+    escapes are respected, quotes are not.
+    """
+    
+    start = 0
+    i = 0
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] in BOUNDARY:
+            start = i + 1
+        i += 1
+    return min(start, len(text))
+
+class Completer(object):
+    """Completes command names from the directories returned by
+    searchpath, and paths relative to the current directory.
+    """
+    
+    def __init__(self, searchpath=None):
+        self.searchpath = searchpath or _shhash.table.searchpath
+        self.commands = Trie()
+        self.dirs = {} # Directory -> (mtime, command names)
+        self.listings = collections.OrderedDict() # Directory -> (mtime, trie)
+        self.lock = threading.Lock()
+        self.relisted = 0
+    
+    def refresh(self):
+        """Update the command trie for changes of the search path and of
+        the directories in it. Returns the number of directories that
+        were listed again.
+        """
+        
+        relisted = 0
+        with self.lock:
+            seen = set()
+            for path in self.searchpath():
+                if isinstance(path, bytes):
+                    # Unicode paths make the listings unicode too
+                    path = path.decode(sys.getfilesystemencoding() or "utf-8", "replace")
+                path = os.path.abspath(path)
+                if path in seen:
+                    continue
+                seen.add(path)
+                
+                mtime = _mtime(path)
+                old = self.dirs.get(path)
+                if old is not None and old[0] == mtime:
+                    continue
+                names = _command_names(path) if mtime is not None else frozenset()
+                oldnames = old[1] if old is not None else frozenset()
+                for name in oldnames - names:
+                    self.commands.discard(name)
+                for name in names - oldnames:
+                    self.commands.add(name)
+                self.dirs[path] = (mtime, names)
+                relisted += 1
+            
+            # Directories that are no longer searched
+            for path in set(self.dirs) - seen:
+                for name in self.dirs.pop(path)[1]:
+                    self.commands.discard(name)
+            
+            self.relisted += relisted
+        return relisted
+    
+    def complete_command(self, prefix):
+        """Return the sorted command names starting with prefix.
+        """
+        
+        self.refresh()
+        with self.lock:
+            return self.commands.complete(prefix)
+    
+    def _listing(self, directory):
+        """Return a trie of the names in directory, with a / after those
+        of directories, listing it only if it has changed.
+        """
+        
+        directory = os.path.abspath(directory)
+        mtime = _mtime(directory)
+        with self.lock:
+            cached = self.listings.pop(directory, None)
+            if cached is not None and cached[0] == mtime:
+                self.listings[directory] = cached
+                return cached[1]
+        
+        trie = Trie()
+        if mtime is not None:
+            try:
+                for entry in _shfs.scandir(directory):
+                    try:
+                        isdir = entry.is_dir()
+                    except OSError:
+                        isdir = False
+                    trie.add(entry.name + "/" if isdir else entry.name)
+            except (OSError, UnicodeError):
+                pass
+        
+        with self.lock:
+            self.listings[directory] = (mtime, trie)
+            while len(self.listings) > MAXDIRS:
+                self.listings.popitem(last=False)
+            self.relisted += 1
+        return trie
+    
+    def complete_path(self, prefix):
+        """Return the sorted paths starting with prefix. Hidden files are
+        only included if the name being completed starts with a dot.
+        """
+        
+        name = prefix.rpartition("/")[2]
+        dirpart = prefix[:len(prefix) - len(name)]
+        names = self._listing(os.path.expanduser(dirpart) if dirpart else os.curdir).complete(name)
+        if not name.startswith("."):
+            names = [n for n in names if not n.startswith(".")]
+        return [dirpart + n for n in names]
+    
+    def complete(self, line, cursor=None):
+        """Complete the word before position cursor (the end by default)
+        in line. The first word of a command is completed as a command
+        name, unless it contains a /, all others as paths. Returns the
+        index where the word starts and the sorted list of completions,
+        with special characters escaped, to replace the word with.
+        """
+        
+        if cursor is None:
+            cursor = len(line)
+        before = line[:cursor]
+        start = _word_start(before)
+        word = ESCAPED_RE.sub(r"\1", before[start:])
+        previous = before[:start].rstrip()
+        
+        if (not previous or previous[-1] == "|") and "/" not in word:
+            candidates = self.complete_command(word)
+        else:
+            candidates = self.complete_path(word)
+        return start, [_escape(candidate) for candidate in candidates]
+
+# Used by the interactive shell
+completer = Completer()
+
+def install_readline(completer=completer):
+    """Make Tab complete with completer if the readline module is
+    available. Returns whether it is.
+    """
+    
+    try:
+        import readline
+    except ImportError:
+        return False
+    
+    matches = []
+    
+    def complete(text, state):
+        if state == 0:
+            line = readline.get_line_buffer()
+            start, candidates = completer.complete(line, readline.get_endidx())
+            # readline replaces only the text after its own word start
+            offset = readline.get_begidx() - start
+            matches[:] = [c[offset:] for c in candidates if c[:offset] == line[start:start+offset]]
+        return matches[state] if state < len(matches) else None
+    
+    readline.set_completer_delims(BOUNDARY + "\t\n")
+    readline.set_completer(complete)
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
+    return True
+
+_readline = False # PyOS_Readline caller, None if unavailable, False if not looked up yet
+
+def _os_readline():
+    """Return a function calling PyOS_Readline, which is what raw_input
+    uses for line editing, or None if it is not available.
+    """
+    
+    try:
+        import ctypes
+        api = ctypes.pythonapi
+        api.PyFile_AsFile.restype = ctypes.c_void_p
+        api.PyFile_AsFile.argtypes = [ctypes.py_object]
+        api.PyOS_Readline.restype = ctypes.c_void_p
+        api.PyOS_Readline.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p]
+        api.PyMem_Free.argtypes = [ctypes.c_void_p]
+    except (ImportError, AttributeError):
+        return None
+    
+    def readline(stdin, stdout, prompt):
+        # Raises KeyboardInterrupt itself, ctypes passes it on
+        line = api.PyOS_Readline(api.PyFile_AsFile(stdin), api.PyFile_AsFile(stdout), prompt)
+        try:
+            return ctypes.string_at(line)
+        finally:
+            api.PyMem_Free(line)
+    return readline
+
+def read_line(prompt):
+    """Read a line from the terminal like raw_input, with line editing
+    and completion if install_readline was successful. The line is
+    returned as unicode, decoded with the encoding of stdin.
+    
+    Python 2's raw_input only uses readline if sys.stdin and sys.stdout
+    are real files, but the shell replaces them with stream proxies.
+    Putting the real files back would make background jobs write to
+    the terminal, so PyOS_Readline is called with them directly.
+    """
+    
+    global _readline
+    
+    stdin, stdout = sys.__stdin__, sys.__stdout__
+    if _readline is False:
+        _readline = _os_readline() if "readline" in sys.modules else None
+    readline = _readline
+    encoding = getattr(stdin, "encoding", None) or "utf-8"
+    if readline is None or not (isinstance(stdin, file) and isinstance(stdout, file) and stdin.isatty()):
+        line = raw_input(prompt)
+    else:
+        sys.stdout.flush()
+        stdout.flush()
+        line = readline(stdin, stdout, prompt.encode(stdout.encoding or "utf-8", "replace"))
+        if not line:
+            raise EOFError()
+        if line.endswith(b"\n"):
+            line = line[:-1]
+    return line.decode(encoding, "replace") if isinstance(line, bytes) else line
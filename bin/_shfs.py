@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Filesystem helpers shared by commands.
+
+scandir is os.scandir if available, otherwise the scandir package, and
+as a last resort a listdir-based replacement that looks up file types
+lazily with lstat. Commands should ask the returned entries for types
+and stat results instead of calling os.stat themselves, so the
+information the directory listing already provides is not looked up
+again.
+
+The bulk file operations used by rm, cp and mv run their per-file work
+on a WorkerPool and count what they did in a Progress object. File data
+is copied by the kernel with copy_file_range or sendfile when the
+platform provides them, and in large blocks otherwise.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+WORKERS = 4 # Threads used by default for parallel file operations
+BUFSIZE = 1024 * 1024 # Buffer size for copies that go through Python
+KERNEL_COPYSIZE = 64 * 1024 * 1024 # Bytes per copy_file_range or sendfile call
+
+# Errors meaning that a kernel copy function can't be used for the files
+KERNEL_COPY_UNSUPPORTED = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.EPERM,
+    getattr(errno, "EOPNOTSUPP", errno.EINVAL), getattr(errno, "ENOTSUP", errno.EINVAL),
+}
+
+class PathEntry(object):
+    """Minimal os.DirEntry replacement for a single path. File type and
+    stat results are looked up lazily and cached.
+    """
+    
+    def __init__(self, path, name=None):
+        self.path = path
+        self.name = os.path.basename(path) if name is None else name
+        self._stat = None
+        self._lstat = None
+    
+    def __repr__(self):
+        return "<PathEntry {!r}>".format(self.name)
+    
+    def stat(self, follow_symlinks=True):
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        if not follow_symlinks or not stat.S_ISLNK(self._lstat.st_mode):
+            return self._lstat
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+    
+    def _test(self, test, follow_symlinks=True):
+        try:
+            return test(self.stat(follow_symlinks).st_mode)
+        except OSError:
+            return False
+    
+    def is_dir(self, follow_symlinks=True):
+        return self._test(stat.S_ISDIR, follow_symlinks)
+    
+    def is_file(self, follow_symlinks=True):
+        return self._test(stat.S_ISREG, follow_symlinks)
+    
+    def is_symlink(self):
+        return self._test(stat.S_ISLNK, False)
+    
+    def inode(self):
+        return self.stat(False).st_ino
+
+def _listdir_scandir(path="."):
+    """Fallback scandir implementation using os.listdir.
+    """
+    
+    for name in os.listdir(path):
+        yield PathEntry(os.path.join(path, name), name)
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = _listdir_scandir
+
+def format_size(size):
+    """Return size in bytes as a short human-readable string.
+    """
+    
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return "{:.0f} {}".format(size, unit) if unit == "bytes" else "{:.1f} {}".format(size, unit)
+
+class Progress(object):
+    """Counts the files, directories and bytes handled by a long-running
+    operation. If a stream is given, show writes the counts and rates to
+    it, at most every interval seconds unless final is true.
+    """
+    
+    def __init__(self, stream=None, interval=0.5):
+        self.stream = stream
+        self.interval = interval
+        self.files = self.dirs = self.bytes = 0
+        self.lock = threading.Lock()
+        self.start = self.shown = time.time()
+    
+    def add(self, files=0, dirs=0, size=0):
+        with self.lock:
+            self.files += files
+            self.dirs += dirs
+            self.bytes += size
+    
+    def summary(self):
+        return "{} files, {} directories, {}".format(self.files, self.dirs, format_size(self.bytes))
+    
+    def show(self, final=False):
+        if self.stream is None:
+            return
+        now = time.time()
+        if not final and now - self.shown < self.interval:
+            return
+        self.shown = now
+        elapsed = max(now - self.start, 1e-6)
+        self.stream.write("\r{} ({:.0f} files/s, {}/s)".format(
+            self.summary(), self.files / elapsed, format_size(self.bytes / elapsed),
+        ) + ("\n" if final else ""))
+
+class WorkerPool(object):
+    """Runs functions on a fixed number of threads. Worker threads have
+    no redirected streams, so exceptions raised by the functions are
+    collected in errors, or in the deque passed to submit_to, to be
+    reported by the thread that owns the pool.
+    """
+    
+    def __init__(self, workers=WORKERS, maxqueue=4096):
+        self.tasks = queue.Queue(maxqueue)
+        self.errors = collections.deque()
+        self.cond = threading.Condition()
+        self.pending = 0
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            func, args, errors = task
+            try:
+                func(*args)
+            except Exception as err:
+                errors.append(err)
+            with self.cond:
+                self.pending -= 1
+                self.cond.notify_all()
+    
+    def submit(self, func, *args):
+        """Run func(*args) on a worker thread, blocking while the queue
+        is full.
+        """
+        
+        self.submit_to(self.errors, func, *args)
+    
+    def submit_to(self, errors, func, *args):
+        """Like submit, but exceptions raised by func are appended to
+        the deque errors instead of the pool's. Callers sharing a pool
+        use this to tell their errors apart.
+        """
+        
+        with self.cond:
+            self.pending += 1
+        self.tasks.put((func, args, errors))
+    
+    def wait(self, timeout=None):
+        """Wait until all submitted functions have finished, or until
+        timeout seconds have passed. Returns whether all have finished.
+        """
+        
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while self.pending:
+                remaining = 0.1 if deadline is None else min(0.1, deadline - time.time())
+                if remaining <= 0:
+                    break
+                # Waiting with a timeout keeps KeyboardInterrupt working
+                self.cond.wait(remaining)
+            return not self.pending
+    
+    def close(self):
+        """Drop all functions that have not started yet, stop the worker
+        threads and wait for them to end. Threads still running at
+        interpreter shutdown would fail with an exception.
+        """
+        
+        try:
+            while True:
+                if self.tasks.get_nowait() is not None:
+                    with self.cond:
+                        self.pending -= 1
+        except queue.Empty:
+            pass
+        for thread in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            # Joining in steps keeps KeyboardInterrupt working
+            while thread.is_alive():
+                thread.join(0.1)
+        self.threads = []
+
+def _remove_file(entry, progress, dry_run):
+    size = entry.stat(follow_symlinks=False).st_size
+    if not dry_run:
+        os.unlink(entry.path)
+    progress.add(files=1, size=size)
+
+def remove_tree(path, pool, progress, dry_run=False, onerror=None):
+    """Delete the directory tree at path. The tree is walked with
+    scandir, files are unlinked by the worker pool and directories are
+    removed bottom-up once their contents are gone. Errors do not stop
+    the deletion, each is passed to onerror in the calling thread.
+    Returns the number of errors. With dry_run, nothing is deleted, but
+    progress counts what would be.
+    """
+    
+    errors = [0]
+    failed = collections.deque() # Errors of this tree's tasks only
+    def report():
+        while failed:
+            error(failed.popleft())
+        progress.show()
+    def error(err):
+        errors[0] += 1
+        if onerror is not None:
+            onerror(err)
+    
+    dirs = []
+    stack = [path]
+    while stack:
+        dirpath = stack.pop()
+        dirs.append(dirpath)
+        try:
+            for entry in scandir(dirpath):
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    pool.submit_to(failed, _remove_file, entry, progress, dry_run)
+        except OSError as err:
+            error(err)
+        report()
+    
+    while not pool.wait(progress.interval):
+        report()
+    report()
+    
+    # Every directory comes after its parent in dirs
+    for dirpath in reversed(dirs):
+        try:
+            if not dry_run:
+                os.rmdir(dirpath)
+            progress.add(dirs=1)
+        except OSError as err:
+            error(err)
+        progress.show()
+    
+    return errors[0]
+
+def _kernel_copy(infd, outfd):
+    """Copy everything from infd to outfd using os.copy_file_range or
+    os.sendfile, so the data does not pass through Python. Returns False
+    if neither can be used for these files, without having copied
+    anything.
+    """
+    
+    calls = []
+    if hasattr(os, "copy_file_range"):
+        calls.append(lambda offset: os.copy_file_range(infd, outfd, KERNEL_COPYSIZE, offset))
+    if hasattr(os, "sendfile"):
+        calls.append(lambda offset: os.sendfile(outfd, infd, offset, KERNEL_COPYSIZE))
+    
+    for call in calls:
+        copied = 0
+        try:
+            while True:
+                sent = call(copied)
+                if not sent:
+                    return True
+                copied += sent
+        except OSError as err:
+            if copied or err.errno not in KERNEL_COPY_UNSUPPORTED:
+                raise
+    return False
+
+def copy_file(src, dst, preserve=False, follow_symlinks=False):
+    """Copy the contents and permission bits of the file src to dst. If
+    preserve is true, access and modification times are copied as well.
+    Symlinks are copied as symlinks, unless follow_symlinks is true.
+    Returns the number of bytes copied.
+    """
+    
+    if not follow_symlinks and os.path.islink(src):
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        os.symlink(os.readlink(src), dst)
+        return 0
+    
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if not _kernel_copy(fsrc.fileno(), fdst.fileno()):
+            buf = fsrc.read(BUFSIZE)
+            while buf:
+                fdst.write(buf)
+                buf = fsrc.read(BUFSIZE)
+        size = fdst.tell()
+    
+    if preserve:
+        shutil.copystat(src, dst)
+    else:
+        shutil.copymode(src, dst)
+    return size
+
+def should_copy(src_entry, dst, mode, follow_symlinks=False):
+    """Decide whether src_entry is copied over dst according to mode:
+    "always", "no-clobber" (only if dst does not exist) or "update"
+    (only if dst does not exist or is older). follow_symlinks selects
+    whether the time of a symlink or of its target is compared.
+    """
+    
+    if mode == "always":
+        return True
+    try:
+        dst_mtime = os.lstat(dst).st_mtime
+    except OSError:
+        return True
+    return mode == "update" and src_entry.stat(follow_symlinks=follow_symlinks).st_mtime > dst_mtime
+
+def _copy_entry(entry, dst, progress, preserve):
+    size = copy_file(entry.path, dst, preserve)
+    progress.add(files=1, size=size)
+
+def copy_tree(src, dst, pool, progress, preserve=False, mode="always", onerror=None):
+    """Copy the directory tree at src to dst. Directories are created
+    while walking the tree with scandir, files are copied by the worker
+    pool. Errors do not stop the copy, each is passed to onerror in the
+    calling thread. Returns the number of errors.
+    """
+    
+    errors = [0]
+    failed = collections.deque() # Errors of this tree's tasks only
+    def report():
+        while failed:
+            error(failed.popleft())
+        progress.show()
+    def error(err):
+        errors[0] += 1
+        if onerror is not None:
+            onerror(err)
+    
+    dirs = []
+    stack = [(src, dst)]
+    while stack:
+        srcdir, dstdir = stack.pop()
+        try:
+            if not os.path.isdir(dstdir):
+                os.mkdir(dstdir)
+            dirs.append((srcdir, dstdir))
+            progress.add(dirs=1)
+            for entry in scandir(srcdir):
+                target = os.path.join(dstdir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, target))
+                elif should_copy(entry, target, mode):
+                    pool.submit_to(failed, _copy_entry, entry, target, progress, preserve)
+        except OSError as err:
+            error(err)
+        report()
+    
+    while not pool.wait(progress.interval):
+        report()
+    report()
+    
+    # Permissions and times are set bottom-up, after the contents have
+    # been written
+    for srcdir, dstdir in reversed(dirs):
+        try:
+            if preserve:
+                shutil.copystat(srcdir, dstdir)
+            else:
+                shutil.copymode(srcdir, dstdir)
+        except OSError as err:
+            error(err)
+    
+    return errors[0]
+
+def move_file(src, dst, progress):
+    """Move the file src to another file system by copying it, keeping
+    permissions and times, and deleting it afterwards.
+    """
+    
+    progress.add(files=1, size=copy_file(src, dst, preserve=True))
+    os.unlink(src)
+
+def move_tree(src, dst, pool, progress, onerror=None):
+    """Move the directory tree src to another file system using the copy
+    engine. src is only deleted if it was copied completely. Returns the
+    number of errors.
+    """
+    
+    errors = copy_tree(src, dst, pool, progress, preserve=True, onerror=onerror)
+    if not errors:
+        errors = remove_tree(src, pool, Progress(), onerror=onerror)
+    return errors
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Brace expansion and globbing for the shell.
+
+Words come from the shell's lexer together with their escape levels,
+and only characters that were not escaped at all are special. A Globber
+is created for each command line and lists every directory at most
+once, however many words are globbed in it. Matches are produced
+lazily in sorted order.
+
+Supported patterns are *, ? and [...] within a path component, ** as a
+whole component for any number of directories, and {a,b} alternatives.
+As with bash's globstar, dir/** matches dir/ itself as well.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import heapq
+import os
+import re
+
+import _shfs
+
+ESC_NONE = 0 # Escape level of unescaped characters, same as in sh
+
+def _unescaped(word, escapes, chars):
+    """Return whether word contains any of chars unescaped.
+    """
+    
+    for char, esc in zip(word, escapes):
+        if char in chars and esc == ESC_NONE:
+            return True
+    return False
+
+def _lexists(path):
+    try:
+        return os.path.lexists(path)
+    except UnicodeError:
+        # Not representable in the file system encoding
+        return False
+
+def _sortkeys(paths):
+    """Yield (components, path) for all paths, for merging sorted
+    streams of paths.
+    """
+    
+    for path in paths:
+        yield path.split(os.sep), path
+
+def expand_braces(word, escapes):
+    """Expand the first {a,b,...} alternative in word and recursively
+    those in the results. ${ is not the start of an alternative. Returns
+    a list of (word, escapes) tuples in order.
+    """
+    
+    depth = 0
+    start = None
+    commas = []
+    for i, (char, esc) in enumerate(zip(word, escapes)):
+        if esc != ESC_NONE:
+            continue
+        if char == "{" and not (i and word[i-1] == "$" and escapes[i-1] == ESC_NONE):
+            if depth == 0:
+                start = i
+                commas = []
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                if commas:
+                    break
+                start = None
+        elif char == "," and depth == 1:
+            commas.append(i)
+    else:
+        return [(word, escapes)]
+    
+    end = i
+    bounds = [start] + commas + [end]
+    results = []
+    for left, right in zip(bounds, bounds[1:]):
+        results += expand_braces(
+            word[:start] + word[left+1:right] + word[end+1:],
+            escapes[:start] + escapes[left+1:right] + escapes[end+1:],
+        )
+    return results
+
+def translate(word, escapes):
+    """Convert a single path component to a regular expression. Returns
+    None if the component contains no unescaped glob characters.
+    """
+    
+    if not _unescaped(word, escapes, "*?["):
+        return None
+    
+    parts = []
+    i = 0
+    end = len(word)
+    while i < end:
+        char = word[i]
+        if escapes[i] != ESC_NONE:
+            parts.append(re.escape(char))
+        elif char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        elif char == "[":
+            # Find the closing bracket, a ] right after [ or [! is a member
+            j = i + 1
+            if j < end and word[j] in "!^" and escapes[j] == ESC_NONE:
+                j += 1
+            if j < end and word[j] == "]":
+                j += 1
+            while j < end and not (word[j] == "]" and escapes[j] == ESC_NONE):
+                j += 1
+            if j >= end:
+                parts.append(re.escape(char))
+            else:
+                members = []
+                k = i + 1
+                if word[k] in "!^" and escapes[k] == ESC_NONE:
+                    members.append("^")
+                    k += 1
+                for k in range(k, j):
+                    if word[k] == "-" and escapes[k] == ESC_NONE and members and k != j - 1:
+                        members.append("-")
+                    else:
+                        members.append(re.escape(word[k]))
+                parts.append("[" + "".join(members) + "]")
+                i = j
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    
+    try:
+        return re.compile("(?s)" + "".join(parts) + r"\Z")
+    except re.error:
+        # Invalid character range like [z-a], matches nothing
+        return re.compile("(?!)")
+
+class Globber(object):
+    """Expands glob patterns, remembering the directory listings it
+    needed so that every directory is only listed once.
+    """
+    
+    def __init__(self):
+        self.listings = {}
+    
+    def listdir(self, path):
+        """Return a sorted list of (name, is_dir, is_symlink) tuples for
+        directory path, or an empty list if it can't be listed.
+        """
+        
+        try:
+            return self.listings[path]
+        except KeyError:
+            pass
+        
+        listing = []
+        try:
+            for entry in _shfs.scandir(path or "."):
+                try:
+                    listing.append((entry.name, entry.is_dir(), entry.is_symlink()))
+                except OSError:
+                    listing.append((entry.name, False, False))
+        except (OSError, UnicodeError):
+            pass
+        listing.sort()
+        self.listings[path] = listing
+        return listing
+    
+    def _walk(self, path):
+        """Yield (path, is_dir) for all non-hidden files and directories
+        below path, in sorted order, without following symlinks to
+        directories.
+        """
+        
+        for name, isdir, islink in self.listdir(path):
+            if not name.startswith("."):
+                sub = os.path.join(path, name)
+                yield sub, isdir and not islink
+                if isdir and not islink:
+                    for found in self._walk(sub):
+                        yield found
+    
+    def _match(self, path, components):
+        """Yield the paths below path matching the list of components,
+        each of which is a (text, regex) tuple with a regex of None for
+        literal components.
+        """
+        
+        if not components:
+            yield path
+            return
+        
+        (text, regex), rest = components[0], components[1:]
+        
+        if regex is None:
+            sub = os.path.join(path, text)
+            if rest:
+                for found in self._match(sub, rest):
+                    yield found
+            elif _lexists(sub):
+                yield sub
+        elif regex == "**":
+            if not rest:
+                # Like in bash, a trailing ** also matches the directory
+                # itself, with a trailing /
+                if path and os.path.isdir(path):
+                    yield path if path.endswith(os.sep) else path + os.sep
+                for found, isdir in self._walk(path):
+                    yield found
+                return
+            # Matches for zero directories and those in each directory
+            # below path, merged to keep them sorted by components
+            streams = [self._match(path, rest)]
+            for name, isdir, islink in self.listdir(path):
+                if isdir and not islink and not name.startswith("."):
+                    streams.append(self._match(os.path.join(path, name), components))
+            for key, found in heapq.merge(*map(_sortkeys, streams)):
+                yield found
+        else:
+            hidden = text.startswith(".")
+            for name, isdir, islink in self.listdir(path):
+                if (hidden or not name.startswith(".")) and regex.match(name):
+                    if not rest:
+                        yield os.path.join(path, name)
+                    elif isdir:
+                        for found in self._match(os.path.join(path, name), rest):
+                            yield found
+    
+    def glob(self, word, escapes):
+        """Yield the files matching word, with the escape levels
+        escapes, in sorted order. If word contains no unescaped glob
+        characters, only word is yielded.
+        """
+        
+        if not _unescaped(word, escapes, "*?["):
+            yield word
+            return
+        
+        components = []
+        start = 0
+        for end in range(len(word) + 1):
+            if end == len(word) or word[end] == "/":
+                text = word[start:end]
+                esc = escapes[start:end]
+                if text == "**" and esc == bytearray([ESC_NONE, ESC_NONE]):
+                    components.append((text, "**"))
+                elif text or end == len(word):
+                    # An empty last component (trailing /) only matches
+                    # directories
+                    components.append((text, translate(text, esc)))
+                start = end + 1
+        
+        for found in self._match(os.sep if word.startswith("/") else "", components):
+            yield found
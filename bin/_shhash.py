@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Command resolution hash table shared by the shell and env.
+
+Directory listings of the search path are cached and only re-read when
+a directory's modification time changes. Resolved command names are
+remembered until $PATH, $PYPATH, sys.path or one of the directories
+changes. Directories given as relative paths (like ".") depend on the
+current working directory and are always checked live. Names containing
+a directory, like ./foo or /tmp/foo.py, are checked directly.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import os
+import sys
+import threading
+
+def is_path(name):
+    """Return whether name is a path rather than a bare command name.
+    Paths are not looked up in the search path.
+    """
+    return os.path.isabs(name) or os.sep in name or (os.altsep is not None and os.altsep in name)
+
+class CommandHash(object):
+    """Remembers where command names were found in the search path.
+    """
+    
+    def __init__(self):
+        self.table = collections.OrderedDict()
+        self.listings = {}
+        self.stamp = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def searchpath(self):
+        """Return the list of directories that are searched for
+        commands, in order.
+        """
+        return (["."] # Force cwd to be searched regardless of envvars
+              + os.environ.get("PYPATH", "").split(os.pathsep)
+              + os.environ.get("PATH", "").split(os.pathsep)
+              + [unicode(path) for path in sys.path])
+    
+    def resolve(self, name):
+        """Return the path of the command name, trying name + ".py" if
+        name itself is not found anywhere, or None if the command
+        couldn't be found.
+        """
+        
+        if is_path(name):
+            for filename in (name, name + ".py"):
+                if os.path.isfile(filename):
+                    return filename
+            return None
+        
+        paths = self.searchpath()
+        
+        with self.lock:
+            self._revalidate(paths)
+            entry = self.table.get(name)
+            if entry is None:
+                self.misses += 1
+                entry = self.table[name] = [self._index(paths, name),
+                                            self._index(paths, name + ".py"), 0]
+            else:
+                self.hits += 1
+                entry[2] += 1
+            
+            for filename, index in ((name, entry[0]), (name + ".py", entry[1])):
+                found = self._find_relative(paths[:index], filename)
+                if found is not None:
+                    return found
+                elif index is not None:
+                    return os.path.join(paths[index], filename)
+        
+        return None
+    
+    def find(self, filename):
+        """Search the search path for filename and return the first
+        occurence, or None if the file couldn't be found.
+        """
+        
+        if is_path(filename):
+            return filename if os.path.isfile(filename) else None
+        
+        paths = self.searchpath()
+        
+        with self.lock:
+            for path in paths:
+                if self._contains(path, filename):
+                    return os.path.join(path, filename)
+        
+        return None
+    
+    def forget(self, name=None):
+        """Forget the resolved location of name, or of all commands if
+        name is None. Forgetting all commands also drops the cached
+        directory listings and statistics.
+        """
+        
+        with self.lock:
+            if name is None:
+                self.table.clear()
+                self.listings.clear()
+                self.stamp = None
+                self.hits = self.misses = 0
+            else:
+                self.table.pop(name, None)
+    
+    def entries(self):
+        """Return a list of (name, path, hits) tuples for all commands
+        that were found.
+        """
+        
+        paths = self.searchpath()
+        
+        with self.lock:
+            self._revalidate(paths)
+            entries = []
+            for name, (index, pyindex, hits) in self.table.items():
+                if index is not None:
+                    entries.append((name, os.path.join(paths[index], name), hits))
+                elif pyindex is not None:
+                    entries.append((name, os.path.join(paths[pyindex], name + ".py"), hits))
+            return entries
+    
+    def _listing(self, path):
+        """Return the names in directory path as a frozenset, re-reading
+        the directory only if its mtime changed.
+        """
+        
+        path = os.path.abspath(path)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        
+        cached = self.listings.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        try:
+            names = frozenset(os.listdir(path)) if mtime is not None else frozenset()
+        except OSError:
+            names = frozenset()
+        self.listings[path] = (mtime, names)
+        return names
+    
+    def _contains(self, path, filename):
+        return filename in self._listing(path) and os.path.isfile(os.path.join(path, filename))
+    
+    def _revalidate(self, paths):
+        """Forget all resolved commands if the search path or the
+        contents of any absolute directory in it have changed.
+        """
+        
+        for path in paths:
+            if os.path.isabs(path):
+                self._listing(path)
+        
+        stamp = (tuple(paths), tuple(self.listings[os.path.abspath(path)][0]
+                                     for path in paths if os.path.isabs(path)))
+        if stamp != self.stamp:
+            self.table.clear()
+            self.stamp = stamp
+    
+    def _index(self, paths, filename):
+        """Return the index of the first absolute directory in paths
+        that contains filename, or None.
+        """
+        
+        for i, path in enumerate(paths):
+            if os.path.isabs(path) and self._contains(path, filename):
+                return i
+        return None
+    
+    def _find_relative(self, paths, filename):
+        """Search only the relative (cwd-dependent) directories in paths
+        for filename.
+        """
+        
+        for path in paths:
+            if not os.path.isabs(path) and self._contains(path, filename):
+                return os.path.join(path, filename)
+        return None
+
+# Shared by the shell and all commands running in it
+table = CommandHash()
+
+def resolve(name):
+    """Return the path of the command name, or None if it couldn't be
+    found.
+    """
+    return table.resolve(name)
+
+def find_in_path(filename):
+    """Search all entries in $PYPATH, $PATH and sys.path for filename
+    and return the first occurence, or None if the file couldn't be found.
+    """
+    return table.find(filename)
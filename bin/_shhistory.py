@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Command history of the interactive shell.
+
+Entries are kept in memory in a ring buffer of at most HISTSIZE entries
+(100000 by default) and numbered from 1 since the history was loaded,
+so !n is a direct lookup. The entry numbers are also indexed by the
+first word of the command, which makes !prefix fast however long the
+history is.
+
+New entries are appended to the file named by HISTFILE, which defaults
+to .sh_history in ~/Documents or ~. They are written in batches and
+not synced to disk after every line. An empty HISTFILE disables the
+history file. Once the file has grown to twice HISTSIZE lines, it is
+compacted in a background thread: duplicate commands are removed,
+keeping the most recent one, and only the last HISTSIZE commands are
+kept.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import io
+import os
+import re
+import threading
+import time
+
+MAXSIZE = 100000 # Default number of entries kept in memory and in the file
+BATCH_SIZE = 20 # Write to the file once this many entries are pending
+FLUSH_INTERVAL = 10.0 # or the oldest pending entry is this many seconds old
+COMPACT_FACTOR = 2 # Compact the file when it has this many times MAXSIZE lines
+
+# History reference at the start of a line: !!, !n, !-n or !prefix
+EVENT_RE = re.compile(r"!(!|-?\d+|[^\s!=(]+)")
+
+def default_file():
+    """Return the history file name from HISTFILE or the default, or
+    None if HISTFILE is set but empty.
+    """
+    
+    filename = os.environ.get("HISTFILE")
+    if filename is not None:
+        return filename or None
+    documents = os.path.expanduser("~/Documents")
+    return os.path.join(documents if os.path.isdir(documents) else os.path.expanduser("~"), ".sh_history")
+
+def default_size():
+    """Return the maximum number of entries from HISTSIZE or MAXSIZE.
+    """
+    
+    try:
+        return max(1, int(os.environ.get("HISTSIZE", "")))
+    except ValueError:
+        return MAXSIZE
+
+def _first_word(line):
+    return line.split(None, 1)[0] if line else ""
+
+class History(object):
+    """Numbered command history in a ring buffer of maxsize entries,
+    optionally backed by a file.
+    """
+    
+    def __init__(self, maxsize=MAXSIZE):
+        self.lock = threading.RLock()
+        self.filename = None
+        self.compactor = None
+        self.error = None
+        self.reset(maxsize)
+    
+    def reset(self, maxsize=None):
+        """Forget all entries in memory, optionally changing maxsize.
+        The file is not changed.
+        """
+        
+        with self.lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            self.ring = []
+            self.count = 0 # Number of the newest entry
+            self.words = {} # First word -> ascending list of entry numbers
+            self.pending = []
+            self.lastflush = time.time()
+            self.filelines = 0
+    
+    def __len__(self):
+        return len(self.ring)
+    
+    @property
+    def first(self):
+        """Number of the oldest entry still in memory.
+        """
+        return self.count - len(self.ring) + 1
+    
+    def get(self, n):
+        """Return entry number n, or None if there is no such entry.
+        """
+        
+        if self.first <= n <= self.count:
+            return self.ring[(n - 1) % self.maxsize]
+        return None
+    
+    def items(self, start=None):
+        """Yield (number, line) for all entries from number start or the
+        oldest one, oldest first.
+        """
+        
+        with self.lock:
+            first = self.first if start is None else max(start, self.first)
+            entries = [(n, self.ring[(n - 1) % self.maxsize]) for n in range(first, self.count + 1)]
+        return iter(entries)
+    
+    def _append(self, line):
+        self.count += 1
+        if len(self.ring) < self.maxsize:
+            self.ring.append(line)
+        else:
+            self.ring[(self.count - 1) % self.maxsize] = line
+        self.words.setdefault(_first_word(line), []).append(self.count)
+        
+        if self.count % self.maxsize == 0:
+            # Drop the numbers of entries that have left the ring
+            first = self.first
+            for word, numbers in list(self.words.items()):
+                numbers = [n for n in numbers if n >= first]
+                if numbers:
+                    self.words[word] = numbers
+                else:
+                    del self.words[word]
+    
+    def add(self, line):
+        """Add the command line to the history, unless it is empty or
+        the same as the previous entry. It is written to the history
+        file with the next batch. Raises IOError or OSError if the file
+        can't be written, the file is not used after that.
+        """
+        
+        line = line.strip()
+        with self.lock:
+            if not line or (self.count and self.get(self.count) == line):
+                return
+            self._append(line)
+            if self.filename is None:
+                return
+            
+            self.pending.append(line)
+            self.filelines += 1
+            if len(self.pending) >= BATCH_SIZE or time.time() - self.lastflush >= FLUSH_INTERVAL:
+                self.flush()
+            if self.filelines > COMPACT_FACTOR * self.maxsize:
+                self.compact_async()
+    
+    def flush(self):
+        """Append the pending entries to the history file.
+        """
+        
+        with self.lock:
+            self.lastflush = time.time()
+            if not self.pending or self.filename is None:
+                return
+            lines, self.pending = self.pending, []
+            try:
+                with io.open(self.filename, "ab") as f:
+                    f.write("".join(line + "\n" for line in lines).encode("utf-8"))
+            except (IOError, OSError):
+                self.filename = None
+                raise
+    
+    def clear(self):
+        """Forget all entries and empty the history file.
+        """
+        
+        with self.lock:
+            self.reset()
+            if self.filename is not None:
+                io.open(self.filename, "wb").close()
+    
+    def load(self, filename, maxsize=None):
+        """Replace the entries in memory with the last maxsize entries
+        of the history file filename, and append new entries to it. A
+        missing file is created when the first entries are written.
+        """
+        
+        with self.lock:
+            self.flush()
+            self.reset(maxsize)
+            self.filename = filename
+            lines = collections.deque(maxlen=self.maxsize)
+            try:
+                with io.open(filename, "r", encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        self.filelines += 1
+                        line = line.rstrip("\n")
+                        if line:
+                            lines.append(line)
+            except (IOError, OSError):
+                if not os.path.exists(filename):
+                    return
+                self.filename = None
+                raise
+            for line in lines:
+                self._append(line)
+            if self.filelines > COMPACT_FACTOR * self.maxsize:
+                self.compact_async()
+    
+    def find_prefix(self, prefix):
+        """Return the number of the most recent entry starting with
+        prefix, or None.
+        """
+        
+        with self.lock:
+            word = _first_word(prefix)
+            if word != prefix:
+                # All matches start with the whole first word of prefix
+                candidates = [word]
+            else:
+                candidates = [w for w in self.words if w.startswith(prefix)]
+            
+            first = self.first
+            best = None
+            for candidate in candidates:
+                for n in reversed(self.words.get(candidate, ())):
+                    if n < first:
+                        break
+                    if self.get(n).startswith(prefix):
+                        if best is None or n > best:
+                            best = n
+                        break
+            return best
+    
+    def search(self, text):
+        """Return a list of (number, line) for all entries containing
+        text, oldest first.
+        """
+        
+        return [(n, line) for n, line in self.items() if text in line]
+    
+    def expand(self, line):
+        """Replace a history reference at the start of line (!! for the
+        previous entry, !n for entry n, !-n for the nth previous entry,
+        !prefix for the last one starting with prefix) by the entry.
+        Returns line unchanged if it starts with no reference. Raises
+        ValueError if there is no such entry.
+        """
+        
+        stripped = line.lstrip()
+        match = EVENT_RE.match(stripped)
+        if match is None:
+            return line
+        
+        event = match.group(1)
+        with self.lock:
+            if event == "!":
+                n = self.count
+            elif re.match(r"-?\d+\Z", event):
+                n = int(event)
+                if n < 0:
+                    n += self.count + 1
+            else:
+                n = self.find_prefix(event)
+            entry = None if n is None else self.get(n)
+        
+        if entry is None:
+            raise ValueError("{}: event not found".format(match.group(0)))
+        return entry + stripped[match.end():]
+    
+    def compact(self):
+        """Rewrite the history file without duplicates, keeping the most
+        recent occurrence of each line, and only the last maxsize lines.
+        Lines appended while this runs are kept as they are.
+        """
+        
+        with self.lock:
+            self.flush()
+            filename = self.filename
+            if filename is None:
+                return
+            maxsize = self.maxsize
+            size = os.path.getsize(filename)
+        
+        # The expensive part doesn't block adding entries
+        with io.open(filename, "rb") as f:
+            lines = f.read(size).decode("utf-8", "replace").splitlines()
+        seen = set()
+        kept = []
+        for line in reversed(lines):
+            if line and line not in seen:
+                seen.add(line)
+                kept.append(line)
+                if len(kept) >= maxsize:
+                    break
+        kept.reverse()
+        
+        tmpname = filename + ".tmp"
+        with io.open(tmpname, "wb") as f:
+            f.write("".join(line + "\n" for line in kept).encode("utf-8"))
+        
+        with self.lock:
+            self.flush()
+            with io.open(filename, "rb") as f:
+                f.seek(size)
+                tail = f.read()
+            with io.open(tmpname, "ab") as f:
+                f.write(tail)
+            os.rename(tmpname, filename)
+            self.filelines = len(kept) + tail.count(b"\n")
+    
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except (IOError, OSError) as err:
+            # Compaction is retried when more entries are added
+            self.error = err
+        finally:
+            self.compactor = None
+    
+    def compact_async(self):
+        """Start compacting the history file in a background thread,
+        unless that is already happening.
+        """
+        
+        with self.lock:
+            if self.compactor is not None:
+                return
+            self.compactor = threading.Thread(target=self._compact_quietly)
+            self.compactor.daemon = True
+            self.compactor.start()
+    
+    def close(self):
+        """Write the pending entries and wait for a running compaction.
+        """
+        
+        compactor = self.compactor
+        if compactor is not None:
+            compactor.join()
+        self.flush()
+
+# Shared by the shell and the history builtin
+history = History()
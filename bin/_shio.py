@@ -0,0 +1,603 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Stream helpers used by the shell to connect commands to each other
+and to files.
+
+sys.stdin, sys.stdout and sys.stderr are shared by all threads, so the
+shell replaces them with StreamProxy objects that forward to a stream
+chosen per thread. Pipeline stages are connected with Pipe objects,
+which hold a bounded amount of data in memory. Output redirected to a
+file goes through a FileWriter, and the output of background jobs is
+collected in Capture objects.
+
+Writes to the console are expensive per call, so output of a command
+that goes to the console is collected by a ConsoleWriter and written in
+large blocks. The console is written to when CONSOLE_LINES lines or
+CONSOLE_SIZE bytes are pending, every CONSOLE_DELAY seconds, when the
+command reads from the console, and when it ends. console_stats counts
+the writes and flushes, the time keyword of the shell shows them.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import io
+import itertools
+import sys
+import threading
+import time
+
+PIPE_SIZE = 64 * 1024 # Maximum number of bytes buffered in a pipe
+BUFSIZE = 1024 * 1024 # Buffer size of files used for redirection
+PIPE_STATUS = 141 # Exit status of a command killed by a closed pipe
+CONSOLE_LINES = 64 # Lines collected before writing them to the console
+CONSOLE_SIZE = 64 * 1024 # Bytes collected before writing them to the console
+CONSOLE_DELAY = 0.05 # Interval at which collected output is written anyway
+
+class BrokenPipe(SystemExit):
+    """Raised when writing to a pipe whose reading end was closed. Like
+    SIGPIPE, this terminates the writing command without an error
+    message, unless the command catches it explicitly.
+    """
+    
+    def __init__(self):
+        super(BrokenPipe, self).__init__(PIPE_STATUS)
+
+class StreamProxy(object):
+    """File-like object that forwards everything to a per-thread
+    stream, or to default if no stream was set for the current thread.
+    """
+    
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+    
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+    
+    def __iter__(self):
+        return iter(self.target())
+    
+    @property
+    def default(self):
+        return self._default
+    
+    def target(self):
+        """Return the stream used by the current thread.
+        """
+        return getattr(self._local, "stream", None) or self._default
+    
+    def redirect(self, stream):
+        """Use stream for the current thread and return the previous
+        one. Pass None to go back to the default stream.
+        """
+        
+        old = getattr(self._local, "stream", None)
+        self._local.stream = stream
+        return old
+
+def install():
+    """Replace sys.stdin, sys.stdout and sys.stderr with StreamProxy
+    objects, unless already done. Returns the original streams.
+    """
+    
+    streams = (sys.stdin, sys.stdout, sys.stderr)
+    if not isinstance(sys.stdout, StreamProxy):
+        sys.stdin, sys.stdout, sys.stderr = map(StreamProxy, streams)
+    return streams
+
+class Pipe(object):
+    """Bounded in-memory byte stream with a writing end (writer) and a
+    reading end (reader). Writers block while the pipe is full, readers
+    block while it is empty and the writing end is still open.
+    """
+    
+    def __init__(self, maxsize=PIPE_SIZE):
+        self.maxsize = maxsize
+        self.chunks = collections.deque()
+        self.size = 0
+        self.cond = threading.Condition()
+        self.write_closed = False
+        self.read_closed = False
+        self.writer = PipeWriter(self)
+        self.reader = PipeReader(self)
+    
+    def put(self, data):
+        """Append data, blocking while the pipe is full.
+        """
+        
+        for start in range(0, len(data), self.maxsize):
+            chunk = data[start:start+self.maxsize]
+            with self.cond:
+                while self.size and self.size + len(chunk) > self.maxsize and not self.read_closed:
+                    self.cond.wait(0.1)
+                if self.read_closed:
+                    raise BrokenPipe()
+                self.chunks.append(chunk)
+                self.size += len(chunk)
+                self.cond.notify_all()
+    
+    def get(self):
+        """Remove and return the next chunk, blocking while the pipe is
+        empty. Returns an empty string at end of file.
+        """
+        
+        with self.cond:
+            while not self.chunks and not self.write_closed:
+                self.cond.wait(0.1)
+            if not self.chunks:
+                return b""
+            chunk = self.chunks.popleft()
+            self.size -= len(chunk)
+            self.cond.notify_all()
+            return chunk
+    
+    def close_write(self):
+        with self.cond:
+            self.write_closed = True
+            self.cond.notify_all()
+    
+    def close_read(self):
+        with self.cond:
+            self.read_closed = True
+            self.chunks.clear()
+            self.size = 0
+            self.cond.notify_all()
+
+class PipeWriter(object):
+    """Writing end of a Pipe. Unicode strings are encoded as UTF-8.
+    """
+    
+    encoding = "utf-8"
+    
+    def __init__(self, pipe):
+        self.pipe = pipe
+    
+    @property
+    def closed(self):
+        return self.pipe.write_closed
+    
+    def write(self, data):
+        if self.pipe.write_closed:
+            raise ValueError("I/O operation on closed pipe")
+        if isinstance(data, unicode):
+            data = data.encode(self.encoding)
+        if data:
+            self.pipe.put(data)
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        pass
+    
+    def isatty(self):
+        return False
+    
+    def close(self):
+        self.pipe.close_write()
+
+class PipeReader(object):
+    """Reading end of a Pipe, returning byte strings.
+    """
+    
+    encoding = "utf-8"
+    
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.buf = b""
+        self.pos = 0
+        self.eof = False
+    
+    @property
+    def closed(self):
+        return self.pipe.read_closed
+    
+    def _fill(self):
+        """Append the next chunk from the pipe to the unread part of the
+        buffer. Returns False at end of file.
+        """
+        
+        if self.eof:
+            return False
+        chunk = self.pipe.get()
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def read(self, size=-1):
+        if size is None or size < 0:
+            # Read everything up to end of file
+            chunks = [self.buf[self.pos:]]
+            while not self.eof:
+                chunks.append(self.pipe.get())
+                self.eof = not chunks[-1]
+            self.buf = b""
+            self.pos = 0
+            return b"".join(chunks)
+        
+        while len(self.buf) - self.pos < size and self._fill():
+            pass
+        end = min(self.pos + size, len(self.buf))
+        data = self.buf[self.pos:end]
+        self.pos = end
+        return data
+    
+    def readline(self, size=-1):
+        start = self.pos
+        while True:
+            end = self.buf.find(b"\n", start)
+            if end != -1:
+                end += 1
+                break
+            # No newline yet, only search the new data after refilling
+            searched = len(self.buf) - self.pos
+            if 0 <= size <= searched or not self._fill():
+                end = len(self.buf)
+                break
+            start = searched
+        
+        if 0 <= size < end - self.pos:
+            end = self.pos + size
+        data = self.buf[self.pos:end]
+        self.pos = end
+        return data
+    
+    def readlines(self, hint=-1):
+        return list(self)
+    
+    def __iter__(self):
+        return self
+    
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+    
+    __next__ = next
+    
+    def isatty(self):
+        return False
+    
+    def close(self):
+        self.pipe.close_read()
+
+class FileWriter(object):
+    """Large-buffered binary file used for output redirection. Unicode
+    strings are encoded as UTF-8, byte strings are written unchanged.
+    """
+    
+    encoding = "utf-8"
+    
+    def __init__(self, filename, append=False, bufsize=BUFSIZE):
+        self.name = filename
+        self.file = io.open(filename, "ab" if append else "wb", buffering=bufsize)
+    
+    @property
+    def closed(self):
+        return self.file.closed
+    
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode(self.encoding)
+        self.file.write(data)
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        self.file.flush()
+    
+    def fileno(self):
+        return self.file.fileno()
+    
+    def isatty(self):
+        return False
+    
+    def close(self):
+        self.file.close()
+
+class Capture(object):
+    """Unbounded in-memory output stream, used to collect the output of
+    background jobs. The collected data can be read from any position
+    while it is still being written. Unicode strings are encoded as
+    UTF-8.
+    """
+    
+    encoding = "utf-8"
+    
+    def __init__(self):
+        self.chunks = []
+        self.cond = threading.Condition()
+        self.closed = False
+    
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode(self.encoding)
+        if data:
+            with self.cond:
+                self.chunks.append(data)
+                self.cond.notify_all()
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        pass
+    
+    def isatty(self):
+        return False
+    
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+    
+    def read_from(self, index, timeout=None):
+        """Return the list of chunks written after the first index
+        chunks, waiting up to timeout seconds for new data while the
+        stream is open and there is none.
+        """
+        
+        with self.cond:
+            if timeout and len(self.chunks) <= index and not self.closed:
+                self.cond.wait(timeout)
+            return self.chunks[index:]
+    
+    def getvalue(self):
+        with self.cond:
+            return b"".join(self.chunks)
+
+class ConsoleStats(object):
+    """Counters of console output: writes is the number of write calls
+    by commands, written the number of bytes (characters for unicode
+    strings) they wrote, and flushes the number of times collected
+    output was passed on to the console.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.written = 0
+        self.flushes = 0
+    
+    def add(self, writes, written, flushes):
+        with self.lock:
+            self.writes += writes
+            self.written += written
+            self.flushes += flushes
+    
+    def snapshot(self):
+        """Return (writes, written, flushes).
+        """
+        
+        with self.lock:
+            return self.writes, self.written, self.flushes
+
+# Shared by all ConsoleWriter objects
+console_stats = ConsoleStats()
+
+class _Flusher(object):
+    """Background thread flushing the registered ConsoleWriter objects
+    every CONSOLE_DELAY seconds. It ends when none are left.
+    """
+    
+    def __init__(self):
+        self.writers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def add(self, writer):
+        with self.lock:
+            self.writers.add(writer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run)
+                self.thread.daemon = True
+                self.thread.start()
+    
+    def discard(self, writer):
+        with self.lock:
+            self.writers.discard(writer)
+    
+    def _run(self):
+        while True:
+            time.sleep(CONSOLE_DELAY)
+            with self.lock:
+                if not self.writers:
+                    self.thread = None
+                    return
+                writers = list(self.writers)
+            for writer in writers:
+                try:
+                    writer._flush_chunks()
+                except Exception:
+                    # The output is kept, the error is raised again by
+                    # the command's next write or flush
+                    pass
+
+_flusher = _Flusher()
+
+class ConsoleWriter(object):
+    """Collects writes to the console stream and passes them on in
+    large blocks. Byte and unicode strings are passed on unchanged, as
+    the console may treat them differently. Writing first flushes the
+    writers in before, so output to stderr stays in order with stdout.
+    If timed is true, collected output is also written every
+    CONSOLE_DELAY seconds until the writer is closed.
+    
+    Output that can't be written, for example because the console can't
+    encode it, is kept and the error is raised to the command by its
+    next write or flush, or by close.
+    """
+    
+    def __init__(self, stream, before=(), lines=CONSOLE_LINES, size=CONSOLE_SIZE, timed=True, stats=console_stats):
+        self.stream = stream
+        self.before = list(before)
+        self.lines = lines
+        self.size = size
+        self.stats = stats
+        self.chunks = []
+        self.pending_lines = 0
+        self.pending_size = 0
+        self.writes = 0
+        self.raised = False # Whether the last failed flush was raised to the command
+        self.lock = threading.Lock()
+        self.timed = timed
+        if timed:
+            _flusher.add(self)
+    
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+    
+    def write(self, data):
+        if not data:
+            return
+        for writer in self.before:
+            if writer.chunks:
+                try:
+                    writer._flush_chunks()
+                except Exception:
+                    # Raised by that writer's own next write or close
+                    pass
+        with self.lock:
+            self.chunks.append(data)
+            self.writes += 1
+            self.pending_size += len(data)
+            if b"\n" in data:
+                self.pending_lines += data.count(b"\n")
+                full = self.pending_lines >= self.lines
+            else:
+                full = False
+        if full or self.pending_size >= self.size:
+            self.flush()
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def _flush_chunks(self):
+        """Write the collected output. If writing fails, the output
+        that was not written is kept for the next flush.
+        """
+        
+        with self.lock:
+            if not self.chunks:
+                return
+            writes, written = self.writes, self.pending_size
+            # Runs of byte and unicode strings are joined separately
+            runs = [kind().join(run) for kind, run in itertools.groupby(self.chunks, type)]
+            try:
+                while runs:
+                    self.stream.write(runs[0])
+                    del runs[0]
+            finally:
+                self.chunks = runs
+                self.pending_size = sum(len(run) for run in runs)
+                self.pending_lines = sum(run.count(b"\n") for run in runs)
+                self.writes = 1 if runs else 0
+            self.stream.flush()
+            self.raised = False
+        self.stats.add(writes, written, 1)
+    
+    def flush(self):
+        try:
+            self._flush_chunks()
+        except Exception:
+            self.raised = True
+            raise
+    
+    def close(self):
+        """Write the collected output and stop flushing it periodically.
+        The console is not closed. Output that can't be written is
+        dropped, the error is only raised if the command has not seen
+        it yet.
+        """
+        
+        if self.timed:
+            _flusher.discard(self)
+        try:
+            self._flush_chunks()
+        except Exception:
+            self.chunks = []
+            if not self.raised:
+                raise
+
+class ConsoleReader(object):
+    """Console input stream that flushes the given ConsoleWriter objects
+    before every read, so a prompt is shown before waiting for input.
+    """
+    
+    def __init__(self, stream, writers):
+        self.stream = stream
+        self.writers = list(writers)
+    
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+    
+    def _flush(self):
+        for writer in self.writers:
+            try:
+                writer._flush_chunks()
+            except Exception:
+                # Raised by the writer's own next write or close
+                pass
+    
+    def read(self, *args):
+        self._flush()
+        return self.stream.read(*args)
+    
+    def readline(self, *args):
+        self._flush()
+        return self.stream.readline(*args)
+    
+    def readlines(self, *args):
+        self._flush()
+        return self.stream.readlines(*args)
+    
+    def __iter__(self):
+        return self
+    
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+    
+    __next__ = next
+    
+    def close(self):
+        pass
+
+def buffer_console(streams):
+    """Replace the console streams in the list streams (stdin, stdout,
+    stderr) for a command: console output with ConsoleWriter objects,
+    one per console stream, and console input with a ConsoleReader that
+    flushes them. Returns the writers, which must be flushed when the
+    command ends.
+    """
+    
+    if not isinstance(sys.stdout, StreamProxy):
+        return []
+    consoles = [sys.stdout.default, sys.stderr.default]
+    writers = []
+    for i in (1, 2):
+        for writer in writers:
+            if streams[i] is writer.stream:
+                streams[i] = writer
+        if any(streams[i] is console for console in consoles):
+            writers.append(ConsoleWriter(streams[i]))
+            streams[i] = writers[-1]
+    for writer in writers:
+        # Output of the other stream written before must come first
+        writer.before = [w for w in writers if w is not writer]
+    if writers and streams[0] is sys.stdin.default:
+        streams[0] = ConsoleReader(streams[0], writers)
+    return writers
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Background jobs started with &.
+
+Jobs run on a bounded pool of worker threads. Each job has its own
+stdin (always empty) and captures its stdout and stderr, so it doesn't
+interfere with the console. The output is collected with the wait and
+fg builtins, jobs shows the state of all jobs.
+
+sys.argv and the working directory are shared by the whole process.
+Jobs don't set sys.argv for commands with a main function, only scripts
+without one still need it. A job keeps the working directory it was
+started in, shown by jobs -l, even if cd changes the shell's: its
+commands run in worker processes in that directory, or with their
+paths resolved against it when they can't (see sh.run_background).
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import io
+import os
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import _shio
+
+WORKERS = 4 # Maximum number of jobs running at the same time
+
+class Job(object):
+    """A command line running in the background. func is called without
+    arguments on a worker thread and returns the exit status.
+    """
+    
+    def __init__(self, id, command, func):
+        self.id = id
+        self.command = command
+        self.func = func
+        self.cwd = os.getcwdu()
+        self.stdout = _shio.Capture()
+        self.stderr = _shio.Capture()
+        self.status = None
+        self.created = time.time()
+        self.started = None
+        self.ended = None
+        self.reported = False
+        self.finished = threading.Event()
+    
+    def __repr__(self):
+        return "<Job [{}] {} {!r}>".format(self.id, self.state, self.command)
+    
+    @property
+    def state(self):
+        if self.finished.is_set():
+            return "Done" if self.status == 0 else "Exit {}".format(self.status)
+        elif self.started is not None:
+            return "Running"
+        else:
+            return "Queued"
+    
+    @property
+    def duration(self):
+        if self.started is None:
+            return 0.0
+        return (self.ended or time.time()) - self.started
+    
+    def run(self):
+        """Run the job in the current thread with its own streams.
+        """
+        
+        proxies = (sys.stdin, sys.stdout, sys.stderr)
+        streams = (io.BytesIO(), self.stdout, self.stderr)
+        olds = [proxy.redirect(stream) for proxy, stream in zip(proxies, streams)]
+        self.started = time.time()
+        try:
+            self.status = self.func()
+        except BaseException as err:
+            self.stderr.write("sh: {}: {!s}\n".format(type(err).__name__, err))
+            self.status = 1
+        finally:
+            self.ended = time.time()
+            for proxy, old in zip(proxies, olds):
+                proxy.redirect(old)
+            self.stdout.close()
+            self.stderr.close()
+            self.finished.set()
+    
+    def wait(self, timeout=None):
+        """Wait until the job has finished, or until timeout. Returns
+        whether it has finished.
+        """
+        
+        # Waiting in steps keeps KeyboardInterrupt working
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.finished.is_set():
+            remaining = 0.1 if deadline is None else min(0.1, deadline - time.time())
+            if remaining <= 0:
+                break
+            self.finished.wait(remaining)
+        return self.finished.is_set()
+
+class JobTable(object):
+    """All background jobs that have not been collected yet, keyed by
+    job number. Worker threads are started as needed, up to workers.
+    """
+    
+    def __init__(self, workers=WORKERS):
+        self.jobs = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.workers = workers
+        self.threads = []
+    
+    def _work(self):
+        while True:
+            self.queue.get().run()
+    
+    def submit(self, command, func):
+        """Start a job running func for the command line command and
+        return it. The job waits in a queue if all workers are busy.
+        """
+        
+        with self.lock:
+            id = max(self.jobs) + 1 if self.jobs else 1
+            job = self.jobs[id] = Job(id, command, func)
+            busy = sum(1 for other in self.jobs.values() if other.state in ("Queued", "Running"))
+            if len(self.threads) < min(busy, self.workers):
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        self.queue.put(job)
+        return job
+    
+    def get(self, id=None):
+        """Return the job with the number id, or the most recent job if
+        id is None. Returns None if there is no such job.
+        """
+        
+        with self.lock:
+            if id is None:
+                return next(reversed(self.jobs.values()), None)
+            return self.jobs.get(id)
+    
+    def all(self):
+        with self.lock:
+            return list(self.jobs.values())
+    
+    def remove(self, job):
+        with self.lock:
+            self.jobs.pop(job.id, None)
+    
+    def active(self):
+        """Return the number of jobs that are queued or running.
+        """
+        
+        return sum(1 for job in self.all() if not job.finished.is_set())
+    
+    def newly_finished(self):
+        """Return the finished jobs that have not been reported by the
+        shell yet, and mark them as reported.
+        """
+        
+        jobs = [job for job in self.all() if job.finished.is_set() and not job.reported]
+        for job in jobs:
+            job.reported = True
+        return jobs
+
+# Shared by the shell and the job builtins
+table = JobTable()
+
+def parse_jobspec(spec):
+    """Convert a job number like 2 or %2 to an int. Raises ValueError
+    if spec is not a job number.
+    """
+    
+    return int(spec[1:] if spec.startswith("%") else spec)
+
+def copy_output(job, stdout, stderr, follow=False):
+    """Write the output captured for job to stdout and stderr. If follow
+    is true, keep writing new output until the job has finished.
+    """
+    
+    positions = [0, 0]
+    while True:
+        done = job.finished.is_set()
+        for i, (capture, out) in enumerate([(job.stdout, stdout), (job.stderr, stderr)]):
+            chunks = capture.read_from(positions[i], 0.05 if follow and not done else None)
+            positions[i] += len(chunks)
+            if chunks:
+                out.write(b"".join(chunks))
+                out.flush()
+        if done or not follow:
+            return
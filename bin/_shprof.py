@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Timing and profiling of commands run by the shell.
+
+PhaseTimes collects how long the phases of running a command took:
+resolving the command name, compiling or loading the script, and
+executing it. The time keyword of the shell prints them.
+
+If the SH_PROFILE environment variable is 1, every command is run under
+cProfile and its statistics are written to a .pstats file in the
+directory named by SH_PROFILE_DIR, or a sh_profile directory in the
+temporary directory. profstat summarizes these files.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import itertools
+import os
+import re
+import tempfile
+import threading
+import time
+import timeit
+
+PHASES = ("resolve", "compile", "exec") # Phases reported by time, in order
+
+timer = timeit.default_timer
+
+_counter = itertools.count(1)
+
+class PhaseTimes(object):
+    """Total durations of command phases, in seconds. The commands of a
+    pipeline run in different threads and add to the same object.
+    """
+    
+    def __init__(self):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.lock = threading.Lock()
+    
+    def add(self, phase, seconds):
+        with self.lock:
+            self.times[phase] = self.times.get(phase, 0.0) + seconds
+    
+    def __getitem__(self, phase):
+        return self.times[phase]
+
+def enabled():
+    """Return whether commands should be profiled.
+    """
+    return os.environ.get("SH_PROFILE", "") == "1"
+
+def profile_dir():
+    """Return the directory .pstats files are written to.
+    """
+    return os.environ.get("SH_PROFILE_DIR", "") or os.path.join(tempfile.gettempdir(), "sh_profile")
+
+def call(name, func, *args):
+    """Call func(*args) for the command name and return its result. If
+    profiling is enabled, the call is profiled and the statistics are
+    written to a new .pstats file, even if func raises an exception.
+    """
+    
+    if not enabled():
+        return func(*args)
+    
+    import cProfile
+    
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        directory = profile_dir()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Command name, time and a counter make the file name unique
+        filename = "{}-{}-{}.pstats".format(
+            re.sub(r"[^\w.-]", "_", name), time.strftime("%Y%m%d-%H%M%S"), next(_counter),
+        )
+        profiler.dump_stats(os.path.join(directory, filename))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Prompt rendering for the interactive shell.
+
+The prompt is the PS1 environment variable, a format string with the
+fields below, or "{path} $ " if PS1 is not set:
+
+    path      working directory with the home directory shown as ~
+    cwd       full working directory
+    status    exit status of the last command
+    jobs      number of background jobs that are queued or running
+    duration  run time of the last command, like 0.25s
+    time      current time as HH:MM:SS
+    user      user name
+    host      host name, up to the first dot
+    git       git branch of the working directory, or nothing
+
+Fields that need file system access (git) are computed on a background
+thread and cached for a few seconds, so rendering the prompt never
+waits for them. Until a value is known, the field is empty.
+
+The home directory, and on Pythonista the directory containing the app
+bundle that is also shown as ~, are only looked up again when HOME
+changes.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import getpass
+import io
+import os
+import socket
+import string
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import _shjobs
+
+DEFAULT_PS1 = "{path} $ "
+ASYNC_TTL = 2.0 # Seconds that a background field's value is considered current
+MAXCACHE = 256 # Number of background field values kept
+
+_homes = (None, None, None) # ($HOME, home, alternative home)
+
+def homes():
+    """Return the home directory and the alternative home directory
+    (the parent of Pythonista.app, or the home directory itself).
+    """
+    
+    global _homes
+    
+    key = os.environ.get("HOME")
+    if _homes[0] != key or _homes[1] is None:
+        home = os.path.expanduser("~")
+        app = os.path.join(home, "Pythonista.app")
+        althome = os.path.dirname(os.path.realpath(app)) if os.path.exists(app) else home
+        _homes = (key, home, althome)
+    return _homes[1], _homes[2]
+
+def _below(path, root):
+    """Return path relative to root, or None if path is not root or
+    inside it.
+    """
+    
+    if path == root:
+        return "."
+    prefix = root if root.endswith(os.sep) else root + os.sep
+    if path.startswith(prefix):
+        return path[len(prefix):]
+    return None
+
+def collapseuser(path):
+    """Reverse of os.path.expanduser: return path relative to ~, if
+    such representation is meaningful. If path is not ~ or a
+    subdirectory, the absolute path will be returned.
+    """
+    
+    path = os.path.abspath(unicode(path))
+    home, althome = homes()
+    
+    relative = _below(path, home)
+    if relative is None:
+        relative = _below(path, althome)
+    if relative is None:
+        return path
+    return "~" if relative == "." else os.path.join("~", relative)
+
+def git_branch(cwd):
+    """Return the git branch, or the abbreviated commit for a detached
+    HEAD, of the repository containing cwd, or "" if there is none.
+    """
+    
+    path = cwd
+    while True:
+        head = os.path.join(path, ".git", "HEAD")
+        try:
+            with io.open(head, "r", encoding="utf-8") as f:
+                ref = f.read().strip()
+        except (IOError, OSError, UnicodeError):
+            parent = os.path.dirname(path)
+            if parent == path:
+                return ""
+            path = parent
+            continue
+        if ref.startswith("ref: refs/heads/"):
+            return ref[len("ref: refs/heads/"):]
+        return ref[:7]
+
+class Prompt(object):
+    """Renders the prompt from PS1. Values of the fields in async_fields
+    are computed on a background thread and cached.
+    """
+    
+    def __init__(self):
+        self.fields = {
+            "path": lambda info: collapseuser(info["cwd"]),
+            "cwd": lambda info: info["cwd"],
+            "status": lambda info: info["status"],
+            "jobs": lambda info: _shjobs.table.active(),
+            "duration": lambda info: "{:.2f}s".format(info["duration"] or 0.0),
+            "time": lambda info: time.strftime("%H:%M:%S"),
+            "user": lambda info: self.user,
+            "host": lambda info: self.host,
+        }
+        self.async_fields = {
+            "git": lambda info: git_branch(info["cwd"]),
+        }
+        self.parsed = {} # Format string -> names of the fields it uses
+        self.cache = {} # (field, cwd) -> (value, time computed)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = None
+        self._user = None
+        self._host = None
+    
+    @property
+    def user(self):
+        if self._user is None:
+            try:
+                self._user = getpass.getuser()
+            except (ImportError, KeyError):
+                self._user = ""
+        return self._user
+    
+    @property
+    def host(self):
+        if self._host is None:
+            self._host = socket.gethostname().split(".")[0]
+        return self._host
+    
+    def _names(self, ps1):
+        names = self.parsed.get(ps1)
+        if names is None:
+            names = set()
+            try:
+                for literal, name, spec, conversion in string.Formatter().parse(ps1):
+                    if name:
+                        names.add(name)
+            except ValueError:
+                pass
+            self.parsed[ps1] = names
+        return names
+    
+    def _work(self):
+        while True:
+            name, info = self.queue.get()
+            key = (name, info["cwd"])
+            try:
+                value = self.async_fields[name](info)
+            except Exception:
+                value = ""
+            with self.lock:
+                if len(self.cache) >= MAXCACHE:
+                    self.cache.clear()
+                self.cache[key] = (value, time.time())
+                self.pending.discard(key)
+    
+    def _async_value(self, name, info):
+        """Return the cached value of a background field and schedule
+        its computation if it is missing or outdated.
+        """
+        
+        key = (name, info["cwd"])
+        with self.lock:
+            value, computed = self.cache.get(key, ("", None))
+            if (computed is None or time.time() - computed > ASYNC_TTL) and key not in self.pending:
+                self.pending.add(key)
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._work)
+                    self.thread.daemon = True
+                    self.thread.start()
+                self.queue.put((name, info))
+        return value
+    
+    def render(self, cwd, status=0, duration=None):
+        """Return the prompt for the working directory cwd after a
+        command with exit status status that ran for duration seconds.
+        If PS1 is invalid, the default prompt is used.
+        """
+        
+        info = {"cwd": cwd, "status": status, "duration": duration}
+        ps1 = os.environ.get("PS1") or DEFAULT_PS1
+        values = {}
+        for name in self._names(ps1):
+            if name in self.fields:
+                values[name] = self.fields[name](info)
+            elif name in self.async_fields:
+                values[name] = self._async_value(name, info)
+        try:
+            return ps1.format(**values)
+        except (KeyError, IndexError, ValueError, AttributeError):
+            return DEFAULT_PS1.format(path=collapseuser(cwd))
+
+# Used by the interactive shell
+prompt = Prompt()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Registry of resident command modules.
+
+Commands that define a main(args) function are loaded as a module once
+and then run by calling main directly, instead of executing the whole
+script again for every invocation. A module is reloaded automatically
+when its file is changed. Scripts without a main function are executed
+as __main__ like before.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import os
+import sys
+import threading
+import types
+
+import _shcache
+import _shprof
+
+class CommandRegistry(object):
+    """Keeps command modules loaded, keyed by their absolute path.
+    """
+    
+    def __init__(self):
+        self.modules = {}
+        self.lock = threading.Lock()
+    
+    def load(self, filename):
+        """Return the loaded module for the script at filename, loading
+        or reloading it if necessary. Returns None if the script has no
+        main function and must be executed as __main__ instead.
+        """
+        
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        stamp = (st.st_mtime, st.st_size)
+        
+        with self.lock:
+            entry = self.modules.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        
+        code = _shcache.compile_file(path)
+        module = None
+        if "main" in code.co_names:
+            # Run the top level without the __main__ block, this only
+            # defines main and the module's constants
+            name = os.path.splitext(os.path.basename(path))[0]
+            module = types.ModuleType(name.encode("utf-8"))
+            module.__file__ = path
+            exec(code, module.__dict__)
+            if not callable(getattr(module, "main", None)):
+                module = None
+        
+        with self.lock:
+            self.modules[path] = (stamp, module)
+        return module
+    
+    def forget(self, filename=None):
+        """Unload the module for filename, or all modules if filename is
+        None.
+        """
+        
+        with self.lock:
+            if filename is None:
+                self.modules.clear()
+            else:
+                self.modules.pop(os.path.abspath(filename), None)
+
+# Shared by the shell and all commands running in it
+registry = CommandRegistry()
+
+def _exec_main(code):
+    exec(code, {"__name__": "__main__"})
+
+def run(filename, args, setargv=True, phases=None):
+    """Run the command script at filename with the arguments args,
+    either by calling its resident main function or by executing the
+    script as __main__. If setargv is true, sys.argv is set to the
+    command line while the command runs. Scripts without main always
+    need sys.argv, so it is set for them regardless. If phases is a
+    _shprof.PhaseTimes object, the time spent loading and executing the
+    script is added to it.
+    """
+    
+    start = _shprof.timer()
+    module = registry.load(filename)
+    if module is None:
+        code = _shcache.compile_file(filename)
+    loaded = _shprof.timer()
+    if phases is not None:
+        phases.add("compile", loaded - start)
+    
+    name = os.path.splitext(os.path.basename(filename))[0]
+    old_argv = sys.argv
+    try:
+        if setargv or module is None:
+            sys.argv = [filename] + list(args)
+        if module is not None:
+            _shprof.call(name, module.main, list(args))
+        else:
+            _shprof.call(name, _exec_main, code)
+    finally:
+        if setargv:
+            sys.argv = old_argv
+        if phases is not None:
+            phases.add("exec", _shprof.timer() - loaded)
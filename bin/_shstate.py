@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Shell state shared between the shell and its builtin commands, which
+run in the same process and change it through this module.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+# Shell options changed by set. errexit stops a script at the first
+# failing command, xtrace prints every command before running it,
+# isolate runs commands in worker processes (see _shworkers).
+options = {
+    "errexit": False,
+    "isolate": False,
+    "xtrace": False,
+}
+
+# Single-letter forms of the options, as in set -e
+OPTION_LETTERS = {
+    "e": "errexit",
+    "x": "xtrace",
+}
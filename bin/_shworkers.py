@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Pool of worker processes for running commands in isolation.
+
+With set -o isolate, the shell runs commands in pre-forked worker
+processes instead of its own interpreter, so a command that crashes,
+leaks memory or changes global state doesn't affect the shell. Workers
+are forked from the shell after the common modules have been imported,
+and they inherit the commands that are already loaded, so a command
+starts without interpreter startup or import cost.
+
+For every command the worker gets the shell's working directory, or
+that of the background job it belongs to, and the environment. Its
+stdout and stderr are sent back to the shell over a pipe while it runs,
+and reads from stdin are forwarded to the shell. Changes the command
+makes to the working directory or environment stay in the worker.
+Commands that change the shell's own state, like cd, always run in the
+shell. The other commands of background jobs run in workers even
+without set -o isolate, so they keep their job's directory.
+
+A worker is replaced after MAXTASKS commands, and when it dies. Only
+platforms with os.fork are supported, which excludes iOS.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import errno
+import marshal
+import os
+import signal
+import struct
+import sys
+import threading
+
+import _shcache
+import _shregistry
+
+WORKERS = 2 # Number of idle workers kept ready
+MAXTASKS = 100 # Commands run by a worker before it is replaced
+BUFSIZE = 64 * 1024 # Output is sent when this much has been written
+HEADER = struct.Struct(b"!I") # Length of each message on a pipe
+
+# Imported before forking, so workers don't have to
+WARM_MODULES = ("argparse", "io", "os", "re", "shutil", "_shargs", "_shfs")
+
+# Commands that change the shell's state, they always run in the shell
+IN_PROCESS = frozenset(["cd", "clear", "codecache", "exit", "fg", "hash", "history", "jobs", "set", "wait"])
+
+class WorkerDied(Exception):
+    """Raised when a worker process ends unexpectedly.
+    """
+
+def _write_all(fd, data):
+    while data:
+        data = data[os.write(fd, data):]
+
+def _read_exactly(fd, size):
+    """Read size bytes from fd, or return None at end of file.
+    """
+    
+    chunks = []
+    while size:
+        chunk = os.read(fd, size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def send(fd, obj):
+    """Write obj as one message to the pipe fd.
+    """
+    
+    data = marshal.dumps(obj)
+    _write_all(fd, HEADER.pack(len(data)) + data)
+
+def recv(fd):
+    """Read one message from the pipe fd. Raises WorkerDied at end of
+    file.
+    """
+    
+    header = _read_exactly(fd, HEADER.size)
+    data = header and _read_exactly(fd, HEADER.unpack(header)[0])
+    if data is None:
+        raise WorkerDied()
+    return marshal.loads(data)
+
+def isolated(name):
+    """Return whether the command name should run in a worker.
+    """
+    
+    if name.endswith(".py"):
+        name = name[:-3]
+    return hasattr(os, "fork") and name not in IN_PROCESS
+
+class _RemoteOutput(object):
+    """stdout or stderr of a command in a worker, sent to the shell as
+    (kind, data) messages. Output to a terminal is sent line by line.
+    """
+    
+    encoding = "utf-8"
+    
+    def __init__(self, fd, kind, tty):
+        self.fd = fd
+        self.kind = kind
+        self.tty = tty
+        self.chunks = []
+        self.size = 0
+    
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode(self.encoding)
+        if not data:
+            return
+        self.chunks.append(data)
+        self.size += len(data)
+        if self.size >= BUFSIZE or (self.tty and b"\n" in data):
+            self.flush()
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def flush(self):
+        if self.chunks:
+            send(self.fd, (self.kind, b"".join(self.chunks)))
+            self.chunks = []
+            self.size = 0
+    
+    def isatty(self):
+        return self.tty
+    
+    def close(self):
+        self.flush()
+
+class _RemoteInput(object):
+    """stdin of a command in a worker, read from the shell. Pending
+    output is sent first, it may be a prompt.
+    """
+    
+    encoding = "utf-8"
+    
+    def __init__(self, requests, events, outputs):
+        self.requests = requests
+        self.events = events
+        self.outputs = outputs
+    
+    def _request(self, op, size):
+        for output in self.outputs:
+            output.flush()
+        send(self.events, (op, size))
+        return recv(self.requests)
+    
+    def read(self, size=-1):
+        return self._request("read", size)
+    
+    def readline(self, size=-1):
+        return self._request("readline", size)
+    
+    def readlines(self, hint=-1):
+        return list(self)
+    
+    def __iter__(self):
+        return self
+    
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+    
+    __next__ = next
+    
+    def isatty(self):
+        return False
+    
+    def close(self):
+        pass
+
+def _run_request(requests, events, request):
+    """Run one command in the worker and return its exit code, which is
+    sent to the shell.
+    """
+    
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    
+    stdout = _RemoteOutput(events, "out", request["tty"][0])
+    stderr = _RemoteOutput(events, "err", request["tty"][1])
+    sys.stdin = _RemoteInput(requests, events, [stdout, stderr])
+    sys.stdout, sys.stderr = stdout, stderr
+    
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        _shregistry.run(request["filename"], request["args"])
+        code = None
+    except SystemExit as ex:
+        code = ex.code
+    except BaseException as err:
+        print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        code = 1
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        stdout.flush()
+        stderr.flush()
+    
+    if not isinstance(code, (type(None), int, long, unicode, bytes, tuple)):
+        code = 1
+    return code
+
+def _serve(requests, events):
+    """Main loop of a worker process, runs commands until the request
+    pipe is closed.
+    """
+    
+    # Other threads of the shell may have held these locks while it
+    # forked, they don't exist in the worker
+    _shregistry.registry.lock = threading.Lock()
+    _shcache.cache.lock = threading.Lock()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    while True:
+        try:
+            request = recv(requests)
+        except WorkerDied:
+            return
+        send(events, ("done", _run_request(requests, events, request)))
+
+class Worker(object):
+    """A forked worker process and the pipes to it. close_fds are the
+    shell's ends of the pipes of other workers, which the new process
+    closes.
+    """
+    
+    def __init__(self, close_fds=()):
+        request_read, request_write = os.pipe()
+        event_read, event_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for fd in list(close_fds) + [request_write, event_read]:
+                    os.close(fd)
+                _serve(request_read, event_write)
+            finally:
+                os._exit(0)
+        
+        os.close(request_read)
+        os.close(event_write)
+        self.pid = pid
+        self.requests = request_write
+        self.events = event_read
+        self.tasks = 0
+    
+    @property
+    def fds(self):
+        return [self.requests, self.events]
+    
+    def alive(self):
+        try:
+            return os.waitpid(self.pid, os.WNOHANG) == (0, 0)
+        except OSError:
+            return False
+    
+    def close(self, kill=False):
+        """End the worker process. Without kill, it finishes on its own
+        when it notices that its request pipe is closed.
+        """
+        
+        if kill:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        for fd in self.fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        try:
+            _, status = os.waitpid(self.pid, 0)
+        except OSError:
+            status = 0
+        return status
+
+class WorkerPool(object):
+    """Runs commands in worker processes, keeping up to size idle
+    workers. More workers are started if all are busy, for example for
+    the stages of a long pipeline.
+    """
+    
+    def __init__(self, size=WORKERS):
+        self.size = size
+        self.idle = []
+        self.busy = []
+        self.lock = threading.Lock()
+        self.started = False
+    
+    def _spawn(self):
+        return Worker([fd for worker in self.idle + self.busy for fd in worker.fds])
+    
+    def start(self):
+        """Import the common modules and fork the idle workers.
+        """
+        
+        with self.lock:
+            if self.started:
+                return
+            for name in WARM_MODULES:
+                __import__(name)
+            while len(self.idle) < self.size:
+                self.idle.append(self._spawn())
+            self.started = True
+    
+    def _checkout(self):
+        with self.lock:
+            while self.idle:
+                worker = self.idle.pop()
+                if worker.alive():
+                    break
+                worker.close()
+            else:
+                worker = self._spawn()
+            self.busy.append(worker)
+            return worker
+    
+    def _checkin(self, worker, reusable):
+        with self.lock:
+            self.busy.remove(worker)
+            worker.tasks += 1
+            if reusable and worker.tasks < MAXTASKS and len(self.idle) < self.size:
+                self.idle.append(worker)
+                return
+        worker.close(kill=not reusable)
+    
+    def run(self, filename, args, cwd=None):
+        """Run the command script at filename with the arguments args in
+        a worker, connected to the current thread's streams, in the
+        directory cwd or the shell's current directory. Raises
+        SystemExit with the command's exit code, like running the
+        command in the shell would.
+        """
+        
+        self.start()
+        request = {
+            "filename": filename,
+            "args": list(args),
+            "cwd": cwd or os.getcwdu(),
+            "env": dict(os.environ),
+            "tty": [sys.stdout.isatty(), sys.stderr.isatty()],
+        }
+        
+        worker = self._checkout()
+        reusable = False
+        try:
+            send(worker.requests, request)
+            while True:
+                op, payload = recv(worker.events)
+                if op == "out":
+                    sys.stdout.write(payload)
+                elif op == "err":
+                    sys.stderr.write(payload)
+                elif op == "read":
+                    send(worker.requests, sys.stdin.read(payload))
+                elif op == "readline":
+                    send(worker.requests, sys.stdin.readline(payload))
+                elif op == "done":
+                    reusable = True
+                    code = payload
+                    break
+        except (WorkerDied, OSError) as err:
+            if isinstance(err, OSError) and err.errno != errno.EPIPE:
+                raise
+            status = worker.close()
+            self._checkin_dead(worker)
+            if os.WIFSIGNALED(status):
+                print("sh: worker process killed by signal {}".format(os.WTERMSIG(status)), file=sys.stderr)
+                raise SystemExit(128 + os.WTERMSIG(status))
+            print("sh: worker process exited unexpectedly", file=sys.stderr)
+            raise SystemExit(1)
+        finally:
+            if worker in self.busy:
+                self._checkin(worker, reusable)
+        
+        raise SystemExit(code)
+    
+    def _checkin_dead(self, worker):
+        with self.lock:
+            self.busy.remove(worker)
+    
+    def close(self):
+        """End all idle workers.
+        """
+        
+        with self.lock:
+            idle, self.idle = self.idle, []
+            self.started = False
+        for worker in idle:
+            worker.close()
+
+# Used by the shell when the isolate option is set
+pool = WorkerPool()
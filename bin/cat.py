@@ -1,29 +1,197 @@
 #!/usr/bin/env python
 ########################################################################.......
 
-"""Print the contents of the given files.
+"""Print the contents of the given files. With no files, or when a file
+is -, stdin is read.
 """
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
+import codecs
+import errno
+import os
+import stat
 import sys
 
+import _shargs
+
+BLOCKSIZE = 1024 * 1024 # Number of bytes read at once
+
+# Translation tables for the -v, -T and -E options. Control characters
+# are shown in ^X notation, C1 control characters as M-^X.
+NONPRINTING = {c: "^" + unichr(c + 0x40) for c in range(0x20) if c not in (0x09, 0x0a)}
+NONPRINTING[0x7f] = "^?"
+NONPRINTING.update({c: "M-^" + unichr(c - 0x40) for c in range(0x80, 0xa0)})
+NONPRINTING[0x9f] = "M-^?"
+TABS = {0x09: "^I"}
+ENDS = {0x0a: "$\n"}
+
+def copy_raw(f, out):
+    """Copy all bytes from file f to stream out unchanged. If out is a
+    regular file, the kernel is asked to copy the data directly when
+    possible.
+    """
+    
+    if _sendfile(f, out):
+        return
+    
+    buf = f.read(BLOCKSIZE)
+    while buf:
+        out.write(buf)
+        buf = f.read(BLOCKSIZE)
+
+def _sendfile(f, out):
+    """Try to copy f to out using os.sendfile. Returns False if this is
+    not possible, without having copied anything.
+    """
+    
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is None:
+        return False
+    
+    try:
+        infd = f.fileno()
+        outfd = out.fileno()
+        offset = f.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        return False
+    if not stat.S_ISREG(os.fstat(outfd).st_mode):
+        return False
+    
+    out.flush()
+    copied = 0
+    while True:
+        try:
+            sent = sendfile(outfd, infd, offset + copied, BLOCKSIZE)
+        except OSError as err:
+            if copied or err.errno not in (errno.EINVAL, errno.ENOSYS, errno.EBADF):
+                raise
+            # Not supported for this kind of file (or append mode)
+            return False
+        if not sent:
+            break
+        copied += sent
+    f.seek(offset + copied)
+    return True
+
+def decode(f, encoding):
+    """Yield the contents of file f as unicode chunks. Multi-byte
+    characters are never split between chunks.
+    """
+    
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buf = f.read(BLOCKSIZE)
+    while buf:
+        yield decoder.decode(buf)
+        buf = f.read(BLOCKSIZE)
+    yield decoder.decode(b"", final=True)
+
+def strip_nul(chunks):
+    """Remove NUL characters from all chunks.
+    """
+    
+    for chunk in chunks:
+        yield chunk.replace("\x00", "")
+
+def translate(chunks, table):
+    """Apply the translation table to all chunks.
+    """
+    
+    for chunk in chunks:
+        yield chunk.translate(table)
+
+def number_lines(chunks, state):
+    """Prefix every line in chunks with its line number. state is a
+    dict holding the next line number and whether the next character
+    starts a line, so numbering continues across chunks and files.
+    """
+    
+    for chunk in chunks:
+        lines = chunk.split("\n")
+        tail = lines.pop() # Text after the last newline
+        out = []
+        
+        if lines:
+            if not state["atstart"]:
+                # First line continues a line from the previous chunk
+                out.append(lines[0] + "\n")
+                lines = lines[1:]
+            lineno = state["lineno"]
+            out += ["%6d\t%s\n" % (lineno + i, line) for i, line in enumerate(lines)]
+            state["lineno"] += len(lines)
+            state["atstart"] = True
+        
+        if tail:
+            if state["atstart"]:
+                out.append("%6d\t" % state["lineno"])
+                state["lineno"] += 1
+                state["atstart"] = False
+            out.append(tail)
+        
+        yield "".join(out)
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-r", "--raw", action="store_true",
+                    help="copy bytes unchanged, without decoding")
+parser.add_argument("--encoding", action="store", default="utf-8",
+                    help="encoding of the files, defaults to utf-8")
+parser.add_argument("-n", "--number", action="store_true",
+                    help="number all output lines")
+parser.add_argument("-E", "--show-ends", action="store_true",
+                    help="display $ at the end of each line")
+parser.add_argument("-T", "--show-tabs", action="store_true",
+                    help="display tab characters as ^I")
+parser.add_argument("-v", "--show-nonprinting", action="store_true",
+                    help="use ^ and M- notation for control characters, except for tab and newline")
+parser.add_argument("-A", "--show-all", action="store_true",
+                    help="equivalent to -vET")
+parser.add_argument("file", action="store", nargs="*", default=["-"], type=unicode,
+                    help="files to be printed, defaults to stdin")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("file", action="store", nargs="+", type=unicode,
-                   help="one or more files to be printed")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
+    
+    if ns.show_all:
+        ns.show_nonprinting = ns.show_ends = ns.show_tabs = True
+    
+    table = {}
+    if ns.show_nonprinting:
+        table.update(NONPRINTING)
+    if ns.show_tabs:
+        table.update(TABS)
+    if ns.show_ends:
+        table.update(ENDS)
+    
+    if ns.raw and (table or ns.number):
+        parser.error("-r cannot be combined with -n, -A, -E, -T or -v")
+    
+    try:
+        codecs.lookup(ns.encoding)
+    except LookupError as err:
+        parser.error(unicode(err))
     
     status = 0
+    state = {"lineno": 1, "atstart": True}
     
     for filename in ns.file:
         try:
-            with open(filename, "rb") as f:
-                buf = b"foo"
-                while buf:
-                    buf = f.read(1024).replace(b"\x00", b"")
-                    print(buf.decode("ascii", errors="replace"), end="")
+            f = sys.stdin if filename == "-" else open(filename, "rb")
+            try:
+                if ns.raw:
+                    copy_raw(f, sys.stdout)
+                else:
+                    chunks = decode(f, ns.encoding)
+                    if not ns.show_nonprinting:
+                        chunks = strip_nul(chunks)
+                    if table:
+                        chunks = translate(chunks, table)
+                    if ns.number:
+                        chunks = number_lines(chunks, state)
+                    for chunk in chunks:
+                        print(chunk, end="")
+            finally:
+                if f is not sys.stdin:
+                    f.close()
         except Exception as err:
             print("cat: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
             status = 1
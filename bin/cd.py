@@ -6,21 +6,22 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import os
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("dir", action="store", nargs="*", type=unicode,
+                    help="the new working directory")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("dir", action="store", nargs="*",
-                   default=[os.path.expanduser("~")], type=unicode,
-                   help="the new working directory")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     status = 0
     
     try:
-        os.chdir(ns.dir[0])
+        os.chdir(ns.dir[0] if ns.dir else os.path.expanduser("~"))
     except Exception as err:
         print("cd: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
         status = 1
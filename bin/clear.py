@@ -6,12 +6,14 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     status = 0
     
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Show or clear the shell's cache of compiled scripts.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shargs
+import _shcache
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-c", "--clear", action="store_true",
+                    help="remove all compiled scripts from the cache")
+parser.add_argument("-d", "--disk", action="store_true",
+                    help="with -c, also delete the on-disk cache files")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    status = 0
+    cache = _shcache.cache
+    
+    try:
+        if ns.clear:
+            cache.clear(disk=ns.disk)
+        else:
+            for path, mtime, size in cache.entries.keys():
+                print("{:>8} {}".format(size, path))
+            print("{} of {} entries, {} hits, {} misses, {} loaded from disk ({})".format(
+                len(cache), cache.maxsize, cache.hits, cache.misses,
+                cache.diskhits, cache.cachedir or "disk cache disabled"))
+    except Exception as err:
+        print("codecache: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        status = 1
+    
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Copy a file or directory to a new name, or into a new directory.
+Multiple source files may be specified if the destination is an
+existing directory.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import errno
+import os
+import sys
+
+import _shargs
+import _shfs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-r", "-R", "--recursive", action="store_true",
+                    help="copy directories and their contents")
+parser.add_argument("-p", "--preserve", action="store_true",
+                    help="keep access and modification times")
+parser.add_argument("-n", "--no-clobber", action="store_true",
+                    help="do not overwrite existing files")
+parser.add_argument("-u", "--update", action="store_true",
+                    help="only overwrite files that are older than the source")
+parser.add_argument("--progress", action="store_true",
+                    help="show the number of files and bytes copied and the rate")
+parser.add_argument("-j", "--jobs", action="store", default=_shfs.WORKERS, type=int,
+                    help="number of threads copying files in parallel")
+parser.add_argument("src", action="store", nargs="+", type=unicode,
+                    help="one or more source files or folders")
+parser.add_argument("dest", action="store", type=unicode,
+                    help="the destination name or folder")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    mode = "no-clobber" if ns.no_clobber else "update" if ns.update else "always"
+    
+    if len(ns.src) > 1 and not os.path.isdir(ns.dest):
+        print("cp: {}: not a directory".format(ns.dest), file=sys.stderr)
+        sys.exit(1)
+    
+    status = 0
+    progress = _shfs.Progress(sys.stderr if ns.progress else None)
+    
+    def onerror(err):
+        print("cp: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+    
+    # Symlinks given as sources are copied as links only with -r, like
+    # the links found in the copied directories
+    follow = not ns.recursive
+    
+    with _shfs.WorkerPool(max(1, ns.jobs)) as pool:
+        for src in ns.src:
+            dest = ns.dest
+            if os.path.isdir(dest):
+                dest = os.path.join(dest, os.path.basename(os.path.normpath(src)))
+            
+            try:
+                entry = _shfs.PathEntry(src)
+                if entry.is_dir(follow_symlinks=follow):
+                    if not ns.recursive:
+                        print("cp: {}: omitting directory".format(src), file=sys.stderr)
+                        status = 1
+                        continue
+                    realsrc = os.path.realpath(src)
+                    if (os.path.realpath(dest) + os.sep).startswith(realsrc + os.sep):
+                        print("cp: {}: cannot copy a directory into itself".format(src), file=sys.stderr)
+                        status = 1
+                        continue
+                    if _shfs.copy_tree(src, dest, pool, progress, ns.preserve, mode, onerror):
+                        status = 1
+                elif _shfs.should_copy(entry, dest, mode, follow):
+                    if os.path.exists(dest) and os.path.samefile(src, dest):
+                        raise OSError(errno.EINVAL, "source and destination are the same file", src)
+                    progress.add(files=1, size=_shfs.copy_file(src, dest, ns.preserve, follow))
+            except Exception as err:
+                onerror(err)
+                status = 1
+    
+    if ns.progress:
+        progress.show(final=True)
+    
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -6,14 +6,16 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("status", action="store", nargs="?", default=0,
+                    type=int, help="status code")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("status", action="store", nargs="?", default=0,
-                   type=int, help="status code")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     sys.exit((ns.status, "ShellExit"))
 
 if __name__ == "__main__":
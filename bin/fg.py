@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Bring a background job to the foreground: show its output so far and
+follow it until the job has finished. The exit status is that of the
+job. Ctrl-C stops following, the job keeps running in the background.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shargs
+import _shjobs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("job", action="store", nargs="?", type=unicode,
+                    help="number of the job, like 1 or %%1, defaults to the most recent job")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    try:
+        job = _shjobs.table.get(None if ns.job is None else _shjobs.parse_jobspec(ns.job))
+    except ValueError:
+        job = None
+    if job is None:
+        print("fg: {}: no such job".format(ns.job or "current"), file=sys.stderr)
+        sys.exit(1)
+    
+    print(job.command, file=sys.stderr)
+    _shjobs.copy_output(job, sys.stdout, sys.stderr, follow=True)
+    _shjobs.table.remove(job)
+    
+    sys.exit(job.status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
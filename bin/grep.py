@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Print the lines of the given files that match a pattern. With no
+files, or when a file is -, stdin is read; with -r and no files, the
+current directory is searched.
+
+Patterns are Python regular expressions, -E is accepted for
+compatibility. With -F, the pattern is a fixed string. Matching works
+on bytes, the pattern is encoded as UTF-8 and -i only ignores the case
+of ASCII letters.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import collections
+import io
+import mmap
+import os
+import re
+import stat
+import sys
+import threading
+
+import _shargs
+import _shfs
+
+BLOCKSIZE = 1024 * 1024 # Number of bytes searched at once
+RESULT_SIZE = 4 * BLOCKSIZE # Output bytes buffered for a file searched ahead
+STDIN_NAME = "(standard input)"
+SPECIAL_RE = re.compile(br"[.^$*+?{}\[\]\\|()]") # Characters with a meaning in regexes
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-i", "--ignore-case", action="store_true",
+                    help="ignore the case of ASCII letters")
+parser.add_argument("-v", "--invert-match", action="store_true",
+                    help="print the lines that don't match")
+parser.add_argument("-n", "--line-number", action="store_true",
+                    help="prefix every line with its line number")
+parser.add_argument("-c", "--count", action="store_true",
+                    help="only print the number of matching lines of each file")
+parser.add_argument("-l", "--files-with-matches", action="store_true",
+                    help="only print the names of files with matching lines")
+parser.add_argument("-r", "-R", "--recursive", action="store_true",
+                    help="search all files in directories")
+parser.add_argument("-E", "--extended-regexp", action="store_const", dest="fixed", const=False,
+                    help="pattern is a regular expression (default)")
+parser.add_argument("-F", "--fixed-strings", action="store_const", dest="fixed", const=True,
+                    help="pattern is a fixed string")
+parser.add_argument("-j", "--jobs", action="store", default=_shfs.WORKERS, type=int,
+                    help="number of threads searching files in parallel")
+parser.add_argument("pattern", action="store", type=unicode,
+                    help="pattern to search for")
+parser.add_argument("file", action="store", nargs="*", type=unicode,
+                    help="files to be searched, defaults to stdin")
+
+def line_blocks(f):
+    """Yield the contents of file f in blocks of about BLOCKSIZE bytes.
+    Every block but the last ends with a newline. Regular files are
+    mapped into memory instead of being read.
+    """
+    
+    try:
+        info = os.fstat(f.fileno())
+        mapped = stat.S_ISREG(info.st_mode) and info.st_size > 0
+    except (AttributeError, IOError, OSError, ValueError):
+        mapped = False
+    
+    if mapped:
+        size = info.st_size
+        data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            start = 0
+            while start < size:
+                end = min(start + BLOCKSIZE, size)
+                if end < size:
+                    newline = data.rfind(b"\n", start, end)
+                    if newline == -1:
+                        # A line longer than a block
+                        end = data.find(b"\n", end) + 1 or size
+                    else:
+                        end = newline + 1
+                yield data[start:end]
+                start = end
+        finally:
+            data.close()
+        return
+    
+    # Interactive input is searched line by line
+    read = f.readline if f.isatty() else lambda: f.read(BLOCKSIZE)
+    rest = b""
+    while True:
+        data = read()
+        if not data:
+            break
+        data = rest + data
+        newline = data.rfind(b"\n")
+        if newline == -1:
+            rest = data
+            continue
+        yield data[:newline+1]
+        rest = data[newline+1:]
+    if rest:
+        yield rest
+
+class Matcher(object):
+    """Finds the lines matching pattern (bytes) in blocks of lines.
+    """
+    
+    def __init__(self, pattern, fixed=False, ignore_case=False):
+        self.ignore_case = ignore_case
+        # Searching for a fixed string is much faster, also with -i
+        if fixed or not SPECIAL_RE.search(pattern):
+            self.needle = pattern.lower() if ignore_case else pattern
+            self.regex = None
+        else:
+            self.needle = None
+            self.regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    
+    def lines(self, block):
+        """Yield (start, end) for every matching line in block, where
+        end is the index of the line's newline or the end of block.
+        """
+        
+        if self.regex is None:
+            haystack = block.lower() if self.ignore_case else block
+        size = len(block)
+        pos = 0
+        while pos < size:
+            # Find the next match anywhere in the block, then the line
+            # around it
+            if self.regex is None:
+                hit = haystack.find(self.needle, pos)
+                if hit == -1:
+                    return
+                hit_end = hit + len(self.needle)
+            else:
+                match = self.regex.search(block, pos)
+                if match is None or (match.start() == size and block.endswith(b"\n")):
+                    # An empty match after the last newline is no line
+                    return
+                hit, hit_end = match.span()
+            
+            start = block.rfind(b"\n", pos, hit) + 1 or pos
+            end = block.find(b"\n", hit)
+            if end == -1:
+                end = size
+            if hit_end > end and (self.regex is None or self.regex.search(block, start, end) is None):
+                # The match spans lines, but the line itself doesn't match
+                pos = end + 1
+                continue
+            yield start, end
+            pos = end + 1
+    
+    def inverted(self, block):
+        """Yield (start, end) for every run of lines in block that
+        don't match, where end is the index of the last line's newline
+        or the end of block.
+        """
+        
+        pos = 0
+        for start, end in self.lines(block):
+            if start > pos:
+                yield pos, start - 1
+            pos = end + 1
+        if pos < len(block):
+            yield pos, len(block) - 1 if block.endswith(b"\n") else len(block)
+
+def grep_file(f, name, matcher, ns, write):
+    """Search the open file f and pass the output to write, once per
+    block. name is shown before every line if it is not None. Returns
+    whether a line was selected.
+    """
+    
+    prefix = b"" if name is None else name.encode("utf-8") + b":"
+    select = matcher.inverted if ns.invert_match else matcher.lines
+    split = ns.line_number or prefix
+    found = False
+    count = 0
+    lineno = 1 # Number of the line at position numbered in the block
+    
+    for block in line_blocks(f):
+        out = []
+        numbered = 0
+        for start, end in select(block):
+            found = True
+            if ns.files_with_matches:
+                write(prefix[:-1] + b"\n")
+                return True
+            if ns.count:
+                count += block.count(b"\n", start, end) + 1
+            elif not split:
+                out.append(block[start:end] + b"\n")
+            else:
+                if ns.line_number:
+                    lineno += block.count(b"\n", numbered, start)
+                    numbered = start
+                lines = block[start:end].split(b"\n")
+                if ns.line_number:
+                    out.extend(b"%s%d:%s\n" % (prefix, lineno + i, line) for i, line in enumerate(lines))
+                else:
+                    out.extend(prefix + line + b"\n" for line in lines)
+        if ns.line_number:
+            lineno += block.count(b"\n", numbered)
+        if out:
+            write(b"".join(out))
+    
+    if ns.count:
+        write(b"%s%d\n" % (prefix, count))
+    return found
+
+class _Cancelled(Exception):
+    """Raised by _Result.write when the output is no longer wanted.
+    """
+
+class _Result(object):
+    """Output of a file searched on a worker thread, written by the
+    main thread in the order of the files. Once maxsize bytes are
+    buffered, the search waits until the main thread has written them.
+    """
+    
+    def __init__(self, maxsize=RESULT_SIZE):
+        self.chunks = collections.deque()
+        self.size = 0
+        self.maxsize = maxsize
+        self.cond = threading.Condition()
+        self.done = False
+        self.cancelled = False
+        self.selected = False
+        self.error = None
+    
+    def write(self, data):
+        with self.cond:
+            while self.size >= self.maxsize and not self.cancelled:
+                self.cond.wait(0.1)
+            if self.cancelled:
+                raise _Cancelled()
+            self.chunks.append(data)
+            self.size += len(data)
+            self.cond.notify_all()
+    
+    def cancel(self):
+        """Make the search stop at its next write.
+        """
+        
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+    
+    def finish(self, selected=False, error=None):
+        with self.cond:
+            self.selected = selected
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+    
+    def drain(self, out):
+        """Write the output to out as it arrives, until the search has
+        finished.
+        """
+        
+        while True:
+            with self.cond:
+                while not self.chunks and not self.done:
+                    # Waiting with a timeout keeps KeyboardInterrupt working
+                    self.cond.wait(0.1)
+                if not self.chunks:
+                    return
+                chunks = list(self.chunks)
+                self.chunks.clear()
+                self.size = 0
+                self.cond.notify_all()
+            out.write(b"".join(chunks))
+
+def search(path, name, stdin, matcher, ns, write):
+    """Search the file path ("-" for stdin) with grep_file.
+    """
+    
+    if path == "-":
+        return grep_file(stdin, name, matcher, ns, write)
+    with io.open(path, "rb") as f:
+        return grep_file(f, name, matcher, ns, write)
+
+def _search_task(path, name, stdin, matcher, ns, result):
+    try:
+        result.finish(search(path, name, stdin, matcher, ns, result.write))
+    except Exception as err:
+        result.finish(error=err)
+
+def walk(paths, recursive):
+    """Yield the files to search for the paths given on the command
+    line, in a stable order. Raises IOError for directories if not
+    recursive.
+    """
+    
+    for path in paths:
+        if path != "-" and os.path.isdir(path):
+            if not recursive:
+                yield IOError("{}: Is a directory".format(path))
+                continue
+            stack = [path]
+            while stack:
+                dirpath = stack.pop()
+                try:
+                    entries = sorted(_shfs.scandir(dirpath), key=lambda entry: entry.name)
+                except OSError as err:
+                    yield err
+                    continue
+                subdirs = []
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+                stack.extend(reversed(subdirs))
+        else:
+            yield path
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    try:
+        matcher = Matcher(ns.pattern.encode("utf-8"), ns.fixed, ns.ignore_case)
+    except re.error as err:
+        print("grep: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        sys.exit(2)
+    
+    paths = ns.file or (["."] if ns.recursive else ["-"])
+    show_names = ns.recursive or len(paths) > 1 or ns.files_with_matches
+    # Worker threads don't see this thread's redirected streams
+    stdin = getattr(sys.stdin, "target", lambda: sys.stdin)()
+    out = sys.stdout
+    
+    errors = 0
+    selected = False
+    
+    def report(err):
+        print("grep: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+    
+    def name(path):
+        return (STDIN_NAME if path == "-" else path) if show_names else None
+    
+    if len(paths) == 1 and (paths[0] == "-" or not os.path.isdir(paths[0])):
+        # A single file is searched in this thread
+        try:
+            selected = search(paths[0], name(paths[0]), stdin, matcher, ns, out.write)
+        except Exception as err:
+            report(err)
+            errors += 1
+    else:
+        # Up to two files per thread are searched ahead of the one
+        # being written, each buffering at most RESULT_SIZE bytes
+        window = 2 * max(1, ns.jobs)
+        pending = collections.deque()
+        
+        def finish(result):
+            result.drain(out)
+            if result.error is not None:
+                report(result.error)
+                return 1, False
+            return 0, result.selected
+        
+        with _shfs.WorkerPool(max(1, ns.jobs)) as pool:
+            try:
+                for path in walk(paths, ns.recursive):
+                    result = _Result()
+                    if isinstance(path, Exception):
+                        result.finish(error=path)
+                    else:
+                        pool.submit(_search_task, path, name(path), stdin, matcher, ns, result)
+                    pending.append(result)
+                    while len(pending) > window:
+                        failed, found = finish(pending.popleft())
+                        errors += failed
+                        selected = selected or found
+                while pending:
+                    failed, found = finish(pending.popleft())
+                    errors += failed
+                    selected = selected or found
+            finally:
+                # Searches waiting for their output to be written would
+                # keep the pool from closing after KeyboardInterrupt
+                for result in pending:
+                    result.cancel()
+    
+    sys.exit(2 if errors else 0 if selected else 1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
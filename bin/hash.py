@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Show, prime or reset the shell's table of resolved command locations.
+Without arguments, all remembered commands are listed with the number
+of times they were looked up from the table.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shargs
+import _shhash
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-r", "--reset", action="store_true",
+                    help="forget all remembered locations and cached directory listings")
+parser.add_argument("-d", "--delete", action="store_true",
+                    help="forget the remembered locations of the given names")
+parser.add_argument("-s", "--stats", action="store_true",
+                    help="show the number of table hits and misses")
+parser.add_argument("name", action="store", nargs="*", type=unicode,
+                    help="commands to be looked up and remembered")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    status = 0
+    table = _shhash.table
+    
+    if ns.reset:
+        table.forget()
+    
+    for name in ns.name:
+        if ns.delete:
+            table.forget(name)
+        elif table.resolve(name) is None:
+            print("hash: {}: not found".format(name), file=sys.stderr)
+            status = 1
+    
+    if ns.stats:
+        print("{} hits, {} misses, {} directories cached".format(
+            table.hits, table.misses, len(table.listings)))
+    elif not ns.reset and not ns.name:
+        entries = table.entries()
+        if entries:
+            print("hits    command")
+            for name, path, hits in entries:
+                print("{:>4}    {}".format(hits, path))
+        else:
+            print("hash: hash table empty")
+    
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
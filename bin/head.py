@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Print the first lines of the given files. With no files, or when a
+file is -, stdin is read.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-n", "--lines", action="store", default=10, type=int,
+                    help="number of lines to print, defaults to 10")
+parser.add_argument("file", action="store", nargs="*", default=["-"], type=unicode,
+                    help="files to be printed, defaults to stdin")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    status = 0
+    
+    for i, filename in enumerate(ns.file):
+        if len(ns.file) > 1:
+            print("{}==> {} <==".format("\n" if i else "", filename))
+        
+        try:
+            f = sys.stdin if filename == "-" else open(filename, "rb")
+            try:
+                count = 0
+                while count < ns.lines:
+                    line = f.readline()
+                    if not line:
+                        break
+                    print(line, end="")
+                    count += 1
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+        except Exception as err:
+            print("head: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+            status = 1
+    
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Show the command history of the interactive shell, numbered for use
+with !n. Earlier commands can be run again with !! (the previous
+command), !n, !-n (the nth previous command) and !prefix (the last
+command starting with prefix).
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shargs
+import _shhistory
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-c", "--clear", action="store_true",
+                    help="delete all entries, also from the history file")
+parser.add_argument("-s", "--search", action="store", type=unicode,
+                    help="only show entries containing this text")
+parser.add_argument("--compact", action="store_true",
+                    help="remove duplicate and old entries from the history file now")
+parser.add_argument("count", action="store", nargs="?", type=int,
+                    help="only show this many of the most recent entries")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    status = 0
+    history = _shhistory.history
+    
+    try:
+        if ns.clear:
+            history.clear()
+        elif ns.compact:
+            history.compact()
+        else:
+            if ns.search is not None:
+                entries = history.search(ns.search)
+            else:
+                entries = list(history.items())
+            if ns.count is not None:
+                entries = entries[-ns.count:] if ns.count > 0 else []
+            sys.stdout.write("".join("{:>5}  {}\n".format(n, line) for n, line in entries))
+    except (IOError, OSError) as err:
+        print("history: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        status = 1
+    
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""List the background jobs that have not been collected with wait or
+fg yet.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shargs
+import _shjobs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-l", "--long", action="store_true",
+                    help="also show the directory each job was started in and its run time")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    for job in _shjobs.table.all():
+        line = "[{}]  {:<10} {}".format(job.id, job.state, job.command)
+        if ns.long:
+            line += "  ({}, {:.1f}s)".format(job.cwd, job.duration)
+        print(line)
+    
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
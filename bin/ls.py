@@ -1,82 +1,250 @@
 #!/usr/bin/env python
 ########################################################################.......
 
-"""List the contents of the current directory.
+"""List the contents of the given directories, or of the current
+directory. Files given as arguments are listed themselves.
 """
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import os
 import stat
 import sys
+import time
+
+import _shargs
+import _shfs
+
+try:
+    import grp
+    import pwd
+except ImportError:
+    grp = pwd = None
 
 WIDTH = 80
+RECENT = 180 * 24 * 60 * 60 # Show the time instead of the year for files younger than this
 
-def has_flag(bits, flag):
-    return bits & flag == flag
+FILETYPES = [
+    (stat.S_IFDIR, "d"), (stat.S_IFLNK, "l"), (stat.S_IFIFO, "p"), (stat.S_IFSOCK, "s"),
+    (stat.S_IFCHR, "c"), (stat.S_IFBLK, "b"), (stat.S_IFREG, "-"),
+]
+PERMISSIONS = [
+    (stat.S_IRUSR, "r"), (stat.S_IWUSR, "w"), (stat.S_IXUSR, "x"),
+    (stat.S_IRGRP, "r"), (stat.S_IWGRP, "w"), (stat.S_IXGRP, "x"),
+    (stat.S_IROTH, "r"), (stat.S_IWOTH, "w"), (stat.S_IXOTH, "x"),
+]
 
-def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("-a", "--all", action="store_true",
-                   help="list all files, including hidden ones")
-    p.add_argument("-A", "--almost-all", action="store_true",
-                   help="like -a, but don't include . and ..")
-    p.add_argument("-B", "--ignore-backups", action="store_true",
-                   help="don't include backups (files ending in ~)")
-    p.add_argument("-F", "--file-type", action="store_true",
-                   help="show type indicators /@|= behind directories, symlinks, FIFOs and sockets")
-    p.add_argument("dir", action="store", nargs="*", default=[os.getcwdu()], 
-                   type=unicode, help="directory to be listed, defaults to current directory")
-    ns = p.parse_args(args)
+def filemode(mode):
+    """Return the ls -l style string (like drwxr-xr-x) for mode.
+    """
     
-    status = 0
+    kind = "?"
+    for bits, char in FILETYPES:
+        if stat.S_IFMT(mode) == bits:
+            kind = char
+    return kind + "".join(char if mode & bits else "-" for bits, char in PERMISSIONS)
+
+def indicator(entry):
+    """Return the -F type indicator for entry, using the file type
+    information from the directory listing where possible.
+    """
     
     try:
-        items = os.listdir(ns.dir[0])
-    except Exception as err:
-        print("ls: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
-        status = 1
-        sys.exit(status)
+        if entry.is_symlink():
+            return "@"
+        elif entry.is_dir():
+            return "/"
+        elif entry.is_file():
+            return " "
+        mode = entry.stat(follow_symlinks=False).st_mode
+    except OSError:
+        return "?"
     
-    if ns.all:
-        items = [".", ".."] + items
-    elif not ns.almost_all:
-        items = [i for i in items if not i.startswith(".")]
+    if stat.S_ISFIFO(mode):
+        return "|"
+    elif stat.S_ISSOCK(mode):
+        return "="
+    else:
+        return " "
+
+def lstat_or_none(entry):
+    try:
+        return entry.stat(follow_symlinks=False)
+    except OSError:
+        return None
+
+def sort_entries(entries, ns):
+    """Sort entries by name, or by size or modification time (largest
+    or newest first) if requested.
+    """
     
-    if ns.ignore_backups:
-        items = [i for i in items if not i.endswith("~")]
+    if ns.sort_size or ns.sort_time:
+        field = "st_size" if ns.sort_size else "st_mtime"
+        def key(entry):
+            st = lstat_or_none(entry)
+            return (-getattr(st, field) if st else 0, entry.name)
+    else:
+        key = lambda entry: entry.name
     
-    if not items:
-        sys.exit(status)
+    entries.sort(key=key, reverse=ns.reverse)
+    return entries
+
+def format_columns(entries, ns):
+    """Return the names of entries arranged in columns.
+    """
+    
+    if ns.file_type:
+        items = [entry.name + indicator(entry) for entry in entries]
+    else:
+        items = [entry.name for entry in entries]
     
     longest = max(map(len, items)) + 2
-    cols = WIDTH // longest
-    text = ""
-    for i, item in enumerate(items):
-        text += item
-        if ns.file_type:
+    cols = max(1, WIDTH // longest)
+    return "\n".join("".join(item.ljust(longest) for item in items[i:i+cols]).rstrip()
+                     for i in range(0, len(items), cols))
+
+def format_long(entries, ns):
+    """Return one line with mode, link count, owner, group, size,
+    modification time and name per entry.
+    """
+    
+    names = {}
+    def name_of(table, id):
+        if (table, id) not in names:
             try:
-                statinfo = os.stat(item)
+                names[table, id] = unicode(table(id)[0])
+            except KeyError:
+                names[table, id] = unicode(id)
+        return names[table, id]
+    
+    now = time.time()
+    rows = []
+    for entry in entries:
+        st = lstat_or_none(entry)
+        if st is None:
+            rows.append(("?" * 10, "?", "?", "?", "?", "?", entry.name))
+            continue
+        
+        name = entry.name + (indicator(entry) if ns.file_type else "")
+        if stat.S_ISLNK(st.st_mode):
+            try:
+                name += " -> " + os.readlink(entry.path)
             except OSError:
-                text += "?"
-            else:
-                if stat.S_ISDIR(statinfo.st_mode):
-                    text += "/"
-                elif stat.S_ISLNK(statinfo.st_mode):
-                    text += "@"
-                elif stat.S_ISFIFO(statinfo.st_mode):
-                    text += "|"
-                elif stat.S_ISSOCK(statinfo.st_mode):
-                    text += "="
-                else:
-                    text += " "
+                pass
+        
+        timefmt = "%b %d %H:%M" if now - RECENT < st.st_mtime <= now else "%b %d  %Y"
+        rows.append((
+            filemode(st.st_mode),
+            unicode(st.st_nlink),
+            name_of(pwd.getpwuid, st.st_uid) if pwd else unicode(st.st_uid),
+            name_of(grp.getgrgid, st.st_gid) if grp else unicode(st.st_gid),
+            unicode(st.st_size),
+            unicode(time.strftime(timefmt, time.localtime(st.st_mtime))),
+            name,
+        ))
+    
+    widths = [max(len(row[i]) for row in rows) for i in range(6)]
+    return "\n".join("{} {:>{}} {:<{}} {:<{}} {:>{}} {} {}".format(
+        mode, nlink, widths[1], owner, widths[2], group, widths[3],
+        size, widths[4], mtime, name,
+    ) for mode, nlink, owner, group, size, mtime, name in rows)
+
+def format_entries(entries, ns):
+    if not entries:
+        return ""
+    elif ns.long:
+        return format_long(entries, ns)
+    else:
+        return format_columns(entries, ns)
+
+def list_dir(path, ns):
+    """Return the visible entries of directory path and the paths of
+    its subdirectories.
+    """
+    
+    entries = []
+    for entry in _shfs.scandir(path):
+        if ns.ignore_backups and entry.name.endswith("~"):
+            continue
+        if entry.name.startswith(".") and not (ns.all or ns.almost_all):
+            continue
+        entries.append(entry)
+    
+    subdirs = []
+    if ns.recursive:
+        subdirs = [entry.path for entry in sort_entries(list(entries), ns)
+                   if entry.is_dir(follow_symlinks=False)]
+    
+    if ns.all:
+        entries.append(_shfs.PathEntry(os.path.join(path, "."), "."))
+        entries.append(_shfs.PathEntry(os.path.join(path, ".."), ".."))
+    
+    return sort_entries(entries, ns), subdirs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-a", "--all", action="store_true",
+                    help="list all files, including hidden ones")
+parser.add_argument("-A", "--almost-all", action="store_true",
+                    help="like -a, but don't include . and ..")
+parser.add_argument("-B", "--ignore-backups", action="store_true",
+                    help="don't include backups (files ending in ~)")
+parser.add_argument("-F", "--file-type", action="store_true",
+                    help="show type indicators /@|= behind directories, symlinks, FIFOs and sockets")
+parser.add_argument("-l", "--long", action="store_true",
+                    help="use a long listing format with mode, owner, size and modification time")
+parser.add_argument("-R", "--recursive", action="store_true",
+                    help="list subdirectories recursively")
+parser.add_argument("-S", "--sort-size", action="store_true",
+                    help="sort by file size, largest first")
+parser.add_argument("-t", "--sort-time", action="store_true",
+                    help="sort by modification time, newest first")
+parser.add_argument("-r", "--reverse", action="store_true",
+                    help="reverse the sort order")
+parser.add_argument("dir", action="store", nargs="*",
+                    type=unicode, help="directories to be listed, defaults to current directory")
+
+def main(args):
+    ns = parser.parse_args(args)
+    # The default depends on the current directory at the time of the call
+    ns.dir = ns.dir or [os.getcwdu()]
+    
+    status = 0
+    
+    # Files given as arguments are listed together, before all directories
+    files = []
+    dirs = []
+    for path in ns.dir:
+        entry = _shfs.PathEntry(path, path)
+        try:
+            entry.stat(follow_symlinks=False)
+        except OSError as err:
+            print("ls: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+            status = 1
+            continue
+        (dirs if entry.is_dir() else files).append(path)
+    
+    sections = []
+    if files:
+        sections.append(format_entries(sort_entries([_shfs.PathEntry(f, f) for f in files], ns), ns))
+    
+    showheaders = ns.recursive or len(ns.dir) > 1
+    pending = list(reversed(sorted(dirs)))
+    while pending:
+        path = pending.pop()
+        try:
+            entries, subdirs = list_dir(path, ns)
+        except OSError as err:
+            print("ls: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+            status = 1
+            continue
         
-        text += " " * (longest - len(item) - (1 if ns.file_type else 0))
-        if (i+1) % cols == 0:
-            text += "\n"
+        text = format_entries(entries, ns)
+        sections.append("{}:\n{}".format(path, text) if showheaders else text)
+        pending.extend(reversed(subdirs))
     
-    print(text)
+    text = "\n\n".join(sections)
+    if text:
+        print(text)
     
     sys.exit(status)
 
@@ -7,17 +7,19 @@ unless -p is specified.
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import os
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-p", "--parents", action="store_true",
+                    help="create parent directories as necessary")
+parser.add_argument("dir", action="store", nargs="+", type=unicode,
+                    help="the directory to be created")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("-p", "--parents", action="store_true",
-                   help="create parent directories as necessary")
-    p.add_argument("dir", action="store", nargs="+", type=unicode,
-                   help="the directory to be created")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     status = 0
     
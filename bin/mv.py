@@ -4,72 +4,219 @@
 """Move (rename) a file or directory to a new name, or into a new
 directory. Multiple source files may be specified if the destination is
 an existing directory.
+
+All sources are first renamed, which is a cheap operation. Sources on a
+different file system than the destination are then copied and deleted,
+files in parallel. With --journal, every move is recorded in a file, so
+an interrupted batch can be finished with --resume or undone with
+--rollback.
 """
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
+import errno
+import io
+import json
 import os
-import shutil
 import sys
+import threading
 
-def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("src", action="store", nargs="+", type=unicode,
-                   help="one or more source files or folders")
-    p.add_argument("dest", action="store", type=unicode,
-                   help="the destination name or folder")
-    ns = p.parse_args(args)
-    
-    status = 0
-    
-    if len(ns.src) > 1:
-        # Multiple source files
-        if os.path.exists(ns.dest):
-            # Destination must exist...
-            if os.path.isdir(ns.dest):
-                # ...and be a directory
-                for src in ns.src:
-                    try:
-                        # Attempt to move every source into destination
-                        shutil.move(src, os.path.join(ns.dest, os.path.basename(src)))
-                    except Exception as err:
-                        print("mv: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
-                        status = 1
-            else:
-                print("mv: {}: not a directory".format(ns.dest), file=sys.stderr)
-        else:
-            print("mv: {}: no such file or directory".format(ns.dest), file=sys.stderr)
-            status = 1
+import _shargs
+import _shfs
+
+class Journal(object):
+    """Append-only record of a batch of moves. The file starts with one
+    "plan" record per move, followed by "done" and "undone" records as
+    moves are made and reverted. A journal without a filename records
+    nothing.
+    """
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.file = None
+    
+    def _write(self, records):
+        if self.filename is None:
+            return
+        with self.lock:
+            if self.file is None:
+                self.file = io.open(self.filename, "a", encoding="utf-8")
+            self.file.write("".join(unicode(json.dumps(record)) + "\n" for record in records))
+            self.file.flush()
+    
+    def plan(self, moves):
+        self._write({"op": "plan", "index": i, "src": src, "dst": dst}
+                    for i, (src, dst) in enumerate(moves))
+    
+    def done(self, index):
+        self._write([{"op": "done", "index": index}])
+    
+    def undone(self, index):
+        self._write([{"op": "undone", "index": index}])
+    
+    def load(self):
+        """Read the journal and return the planned moves and the set of
+        indices of the moves that are currently done.
+        """
+        
+        moves = {}
+        done = set()
+        with io.open(self.filename, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last line may be incomplete after a crash
+                    continue
+                if record["op"] == "plan":
+                    moves[record["index"]] = (record["src"], record["dst"])
+                elif record["op"] == "done":
+                    done.add(record["index"])
+                elif record["op"] == "undone":
+                    done.discard(record["index"])
+        return [moves[i] for i in sorted(moves)], done
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+def plan_moves(srcs, dest):
+    """Return the list of (src, dst) pairs for moving srcs to dest, or
+    raise ValueError if that is not possible. The destination is only
+    looked up once.
+    """
+    
+    try:
+        dest_isdir = _shfs.PathEntry(dest).is_dir()
+        dest_exists = dest_isdir or os.path.lexists(dest)
+    except OSError:
+        dest_isdir = dest_exists = False
+    
+    if dest_isdir:
+        return [(src, os.path.join(dest, os.path.basename(os.path.normpath(src)))) for src in srcs]
+    elif len(srcs) > 1:
+        raise ValueError("{}: {}".format(dest, "not a directory" if dest_exists else "no such file or directory"))
+    elif dest_exists:
+        # Won't overwrite unasked
+        raise ValueError("{}: file exists".format(dest))
     else:
-        # Single source file
-        src = ns.src[0]
-        if os.path.exists(src):
-            # Source must exist
-            if os.path.exists(ns.dest):
-                # If destination exists...
-                if os.path.isdir(ns.dest):
-                    # ...it must be a folder
-                    try:
-                        # Attempt to move source into destination
-                        shutil.move(src, os.path.join(ns.dest, os.path.basename(src)))
-                    except Exception as err:
-                        print("mv: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
-                        status = 1
-                else:
-                    # Won't overwrite unasked
-                    print("mv: {}: file exists".format(ns.dest), file=sys.stderr)
+        return [(srcs[0], dest)]
+
+def run_moves(moves, done, ondone, pool, progress, onerror):
+    """Make all moves whose index is not in done, calling ondone with
+    the index of every finished move. Every source is renamed first,
+    those that fail with EXDEV are moved with the copy engine
+    afterwards. Returns the number of errors.
+    """
+    
+    errors = [0]
+    def error(err):
+        errors[0] += 1
+        onerror(err)
+    
+    crossdev = []
+    for i, (src, dst) in enumerate(moves):
+        if i in done:
+            continue
+        try:
+            os.rename(src, dst)
+        except OSError as err:
+            if err.errno == errno.EXDEV:
+                crossdev.append(i)
             else:
-                # Destination doesn't exist
-                try:
-                    # Try to rename source to destination
-                    shutil.move(src, ns.dest)
-                except Exception as err:
-                    print("mv: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
-                    status = 1
+                # os.rename doesn't say which file the error is about
+                err.filename = err.filename or src
+                error(err)
+            continue
+        progress.add(files=1)
+        ondone(i)
+        progress.show()
+    
+    def move_file(i, src, dst):
+        _shfs.move_file(src, dst, progress)
+        ondone(i)
+    
+    for i in crossdev:
+        src, dst = moves[i]
+        if _shfs.PathEntry(src).is_dir(follow_symlinks=False):
+            if not _shfs.move_tree(src, dst, pool, progress, error):
+                ondone(i)
         else:
-            print("mv: {}: no such file or directory".format(src), file=sys.stderr)
-            status = 1
+            pool.submit(move_file, i, src, dst)
+        while pool.errors:
+            error(pool.errors.popleft())
+        progress.show()
+    
+    while not pool.wait(progress.interval):
+        progress.show()
+    while pool.errors:
+        error(pool.errors.popleft())
+    
+    return errors[0]
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("--journal", action="store", type=unicode,
+                    help="record the moves in this file")
+parser.add_argument("--resume", action="store", metavar="JOURNAL", type=unicode,
+                    help="finish the moves recorded in a journal")
+parser.add_argument("--rollback", action="store", metavar="JOURNAL", type=unicode,
+                    help="undo the moves recorded in a journal")
+parser.add_argument("--progress", action="store_true",
+                    help="show the number of files and bytes moved and the rate")
+parser.add_argument("-j", "--jobs", action="store", default=_shfs.WORKERS, type=int,
+                    help="number of threads copying files between file systems")
+parser.add_argument("paths", action="store", nargs="*", type=unicode, metavar="src... dest",
+                    help="one or more source files or folders and the destination name or folder")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    journalfile = ns.resume or ns.rollback
+    if ns.resume and ns.rollback:
+        parser.error("--resume and --rollback cannot be combined")
+    elif journalfile and (ns.paths or ns.journal):
+        parser.error("--{} takes no other files".format("resume" if ns.resume else "rollback"))
+    elif not journalfile and len(ns.paths) < 2:
+        parser.error("a source and a destination are required")
+    
+    def onerror(err):
+        print("mv: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+    
+    try:
+        if journalfile:
+            journal = Journal(journalfile)
+            moves, done = journal.load()
+        else:
+            moves = plan_moves(ns.paths[:-1], ns.paths[-1])
+            done = set()
+            journal = Journal(ns.journal)
+            journal.plan(moves)
+    except ValueError as err:
+        print("mv: {!s}".format(err), file=sys.stderr)
+        sys.exit(1)
+    except (IOError, OSError) as err:
+        onerror(err)
+        sys.exit(1)
+    
+    if ns.rollback:
+        # Undo in reverse order, every done move becomes a move back
+        order = sorted(done, reverse=True)
+        moves = [(moves[i][1], moves[i][0]) for i in order]
+        done = set()
+        ondone = lambda i: journal.undone(order[i])
+    else:
+        ondone = journal.done
+    
+    progress = _shfs.Progress(sys.stderr if ns.progress else None)
+    with _shfs.WorkerPool(max(1, ns.jobs)) as pool:
+        try:
+            status = 1 if run_moves(moves, done, ondone, pool, progress, onerror) else 0
+        finally:
+            journal.close()
+    
+    if ns.progress:
+        progress.show(final=True)
     
     sys.exit(status)
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Print the functions that took the most time in the commands profiled
+with SH_PROFILE=1, summed over all .pstats files in the profile
+directory (SH_PROFILE_DIR, or sh_profile in the temporary directory).
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import os
+import pstats
+import sys
+
+import _shargs
+import _shprof
+
+SORT_KEYS = ("cumulative", "tottime", "calls", "name")
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-n", "--count", action="store", default=20, type=int,
+                    help="number of functions to show, defaults to 20")
+parser.add_argument("-s", "--sort", action="store", default="cumulative", choices=SORT_KEYS,
+                    help="sort order, defaults to cumulative")
+parser.add_argument("-c", "--command", action="store", type=unicode,
+                    help="only include profiles of this command")
+parser.add_argument("--clear", action="store_true",
+                    help="delete all collected profiles")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    directory = _shprof.profile_dir()
+    try:
+        filenames = sorted(f for f in os.listdir(directory) if f.endswith(".pstats"))
+    except OSError:
+        filenames = []
+    if ns.command:
+        filenames = [f for f in filenames if f.rsplit("-", 3)[0] == ns.command]
+    
+    if ns.clear:
+        for filename in filenames:
+            os.remove(os.path.join(directory, filename))
+        print("profstat: deleted {} profiles".format(len(filenames)))
+        sys.exit(0)
+    
+    if not filenames:
+        print("profstat: no profiles in {} (run commands with SH_PROFILE=1)".format(directory), file=sys.stderr)
+        sys.exit(1)
+    
+    stats = pstats.Stats(*[os.path.join(directory, f).encode("utf-8") for f in filenames], stream=sys.stdout)
+    print("{} profiles in {}".format(len(filenames), directory))
+    stats.strip_dirs().sort_stats(ns.sort).print_stats(ns.count)
+    
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
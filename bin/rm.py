@@ -6,44 +6,70 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import errno
 import os
-import shutil
 import sys
 
+import _shargs
+import _shfs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-d", "--dir", action="store_true",
+                    help="delete directories if they are empty")
+parser.add_argument("-r", "-R", "--recursive", action="store_true",
+                    help="recursively delete contents of directories")
+parser.add_argument("-n", "--dry-run", action="store_true",
+                    help="only count what would be deleted")
+parser.add_argument("--progress", action="store_true",
+                    help="show the number of files and bytes deleted and the rate")
+parser.add_argument("-j", "--jobs", action="store", default=_shfs.WORKERS, type=int,
+                    help="number of threads deleting files in parallel")
+# The following three are dummy parameters, the situations they handle
+# cannot occur on iOS
+parser.add_argument("--one-file-system", action="store_true",
+                    help="ignore files on a file system other than that of file")
+parser.add_argument("--no-preserve-root", action="store_true", dest="preserve-root",
+                    help="do not treat / specially")
+parser.add_argument("--preserve-root", action="store_false",
+                    help="do not attempt to remove / (default behavior)")
+parser.add_argument("file", action="store", nargs="+", type=unicode,
+                    help="files to be removed")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("-d", "--dir", action="store_true",
-                   help="delete directories if they are empty")
-    p.add_argument("-r", "-R", "--recursive", action="store_true",
-                   help="recursively delete contents of directories")
-    # The following three are dummy parameters, the situations they handle
-    # cannot occur on iOS
-    p.add_argument("--one-file-system", action="store_true",
-                   help="ignore files on a file system other than that of file")
-    p.add_argument("--no-preserve-root", action="store_true", dest="preserve-root",
-                   help="do not treat / specially")
-    p.add_argument("--preserve-root", action="store_false",
-                   help="do not attempt to remove / (default behavior)")
-    p.add_argument("file", action="store", nargs="+",
-                   default=[os.path.expanduser("~")], type=unicode,
-                   help="files to be removed")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     status = 0
+    progress = _shfs.Progress(sys.stderr if ns.progress else None)
+    
+    def onerror(err):
+        print("rm: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+    
+    with _shfs.WorkerPool(max(1, ns.jobs)) as pool:
+        for f in ns.file:
+            try:
+                entry = _shfs.PathEntry(f)
+                if ns.recursive and entry.is_dir(follow_symlinks=False):
+                    if _shfs.remove_tree(f, pool, progress, ns.dry_run, onerror):
+                        status = 1
+                elif ns.dir and entry.is_dir(follow_symlinks=False):
+                    if not ns.dry_run:
+                        os.rmdir(f)
+                    progress.add(dirs=1)
+                else:
+                    size = entry.stat(follow_symlinks=False).st_size
+                    if entry.is_dir(follow_symlinks=False):
+                        raise OSError(errno.EISDIR, os.strerror(errno.EISDIR), f)
+                    if not ns.dry_run:
+                        os.remove(f)
+                    progress.add(files=1, size=size)
+            except Exception as err:
+                onerror(err)
+                status = 1
     
-    for f in ns.file:
-        try:
-            if ns.recursive:
-                shutil.rmtree(f)
-            elif ns.dir:
-                os.rmdir(f)
-            else:
-                os.remove(f)
-        except Exception as err:
-            print("rm: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
-            status = 1
+    if ns.progress:
+        progress.show(final=True)
+    if ns.dry_run:
+        print("rm: would delete {}".format(progress.summary()))
     
     sys.exit(status)
 
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Set or unset shell options. -e (-o errexit) stops a script at the
+first command that fails, -x (-o xtrace) prints every command before it
+is run. -o isolate runs commands in separate worker processes, so a
+command that crashes or changes global state doesn't affect the shell;
+commands that change the shell itself, like cd, still run in the shell.
+Options are unset with + instead of -. Without arguments, the current
+options are shown.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shstate
+
+def main(args):
+    if not args:
+        for name, value in sorted(_shstate.options.items()):
+            print("set {}o {}".format("-" if value else "+", name))
+        sys.exit(0)
+    
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in ("-h", "--help"):
+            print("usage: set [-ex] [+ex] [-o option] [+o option]")
+            print()
+            print(__doc__)
+            sys.exit(0)
+        elif len(arg) < 2 or arg[0] not in "-+":
+            print("set: {}: invalid argument".format(arg), file=sys.stderr)
+            sys.exit(2)
+        
+        value = arg[0] == "-"
+        if arg[1:] == "o":
+            if not args:
+                print("set: {}o: option name expected".format(arg[0]), file=sys.stderr)
+                sys.exit(2)
+            names = [args.pop(0)]
+        else:
+            names = [_shstate.OPTION_LETTERS.get(letter, letter) for letter in arg[1:]]
+        
+        for name in names:
+            if name not in _shstate.options:
+                print("set: {}: invalid option".format(name), file=sys.stderr)
+                sys.exit(2)
+            _shstate.options[name] = value
+    
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -3,336 +3,380 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import glob
+import argparse
+import collections
+import io
 import os
+import re
 import string
 import sys
+import threading
 
-# Parser constants
-MODE_NONE = 0x0 # Blank mode, used at start and expected at end
-MODE_1QUOT = 0x1 # Used during single-quoted 'string'
-MODE_2QUOT = 0x2 # Used during double-quoted "string"
-MODE_ESCAPE = 0x4 # Used during backslash \escapes
-MODE_ENVVAR = 0x8 # Used during single-word $envvars 
-MODE_BRACENV = 0x10 # Used during multi-word ${braced envvars}
+# Make the shell's support modules (_sh*.py) importable by commands
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import _shcomplete
+import _shglob
+import _shhash
+import _shhistory
+import _shio
+import _shjobs
+import _shprof
+import _shprompt
+import _shregistry
+import _shstate
+import _shworkers
 
+# Parser constants
 ESC_NONE = 0 # Don't escape
 ESC_SEMI = 1 # Escape like in double quotes
 ESC_ALL = 2 # Always escape
 
 # Shell constants
 ENVVAR_CHARS = string.ascii_letters + string.digits + "_"
-PROMPT = "{path} $ " # Shell prompt format string
+LEXCACHE_SIZE = 64 # Number of recently lexed command lines to remember
+REDIRECTS_NOFILE = ("2>&1", ">&2") # Redirections that don't take a file name
 
-def has_flag(bits, flag):
-    """Return whether flag is 1 in bits.
-    """
-    return bits & flag == flag
+# Lexer token patterns. Anything not matched by these is an unclosed
+# quote or a backslash at the end of the command.
+TOKEN_RE = re.compile(r"""
+    (?P<space>\ +)                      # Unescaped spaces separate words
+    |(?P<op>2>&1|>&2|2>>|2>|>>|[|<>&])  # Pipe, redirection and background operators
+    |(?P<plain>[^'"\\\ |<>&]+)          # Run of unquoted characters
+    |'(?P<quot1>[^']*)'                 # Single-quoted 'string'
+    |"(?P<quot2>(?:[^"\\]|\\.)*)"       # Double-quoted "string"
+    |\\(?P<escaped>.)                   # Backslash escape
+""", re.VERBOSE | re.DOTALL)
+QUOT2_RE = re.compile(r"\\(.)|([^\\]+)", re.DOTALL)
+
+# One-byte escape levels, multiplied to build escape spans
+ESC_BYTES = [bytearray([ESC_NONE]), bytearray([ESC_SEMI]), bytearray([ESC_ALL])]
+
+_lexcache = collections.OrderedDict()
+_scriptcache = {} # Parsed scripts, {path: ((mtime, size), (records, errors))}
 
 def collapseuser(path):
     """Reverse of os.path.expanduser: return path relative to ~, if
     such representation is meaningful. If path is not ~ or a
     subdirectory, the absolute path will be returned.
     """
-    path = os.path.abspath(unicode(path))
-    home = os.path.expanduser("~")
-    if os.path.exists(os.path.expanduser("~/Pythonista.app")):
-        althome = os.path.dirname(os.path.realpath(os.path.expanduser("~/Pythonista.app")))
-    else:
-        althome = home
-    
-    if path.startswith(home):
-        collapsed = os.path.relpath(path, home)
-    elif path.startswith(althome):
-        collapsed = os.path.relpath(path, althome)
-    else:
-        collapsed = path
-    
-    ##print(path, home, althome, collapsed)
-    
-    return "~" if collapsed == "." else os.path.join("~", collapsed)
+    return _shprompt.collapseuser(path)
 
-def process_escapes(cmd):
-    """Process cmd and determine the "escape level" of every
-    character. Returns a 2-tuple (newcmd, escapes), where newcmd
-    is the input command with any escape characters removed, and
-    escapes is a list of integers representing different escape
-    levels. The meanings of these integers are defined in the
-    ESC_* constants.
+def lex_cmd(cmd):
+    """Split cmd into words in a single pass, removing quotes and
+    backslash escapes. Returns a list of 2-tuples (word, escapes),
+    where escapes is a bytearray holding the escape level of every
+    character in word, as defined in the ESC_* constants. Unescaped
+    operators like | and > are separate words with escapes set to None.
+    Recently lexed lines are cached, the returned lists must not be
+    modified.
     """
     
-    # Init locals
     cmd = unicode(cmd).strip()
-    newcmd = ""
-    escapes = []
-    mode = MODE_NONE
-    
-    # Process cmd
-    for char in cmd:
-        if has_flag(mode, MODE_ESCAPE):
-            # Escape this character. The exception of \ inside 1quoted
-            # string is already handled with the previous char, because
-            # in that case the MODE_ESCAPE flag would not be set.
-            newcmd += char
-            escapes.append(ESC_ALL)
-            mode ^= MODE_ESCAPE
-        elif char == "'" and not has_flag(mode, MODE_2QUOT):
-            # Start or end 1quoted string, unless in 2quoted string
-            mode ^= MODE_1QUOT
-        elif char == '"' and not has_flag(mode, MODE_1QUOT):
-            # Start or end 2quoted string, unless in 1quoted string
-            mode ^= MODE_2QUOT
-        elif char == "\\":
-            # Escape the following character, unless in 1quoted string
-            # If in 2quoted string, add a \ before characters that are
-            # unnecessarily escaped.
-            if has_flag(mode, MODE_1QUOT):
-                newcmd += "\\"
-                escapes.append(ESC_ALL)
-            elif has_flag(mode, MODE_2QUOT) and char not in r'\$"':
-                newcmd += "\\"
-                escapes.append(ESC_ALL)
-                mode ^= MODE_ESCAPE
-            else:
-                mode ^= MODE_ESCAPE
-        else:
-            newcmd += char
+    words = _lexcache.pop(cmd, None)
+    
+    if words is None:
+        words = []
+        text = []
+        escapes = bytearray()
+        pos = 0
+        end = len(cmd)
+        
+        while pos < end:
+            match = TOKEN_RE.match(cmd, pos)
+            if match is None:
+                if cmd[pos] == "'":
+                    raise ValueError("Unclosed single-quoted string in command")
+                elif cmd[pos] == '"':
+                    raise ValueError("Unclosed double-quoted string in command")
+                else:
+                    raise ValueError("Unfinished backslash escape at end of command")
             
-            if has_flag(mode, MODE_1QUOT):
-                # Inside 1quoted string, full escape
-                escapes.append(ESC_ALL)
-            elif has_flag(mode, MODE_2QUOT):
-                # Inside 2quoted string, semi-escape
-                escapes.append(ESC_SEMI)
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "space":
+                # Unescaped space, split here
+                if escapes:
+                    words.append(("".join(text), escapes))
+                text = []
+                escapes = bytearray()
+            elif kind == "op" and value.startswith("2") and escapes:
+                # 2> in the middle of a word is not an operator
+                text.append("2")
+                escapes += ESC_BYTES[ESC_NONE]
+                pos += 1
+                continue
+            elif kind == "op":
+                # Operator, always a word of its own
+                if escapes:
+                    words.append(("".join(text), escapes))
+                words.append((value, None))
+                text = []
+                escapes = bytearray()
+            elif kind == "plain":
+                text.append(value)
+                escapes += ESC_BYTES[ESC_NONE] * len(value)
+            elif kind == "quot1":
+                # Inside 1quoted string, full escape, even for \
+                text.append(value)
+                escapes += ESC_BYTES[ESC_ALL] * len(value)
+            elif kind == "quot2":
+                # Inside 2quoted string, semi-escape, except for
+                # backslash-escaped characters
+                for escaped, run in QUOT2_RE.findall(value):
+                    if run:
+                        text.append(run)
+                        escapes += ESC_BYTES[ESC_SEMI] * len(run)
+                    else:
+                        text.append(escaped)
+                        escapes += ESC_BYTES[ESC_ALL]
             else:
-                # Outside quoted string, no escape
-                escapes.append(ESC_NONE)
-    
-    # Post-parse sanity checks
-    if mode != MODE_NONE:
-        if has_flag(mode, MODE_1QUOT):
-            raise ValueError("Unclosed single-quoted string in command")
-        elif has_flag(mode, MODE_2QUOT):
-            raise ValueError("Unclosed double-quoted string in command")
-        elif has_flag(mode, MODE_ESCAPE):
-            raise ValueError("Unfinished backslash escape at end of command")
-        else:
-            raise ValueError("Parser flags are not zero: " + hex(mode))
+                text.append(value)
+                escapes += ESC_BYTES[ESC_ALL]
+            
+            pos = match.end()
+        
+        # Append last word (if any)
+        if escapes:
+            words.append(("".join(text), escapes))
+    
+    # Remember as most recently used line
+    _lexcache[cmd] = words
+    while len(_lexcache) > LEXCACHE_SIZE:
+        _lexcache.popitem(last=False)
     
-    return newcmd, escapes
+    return words
 
-def split_cmd(cmd, escapes=None):
-    """Split cmd at unescaped spaces. escapes should be a list
-    of escape levels (integers). If escapes is omitted or None,
-    the entire command is considered unescaped.
+def expand_user(word, escapes):
+    """Expand a leading ~ in word to the user's home directory.
+    Returns a new 2-tuple (word, escapes).
     """
     
-    # Init locals
-    if escapes is None:
-        escapes = [ESC_NONE] * len(cmd)
-    
-    cmdparts = []
-    escparts = []
-    curcmd = ""
-    curesc = []
-    
-    # Process cmd and escapes
-    for char, esc in zip(cmd, escapes):
-        if char == " " and esc == ESC_NONE:
-            # Unescaped space, split here
-            if curcmd != "":
-                cmdparts.append(curcmd)
-                escparts.append(curesc)
-            curcmd = ""
-            curesc = []
-        else:
-            # Other character, append unchanged
-            curcmd += char
-            curesc.append(esc)
-    
-    # Append last command/escapes (if any) to return lists
-    if curcmd != "":
-        cmdparts.append(curcmd)
-        escparts.append(curesc)
-    
-    return cmdparts, escparts
+    if word.startswith("~") and (len(word) < 2 or word[1] in os.sep+os.pathsep):
+        home = os.path.expanduser("~")
+        return home + word[1:], escapes[0:1]*len(home) + escapes[1:]
+    else:
+        return word, escapes
 
-def parse_cmd(cmd, expanduser=True, expandvars=True, doglob=True):
-    """Parse cmd as a shell input, split it into individual parts,
-    and optionally expand environment variables and do globbing.
+def expand_vars(word, escapes):
+    """Expand all $envvars and ${braced envvars} in word that are not
+    fully escaped. Returns a new 2-tuple (word, escapes).
     """
     
-    # Step 1 and 2 have been moved to separate functions.
-    # Need to do the same for steps 3-5.
-    parts, partesc = split_cmd(*process_escapes(cmd))
+    if "$" not in word:
+        return word, escapes
     
-    # Step 3: Expand user home (~)
-    usrparts = []
-    usresc = []
+    text = []
+    newesc = bytearray()
+    pos = 0
+    end = len(word)
     
-    for part, escapes in zip(parts, partesc):
-        if not expanduser:
-            usrparts = parts
-            usresc = partesc
+    while pos < end:
+        # Find the next $ that is not fully escaped and copy everything
+        # up to there unchanged
+        start = word.find("$", pos)
+        while start != -1 and escapes[start] == ESC_ALL:
+            start = word.find("$", start + 1)
+        if start == -1:
+            start = end
+        text.append(word[pos:start])
+        newesc += escapes[pos:start]
+        if start == end:
             break
         
-        if part.startswith("~") and (len(part) < 2 or part[1] in os.sep+os.pathsep):
-            home = os.path.expanduser("~")
-            usrparts.append(home + part[1:])
-            usresc.append(escapes[0:1]*len(home) + escapes[1:])
-        else:
-            usrparts.append(part)
-            usresc.append(escapes)
-    
-    # Step 4: Expand environment variables
-    current = ""
-    curesc = []
-    varname = ""
-    varesc = ESC_NONE
-    mode = MODE_NONE
-    xpndparts = []
-    xpndesc = []
-    
-    for part, escapes in zip(usrparts, usresc):
-        if not expandvars:
-            xpndparts = parts
-            xpndesc = partesc
-            break
-        
-        for char, esc in zip(part, escapes):
-            if char == "$" and not has_flag(mode, MODE_BRACENV) and esc != ESC_ALL:
-                # Start of envvar that is not fully escaped
-                if has_flag(mode, MODE_ENVVAR):
-                    # Start of envvar during other envvar, expand the first one
-                    mode ^= MODE_ENVVAR
-                    val = os.environ.get(varname, "")
-                    current += val
-                    curesc += [varesc] * len(val)
-                    varname = ""
-                    varesc = ESC_NONE
-                    
-                mode ^= MODE_ENVVAR
+        # Read the variable name following the $
+        varesc = escapes[start]
+        varname = []
+        braced = False
+        pos = start + 1
+        literal = None
+        while pos < end:
+            char = word[pos]
+            esc = escapes[pos]
+            if char == "$" and not braced and esc != ESC_ALL:
+                # Start of envvar during other envvar, expand the first one
+                val = os.environ.get("".join(varname), "")
+                text.append(val)
+                newesc += ESC_BYTES[varesc] * len(val)
+                varname = []
                 varesc = esc
-            elif (char == "{" and varname == "" and has_flag(mode, MODE_ENVVAR)
-                  and not has_flag(mode, MODE_BRACENV)):
+            elif char == "{" and not varname and not braced:
                 # { immediately after $, start of braced envvar
-                mode ^= MODE_BRACENV
-            elif char == "}" and has_flag(mode, MODE_BRACENV):
+                braced = True
+            elif char == "}" and braced:
                 # End of braced envvar
-                mode ^= MODE_ENVVAR ^ MODE_BRACENV
-                val = os.environ.get(varname, "")
-                current += val
-                curesc += [varesc] * len(val)
-                varname = ""
-                varesc = ESC_NONE
-            elif (char not in ENVVAR_CHARS and has_flag(mode, MODE_ENVVAR)
-                  and not has_flag(mode, MODE_BRACENV)):
+                pos += 1
+                break
+            elif char not in ENVVAR_CHARS and not braced:
                 # Implicit end of non-braced envvar, because char is not
                 # a normal varname char
-                mode ^= MODE_ENVVAR
-                val = os.environ.get(varname, "")
-                current += val
-                curesc += [varesc] * len(val)
-                varname = ""
-                varesc = ESC_NONE
-                
-                current += char
-                curesc.append(esc)
-            elif has_flag(mode, MODE_ENVVAR):
-                # Some char during envvar
-                if esc != varesc:
-                    # Implicit end of envvar because escape mode changed
-                    # NAND is used to ensure that the flags are set to 0,
-                    # not just toggled
-                    mode &= ~(MODE_ENVVAR ^ MODE_BRACENV)
-                    val = os.environ.get(varname, "")
-                    current += val
-                    curesc += [varesc] * len(val)
-                    varname = ""
-                    varesc = ESC_NONE
-                    
-                    current += char
-                    curesc.append(esc)
-                else:
-                    # Append to varname
-                    varname += char
-            else:
-                # Some char outside envvar, append unchanged
-                current += char
-                curesc.append(esc)
-        
-        # End of inner for loop
-        
-        if has_flag(mode, MODE_ENVVAR):
-            if varname == "":
-                # Empty varname (i. e. $ at end of part)
-                current += "$"
-                curesc.append(varesc)
-                if has_flag(mode, MODE_BRACENV):
-                    current += "{"
-                    curesc.append(varesc)
+                break
+            elif esc != varesc:
+                # Implicit end of envvar because escape mode changed
+                literal = pos
+                pos += 1
+                break
             else:
-                # Implicit end of envvar because end of part (i. e. space)
-                val = os.environ.get(varname, "")
-                current += val
-                curesc += [varesc] * len(val)
-                varname = ""
-                varesc = ESC_NONE
-        
-        xpndparts.append(current)
-        xpndesc.append(curesc)
-        mode = MODE_NONE
-        current = ""
-        curesc = []
-        varname = ""
-        varesc = ESC_NONE
-    
-    # End of outer for loop
-    
-    # Step 5: Globbing
-    globparts = []
-    for part, escapes in zip(xpndparts, xpndesc):
-        if not doglob:
-            globparts = xpndparts
-            break
-        # Check whether the part should be globbed
-        hasglob = False
-        for char, esc in zip(part, escapes):
-            if char in "*?[" and esc == ESC_NONE:
-                hasglob = True
+                varname.append(char)
+            pos += 1
+        else:
+            if not varname:
+                # Empty varname (i. e. $ at end of word)
+                text.append("${" if braced else "$")
+                newesc += ESC_BYTES[varesc] * (2 if braced else 1)
                 break
         
-        if hasglob:
-            # Prepare part for globbing by prefixing escaped
-            # glob chars with backslashes
-            globstr = ""
-            for char, esc in zip(part, escapes):
-                if char in "*?[]" and esc != ESC_NONE:
-                    globstr += "\\" + char
-                else:
-                    globstr += char
-            globparts += glob.glob(globstr)
+        val = os.environ.get("".join(varname), "")
+        text.append(val)
+        newesc += ESC_BYTES[varesc] * len(val)
+        if literal is not None:
+            text.append(word[literal])
+            newesc += escapes[literal:literal+1]
+    
+    return "".join(text), newesc
+
+def expand_word(word, escapes, expanduser=True, expandvars=True, doglob=True, globber=None):
+    """Apply brace expansion, tilde expansion, environment variable
+    expansion and globbing to a single word returned by lex_cmd. Yields
+    the resulting words. Directory listings for globbing are shared
+    through globber, pass the same one for all words of a command line.
+    """
+    
+    if doglob and "{" in word:
+        words = _shglob.expand_braces(word, escapes)
+    else:
+        words = [(word, escapes)]
+    
+    for word, escapes in words:
+        if expanduser:
+            word, escapes = expand_user(word, escapes)
+        if expandvars:
+            word, escapes = expand_vars(word, escapes)
+        if doglob and ("*" in word or "?" in word or "[" in word):
+            if globber is None:
+                globber = _shglob.Globber()
+            for found in globber.glob(word, escapes):
+                yield found
+        else:
+            yield word
+
+def parse_cmd(cmd, expanduser=True, expandvars=True, doglob=True):
+    """Parse cmd as a shell input, split it into individual parts,
+    and optionally expand environment variables and do globbing.
+    Operators are returned unchanged as parts of their own.
+    """
+    
+    parts = []
+    globber = _shglob.Globber()
+    
+    for word, escapes in lex_cmd(cmd):
+        if escapes is None:
+            parts.append(word)
         else:
-            globparts.append(part)
+            parts += expand_word(word, escapes, expanduser, expandvars, doglob, globber)
+    
+    return parts
+
+class Command(object):
+    """A single command of a pipeline, consisting of its arguments and
+    I/O redirections. redirects is a list of 2-tuples (operator, file),
+    where file is None for operators like 2>&1 that don't take one.
+    background is set on the last command of a pipeline ending in &.
+    cwd is the directory a background job's command runs in, None for
+    the shell's current directory.
+    """
+    
+    def __init__(self):
+        self.args = []
+        self.redirects = []
+        self.background = False
+        self.cwd = None
     
-    return globparts
+    def __repr__(self):
+        return "Command({!r}, {!r}{})".format(self.args, self.redirects, ", background" if self.background else "")
+
+def split_pipeline(cmd):
+    """Parse cmd as a shell input and split it into the commands of a
+    pipeline, without expanding anything. Returns a list of Command
+    objects whose args are (word, escapes) tuples from lex_cmd and whose
+    redirection files are (word, escapes) tuples or None, or an empty
+    list if cmd is empty. Raises ValueError for syntax errors.
+    """
+    
+    stages = [Command()]
+    words = iter(lex_cmd(cmd))
+    
+    for word, escapes in words:
+        if escapes is not None:
+            stages[-1].args.append((word, escapes))
+        elif word == "|":
+            # Pipe operator, start next command
+            if not stages[-1].args and not stages[-1].redirects:
+                raise ValueError("Syntax error near unexpected |")
+            stages.append(Command())
+        elif word in REDIRECTS_NOFILE:
+            stages[-1].redirects.append((word, None))
+        elif word == "&":
+            # Run in the background, only allowed at the end
+            if not stages[-1].args and not stages[-1].redirects:
+                raise ValueError("Syntax error near unexpected &")
+            if next(words, None) is not None:
+                raise ValueError("Syntax error, & must be at the end of the command")
+            stages[-1].background = True
+        else:
+            # Redirection operator, next word is the file name
+            target = next(words, (None, None))
+            if target[1] is None:
+                raise ValueError("Syntax error, file name expected after {}".format(word))
+            stages[-1].redirects.append((word, target))
+    
+    if not stages[-1].args and not stages[-1].redirects:
+        if len(stages) > 1:
+            raise ValueError("Syntax error, command expected after |")
+        return []
+    
+    return stages
+
+def expand_pipeline(stages):
+    """Expand the words of a pipeline returned by split_pipeline.
+    Returns a new list of Command objects with plain string arguments
+    and redirection files. Raises ValueError if a redirection file does
+    not expand to exactly one word.
+    """
+    
+    globber = _shglob.Globber()
+    expanded = []
+    
+    for stage in stages:
+        command = Command()
+        for word, escapes in stage.args:
+            command.args += expand_word(word, escapes, globber=globber)
+        for op, target in stage.redirects:
+            if target is not None:
+                targets = list(expand_word(target[0], target[1], globber=globber))
+                if len(targets) != 1:
+                    raise ValueError("{}: ambiguous redirect".format(target[0]))
+                target = targets[0]
+            command.redirects.append((op, target))
+        command.background = stage.background
+        expanded.append(command)
+    
+    return expanded
+
+def parse_pipeline(cmd):
+    """Parse cmd as a shell input and split it into the commands of a
+    pipeline, with all words expanded. Returns a list of Command
+    objects, or an empty list if cmd is empty.
+    """
+    
+    return expand_pipeline(split_pipeline(cmd))
 
 def find_in_path(filename):
     """Search all entries in $PYPATH, $PATH and sys.path for filename
     and return the first occurence, or None if the file couldn't be found.
     """
-    paths = (["."] # Force cwd to be searched regardless of envvars
-           + os.environ.get("PYPATH", "").split(os.pathsep)
-           + os.environ.get("PATH", "").split(os.pathsep)
-           + sys.path)
-    
-    for path in paths:
-        path = unicode(path)
-        joined = os.path.join(path, filename)
-        if os.path.exists(joined) and os.path.isfile(joined):
-            return joined
-    
-    return None
+    return _shhash.find_in_path(filename)
 
 def fix_globals():
     global _importcompletion
@@ -341,54 +385,512 @@ def fix_globals():
     import importcompletion as _importcompletion
     import _outputcapture
 
+def is_shell_exit(ex):
+    """Return whether the SystemExit ex was raised by exit to end the
+    shell, rather than by a normal command ending.
+    """
+    return isinstance(ex.code, tuple) and len(ex.code) > 1 and ex.code[1] == "ShellExit"
+
+def exit_status(code):
+    """Convert the code of a SystemExit into an integer exit status.
+    """
+    
+    if code is None:
+        return 0
+    elif isinstance(code, int):
+        return code
+    elif is_shell_exit(SystemExit(code)):
+        return code[0]
+    else:
+        return 1
+
+def run_command(args, concurrent=False, phases=None, cwd=None):
+    """Run the command args[0] with the arguments args[1:] in the
+    current thread and return its exit status. The SystemExit raised by
+    exit is passed on to the caller.
+    
+    If concurrent is true, other commands may be running at the same
+    time. sys.argv is shared by all threads, so it is then only set for
+    scripts that have no main function. If phases is a PhaseTimes
+    object, the durations of the command's phases are added to it. If
+    cwd is given, the command runs in a worker process in that
+    directory, if it can run in a worker.
+    """
+    
+    start = _shprof.timer()
+    filename = _shhash.resolve(args[0])
+    if phases is not None:
+        phases.add("resolve", _shprof.timer() - start)
+    if not filename:
+        print("sh: {}: command not found".format(args[0]), file=sys.stderr)
+        return 127
+    
+    try:
+        if (_shstate.options["isolate"] or cwd is not None) and _shworkers.isolated(args[0]):
+            start = _shprof.timer()
+            try:
+                _shworkers.pool.run(filename, args[1:], cwd)
+            finally:
+                if phases is not None:
+                    phases.add("exec", _shprof.timer() - start)
+        else:
+            _shregistry.run(filename, args[1:], setargv=not concurrent, phases=phases)
+    except SystemExit as ex:
+        ##print(ex.code)
+        if is_shell_exit(ex):
+            raise
+        return exit_status(ex.code)
+    except BaseException as err:
+        print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        return 1
+    
+    return 0
+
+def run_redirected(command, stdin=None, stdout=None, stderr=None, concurrent=False, phases=None):
+    """Run command in the current thread with its redirections applied
+    on top of the given stdin, stdout and stderr (None means unchanged)
+    and return its exit status. The thread's original streams are
+    restored and redirection files are closed when the command ends,
+    even if it raises SystemExit.
+    """
+    
+    streams = [stdin or sys.stdin.target(), stdout or sys.stdout.target(), stderr or sys.stderr.target()]
+    opened = []
+    
+    try:
+        # Redirections are processed from left to right, so "> f 2>&1"
+        # sends both stdout and stderr to f.
+        for op, target in command.redirects:
+            if op == "2>&1":
+                streams[2] = streams[1]
+            elif op == ">&2":
+                streams[1] = streams[2]
+            elif op == "<":
+                opened.append(io.open(target, "rb", buffering=_shio.BUFSIZE))
+                streams[0] = opened[-1]
+            else:
+                opened.append(_shio.FileWriter(target, append=op.endswith(">>")))
+                streams[2 if op.startswith("2") else 1] = opened[-1]
+    except (IOError, OSError) as err:
+        print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        for f in opened:
+            f.close()
+        return 1
+    
+    # Console output is collected and written in blocks
+    writers = _shio.buffer_console(streams) if command.args else []
+    proxies = (sys.stdin, sys.stdout, sys.stderr)
+    olds = [proxy.redirect(stream) for proxy, stream in zip(proxies, streams)]
+    status = 0 # Without args only redirections, files have been created already
+    try:
+        if command.args:
+            status = run_command(command.args, concurrent, phases, command.cwd)
+    finally:
+        for proxy, old in zip(proxies, olds):
+            proxy.redirect(old)
+        for f in writers + opened:
+            try:
+                f.close()
+            except Exception as err:
+                # Console output is written late, its errors still
+                # belong to the command
+                print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+                status = status or 1
+    return status
+
+def _run_stage(command, streams, pipes, statuses, index, phases):
+    """Thread target running one command of a pipeline with the given
+    (stdin, stdout, stderr) streams. The pipe ends in pipes are closed
+    when the command ends, so the neighboring commands see end of file
+    or a broken pipe.
+    """
+    
+    try:
+        try:
+            statuses[index] = run_redirected(command, *streams, concurrent=True, phases=phases)
+        except SystemExit as ex:
+            # exit inside a pipeline only ends its own command
+            statuses[index] = exit_status(ex.code)
+    finally:
+        for pipe in pipes:
+            pipe.close()
+
+def run_pipeline(stages, phases=None, concurrent=False):
+    """Run the commands in stages at the same time, connecting each
+    command's stdout to the next command's stdin with a bounded pipe.
+    Returns the exit status of the last command. A single command is
+    run directly in the current thread. If phases is a PhaseTimes
+    object, the phase durations of all commands are added to it. If
+    concurrent is true, as for background jobs, other commands may be
+    running at the same time and sys.argv is left alone.
+    """
+    
+    if len(stages) == 1:
+        return run_redirected(stages[0], concurrent=concurrent, phases=phases)
+    
+    pipes = [_shio.Pipe() for i in range(len(stages) - 1)]
+    statuses = [1] * len(stages)
+    threads = []
+    old_argv = sys.argv
+    # The stage threads use the streams of this thread, not the defaults
+    stdin, stdout, stderr = sys.stdin.target(), sys.stdout.target(), sys.stderr.target()
+    
+    for i, command in enumerate(stages):
+        reader = pipes[i-1].reader if i > 0 else None
+        writer = pipes[i].writer if i < len(pipes) else None
+        thread = threading.Thread(target=_run_stage, args=(
+            command,
+            (reader or stdin, writer or stdout, stderr),
+            [end for end in (reader, writer) if end is not None],
+            statuses, i, phases,
+        ))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    
+    try:
+        for thread in threads:
+            # Join with a timeout, so KeyboardInterrupt is not blocked
+            while thread.is_alive():
+                thread.join(0.1)
+    except KeyboardInterrupt:
+        # Unblock all commands waiting on a pipe
+        for pipe in pipes:
+            pipe.close_read()
+            pipe.close_write()
+        raise
+    finally:
+        # Scripts without main may have changed sys.argv
+        if not concurrent:
+            sys.argv = old_argv
+    
+    return statuses[-1]
+
+def run_timed(commands, concurrent=False):
+    """Run the pipeline commands like run_pipeline and print the wall
+    clock time, the CPU time of the shell process, the time spent in
+    each phase of running the commands and the number of writes to the
+    console and of blocks actually written to it to stderr.
+    """
+    
+    phases = _shprof.PhaseTimes()
+    start = _shprof.timer()
+    cpu = os.times()
+    console = _shio.console_stats.snapshot()
+    try:
+        if commands[0].args or commands[0].redirects or len(commands) > 1:
+            return run_pipeline(commands, phases, concurrent)
+        else:
+            return 0
+    finally:
+        real = _shprof.timer() - start
+        end_cpu = os.times()
+        lines = [
+            ("real", real),
+            ("user", end_cpu[0] - cpu[0]),
+            ("sys", end_cpu[1] - cpu[1]),
+        ] + [(phase, phases[phase]) for phase in _shprof.PHASES]
+        writes, written, flushes = [new - old for new, old in zip(_shio.console_stats.snapshot(), console)]
+        print("\n" + "\n".join("{:<8}{:.3f}s".format(name, value) for name, value in lines), file=sys.stderr)
+        print("writes  {} ({} bytes)\nflushes {}".format(writes, written, flushes), file=sys.stderr)
+
+def run_background(commands, line, timed=False):
+    """Start the pipeline commands as a background job for the command
+    line line and return 0. The job number is printed to stderr.
+    
+    The job keeps the current directory even if the shell's changes.
+    Its commands run in worker processes started in that directory.
+    Relative redirection files and command paths are resolved against
+    it now, and so are the arguments naming existing files of commands
+    that must run in the shell, like builtins and every command on
+    platforms without os.fork.
+    """
+    
+    cwd = os.getcwdu()
+    for command in commands:
+        command.cwd = cwd
+        command.redirects = [(op, target if target is None else os.path.join(cwd, target))
+                             for op, target in command.redirects]
+        if not command.args:
+            continue
+        if _shhash.is_path(command.args[0]):
+            command.args[0] = os.path.join(cwd, command.args[0])
+        if not _shworkers.isolated(command.args[0]):
+            command.args[1:] = [
+                os.path.join(cwd, arg) if not arg.startswith("-") and os.path.lexists(os.path.join(cwd, arg)) else arg
+                for arg in command.args[1:]
+            ]
+    
+    def run():
+        try:
+            # Jobs never set the process-wide sys.argv
+            if timed:
+                return run_timed(commands, concurrent=True)
+            return run_pipeline(commands, concurrent=True)
+        except SystemExit as ex:
+            # exit in a background job only ends the job
+            return exit_status(ex.code)
+    
+    job = _shjobs.table.submit(line.strip(), run)
+    print("[{}]".format(job.id), file=sys.stderr)
+    return 0
+
+def run_line(commands, line):
+    """Run the pipeline commands parsed from line, in the background if
+    it ends with & and timed if it starts with the time keyword.
+    Returns the exit status.
+    """
+    
+    timed = commands[0].args[:1] == ["time"]
+    if timed:
+        commands[0].args = commands[0].args[1:]
+    
+    if commands[-1].background:
+        return run_background(commands, line, timed)
+    elif timed:
+        return run_timed(commands)
+    else:
+        return run_pipeline(commands)
+
+def report_jobs():
+    """Print a line for every background job that finished since the
+    last call.
+    """
+    
+    for job in _shjobs.table.newly_finished():
+        print("[{}]  {:<10} {}".format(job.id, job.state, job.command), file=sys.stderr)
+
+def format_trace(commands):
+    """Return the line printed for commands with set -x.
+    """
+    
+    words = []
+    for command in commands:
+        if words:
+            words.append("|")
+        words += command.args
+        for op, target in command.redirects:
+            words += [op] if target is None else [op, target]
+    return "+ " + " ".join(words)
+
+def parse_script(text):
+    """Parse all lines of the shell script text with split_pipeline.
+    Empty lines and comment lines starting with # are skipped. Returns a
+    list of (lineno, line, stages) records for the lines with commands
+    and a list of (lineno, error) tuples for lines with syntax errors.
+    """
+    
+    records = []
+    errors = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            stages = split_pipeline(line)
+        except ValueError as err:
+            errors.append((lineno, err))
+            continue
+        if stages:
+            records.append((lineno, line, stages))
+    return records, errors
+
+def load_script(filename):
+    """Read and parse the shell script at filename like parse_script.
+    The result is cached until the file's modification time or size
+    changes.
+    """
+    
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    stamp = (st.st_mtime, st.st_size)
+    
+    cached = _scriptcache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    
+    with io.open(path, "r", encoding="utf-8") as f:
+        parsed = parse_script(f.read())
+    _scriptcache[path] = (stamp, parsed)
+    return parsed
+
+def run_script(records, name):
+    """Run the records returned by parse_script in order. Returns the
+    exit status of the last command, or of the first failing one if the
+    errexit option is set.
+    """
+    
+    status = 0
+    for lineno, line, stages in records:
+        try:
+            commands = expand_pipeline(stages)
+        except ValueError as err:
+            print("sh: {}: line {}: {}: {!s}".format(name, lineno, type(err).__name__, err), file=sys.stderr)
+            status = 1
+        else:
+            if _shstate.options["xtrace"]:
+                print(format_trace(commands), file=sys.stderr)
+            status = run_line(commands, line)
+        
+        if status and _shstate.options["errexit"]:
+            break
+    return status
+
+def script_main(ns):
+    """Run the script or -c command given on the command line and return
+    its exit status. All lines are parsed before anything is run, and
+    nothing is run if any line has a syntax error. The script's name and
+    arguments are available as $0, $1 and so on while it runs.
+    """
+    
+    if ns.command is not None:
+        name = "sh"
+        params = [ns.script or name] + ns.args
+        try:
+            records, errors = parse_script(ns.command)
+        except UnicodeError as err:
+            records, errors = [], [(1, err)]
+    else:
+        name = ns.script
+        params = [ns.script] + ns.args
+        try:
+            records, errors = load_script(ns.script)
+        except (IOError, OSError, UnicodeError) as err:
+            print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+            return 127
+    
+    if errors:
+        for lineno, err in errors:
+            print("sh: {}: line {}: {}: {!s}".format(name, lineno, type(err).__name__, err), file=sys.stderr)
+        return 2
+    
+    old_params = {}
+    for i, value in enumerate(params):
+        old_params[unicode(i)] = os.environ.get(unicode(i))
+        os.environ[unicode(i)] = value
+    
+    try:
+        return run_script(records, name)
+    except SystemExit as ex:
+        # exit ends the script, not the shell running it
+        return ex.code[0]
+    except KeyboardInterrupt as err:
+        print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        return 130
+    finally:
+        for key, value in old_params.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
 def main(args):
+    p = argparse.ArgumentParser(description="Run shell commands interactively, from a script or from a string.")
+    p.add_argument("-c", action="store", dest="command", type=unicode,
+                   help="run the commands in this string instead of a script")
+    p.add_argument("-e", action="store_true", dest="errexit",
+                   help="stop at the first command that fails (set -e)")
+    p.add_argument("-x", action="store_true", dest="xtrace",
+                   help="print every command before running it (set -x)")
+    p.add_argument("script", action="store", nargs="?", type=unicode,
+                   help="script to run, one command per line")
+    p.add_argument("args", action="store", nargs=argparse.REMAINDER, type=unicode,
+                   help="arguments for the script, available as $1, $2 and so on")
+    ns = p.parse_args(args)
+    
     if not os.environ.get("PYPATH", ""):
         os.environ["PYPATH"] = os.pathsep.join([
             os.path.expanduser("~/Documents/whateversh_usr/bin"),
             os.path.expanduser("~/Documents/whateversh_bin"),
         ])
     
+    old_options = dict(_shstate.options)
+    for name in ("errexit", "xtrace"):
+        if getattr(ns, name):
+            _shstate.options[name] = True
+    
+    streams = _shio.install()
+    
+    if ns.command is not None or ns.script is not None:
+        try:
+            status = script_main(ns)
+        finally:
+            _shworkers.pool.close()
+            _shstate.options.update(old_options)
+            sys.stdin, sys.stdout, sys.stderr = streams
+        sys.exit(status)
+    
     status = 0
     running = True
+    history = _shhistory.history
+    last_status = 0
+    last_duration = None
     
-    while running:
+    filename = _shhistory.default_file()
+    if filename is not None:
         try:
-            cwd = os.getcwdu()
-        except OSError as err:
-            print("sh: Failed to get current working directory, returning to home.", file=sys.stderr)
-            print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
-            os.chdir(os.path.expanduser("~"))
-            cwd = os.getcwdu()
-        
-        inp = raw_input(PROMPT.format(path=collapseuser(cwd)))
-        parsed = parse_cmd(inp)
-        if not parsed:
-            # No input, do nothing
-            pass
-        else:
-            # Some other command
-            filename = find_in_path(parsed[0]) or find_in_path(parsed[0] + ".py")
-            if filename:
-                old_argv = sys.argv
+            history.load(filename, _shhistory.default_size())
+        except (IOError, OSError) as err:
+            print("sh: history: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+    
+    _shcomplete.install_readline()
+    
+    try:
+        while running:
+            try:
+                cwd = os.getcwdu()
+            except OSError as err:
+                print("sh: Failed to get current working directory, returning to home.", file=sys.stderr)
+                print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+                os.chdir(os.path.expanduser("~"))
+                cwd = os.getcwdu()
+            
+            report_jobs()
+            inp = _shcomplete.read_line(_shprompt.prompt.render(cwd, last_status, last_duration))
+            try:
+                expanded = history.expand(inp)
+            except ValueError as err:
+                print("sh: {!s}".format(err), file=sys.stderr)
+                continue
+            if expanded != inp:
+                # Show the command that is run, like other shells
+                print(expanded)
+                inp = expanded
+            try:
+                history.add(inp)
+            except (IOError, OSError) as err:
+                print("sh: history: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+            
+            try:
+                stages = parse_pipeline(inp)
+            except ValueError as err:
+                print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+                continue
+            
+            if not stages:
+                # No input, do nothing
+                pass
+            else:
+                if _shstate.options["xtrace"]:
+                    print(format_trace(stages), file=sys.stderr)
+                start = _shprof.timer()
                 try:
-                    sys.argv = [filename] + parsed[1:]
-                    ##print(sys.argv)
-                    with open(filename, "rU") as f:
-                        scriptcode = compile(f.read(), os.path.abspath(filename),
-                                             "exec", dont_inherit=True)
-                        exec(scriptcode, {"__name__": "__main__"})
+                    last_status = run_line(stages, inp)
                 except SystemExit as ex:
-                    ##print(ex.code)
-                    if isinstance(ex.code, tuple) and len(ex.code) > 1 and ex.code[1] == "ShellExit":
-                        status = ex.code[0]
-                        running = False
-                except BaseException as err:
+                    status = ex.code[0]
+                    running = False
+                except KeyboardInterrupt as err:
                     print("sh: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
-                finally:
-                    sys.argv = old_argv
-            else:
-                print("sh: {}: command not found".format(parsed[0]), file=sys.stderr)
+                    last_status = 130
+                last_duration = _shprof.timer() - start
+    finally:
+        try:
+            history.close()
+        except (IOError, OSError) as err:
+            print("sh: history: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+        _shworkers.pool.close()
     
+    _shstate.options.update(old_options)
+    sys.stdin, sys.stdout, sys.stderr = streams
     fix_globals()
     sys.exit(status)
 
@@ -7,17 +7,19 @@ they do not yet exist.
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import os
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-c", "--no-create", action="store_true",
+                    help="do not create nonexistant files")
+parser.add_argument("file", action="store", nargs="+", type=unicode,
+                    help="one or more files to be touched")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("-c", "--no-create", action="store_true",
-                   help="do not create nonexistant files")
-    p.add_argument("file", action="store", nargs="+", type=unicode,
-                   help="one or more files to be touched")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     status = 0
     
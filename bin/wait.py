@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Wait for background jobs to finish and print their output. Without
+arguments, all jobs are waited for. The exit status is that of the last
+job waited for.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import sys
+
+import _shargs
+import _shjobs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("job", action="store", nargs="*", type=unicode,
+                    help="numbers of the jobs to wait for, like 1 or %%1")
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    status = 0
+    
+    if ns.job:
+        jobs = []
+        for spec in ns.job:
+            try:
+                job = _shjobs.table.get(_shjobs.parse_jobspec(spec))
+            except ValueError:
+                job = None
+            if job is None:
+                print("wait: {}: no such job".format(spec), file=sys.stderr)
+                status = 127
+            else:
+                jobs.append(job)
+    else:
+        jobs = _shjobs.table.all()
+    
+    for job in jobs:
+        job.wait()
+        _shjobs.copy_output(job, sys.stdout, sys.stderr)
+        _shjobs.table.remove(job)
+        status = job.status
+    
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
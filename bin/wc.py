@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Print the number of lines, words and bytes of the given files, and
+their total if there are several. With no files, or when a file is -,
+stdin is read. The options select which counts are printed, always in
+the order lines, words, characters, bytes.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import codecs
+import io
+import os
+import stat
+import sys
+
+import _shargs
+import _shfs
+
+BLOCKSIZE = 1024 * 1024 # Number of bytes read at once
+FIELDS = ("lines", "words", "chars", "bytes")
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-l", "--lines", action="store_true",
+                    help="print the number of lines")
+parser.add_argument("-w", "--words", action="store_true",
+                    help="print the number of words")
+parser.add_argument("-m", "--chars", action="store_true",
+                    help="print the number of characters")
+parser.add_argument("-c", "--bytes", action="store_true",
+                    help="print the number of bytes")
+parser.add_argument("--encoding", action="store", default="utf-8",
+                    help="encoding of the files for -w and -m, defaults to utf-8")
+parser.add_argument("-j", "--jobs", action="store", default=_shfs.WORKERS, type=int,
+                    help="number of files counted in parallel")
+parser.add_argument("file", action="store", nargs="*", default=["-"], type=unicode,
+                    help="files to be counted, defaults to stdin")
+
+def count_file(f, fields, encoding="utf-8"):
+    """Return a dict with the counts of fields in file f. Lines and
+    bytes are counted on the raw blocks, the file is only decoded for
+    words and characters.
+    """
+    
+    counts = dict.fromkeys(fields, 0)
+    
+    if fields == {"bytes"}:
+        # The size of a regular file is known without reading it
+        try:
+            info = os.fstat(f.fileno())
+            if stat.S_ISREG(info.st_mode) and info.st_size:
+                counts["bytes"] = info.st_size - f.tell()
+                return counts
+        except (AttributeError, IOError, OSError, ValueError):
+            pass
+    
+    decode = None
+    if "words" in fields or "chars" in fields:
+        decode = codecs.getincrementaldecoder(encoding)(errors="replace").decode
+    inword = False # Whether the text so far ends inside a word
+    
+    final = False
+    while not final:
+        block = f.read(BLOCKSIZE)
+        final = not block
+        if "lines" in fields:
+            counts["lines"] += block.count(b"\n")
+        if "bytes" in fields:
+            counts["bytes"] += len(block)
+        if decode is None:
+            continue
+        
+        text = decode(block, final)
+        if not text:
+            continue
+        if "chars" in fields:
+            counts["chars"] += len(text)
+        if "words" in fields:
+            words = len(text.split())
+            if inword and not text[0].isspace():
+                # The first word continues one from the previous block
+                words -= 1
+            counts["words"] += words
+            inword = not text[-1].isspace()
+    
+    return counts
+
+def _count_task(filename, stdin, fields, encoding, results, index):
+    try:
+        if filename == "-":
+            results[index] = count_file(stdin, fields, encoding)
+        else:
+            with io.open(filename, "rb") as f:
+                results[index] = count_file(f, fields, encoding)
+    except Exception as err:
+        results[index] = err
+
+def main(args):
+    ns = parser.parse_args(args)
+    
+    fields = [name for name in FIELDS if getattr(ns, name)] or ["lines", "words", "bytes"]
+    
+    try:
+        codecs.lookup(ns.encoding)
+    except LookupError as err:
+        parser.error(unicode(err))
+    
+    # Worker threads don't see this thread's redirected streams
+    stdin = getattr(sys.stdin, "target", lambda: sys.stdin)()
+    results = [None] * len(ns.file)
+    with _shfs.WorkerPool(max(1, ns.jobs)) as pool:
+        for i, filename in enumerate(ns.file):
+            pool.submit(_count_task, filename, stdin, set(fields), ns.encoding, results, i)
+        pool.wait()
+    
+    status = 0
+    rows = []
+    total = dict.fromkeys(fields, 0)
+    for filename, result in zip(ns.file, results):
+        if isinstance(result, Exception):
+            print("wc: {}: {!s}".format(type(result).__name__, result), file=sys.stderr)
+            status = 1
+            continue
+        for name in fields:
+            total[name] += result[name]
+        rows.append((result, "" if filename == "-" else filename))
+    if len(ns.file) > 1:
+        rows.append((total, "total"))
+    
+    width = max(len(unicode(total[name])) for name in fields)
+    for counts, name in rows:
+        line = " ".join("{:>{}}".format(counts[field], width) for field in fields)
+        print("{} {}".format(line, name).rstrip())
+    
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
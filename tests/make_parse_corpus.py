@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Write parse_corpus.json, the command lines checked by test_parse.py
+with the results of parse_cmd from the baseline sh.py, which is read
+from git. Run from the repository with Python 2.7.
+
+Lines are parsed without globbing, as the baseline globbed with
+glob.glob in the current directory. Operators like | and > are left
+out, they were ordinary characters in the baseline. The baseline
+ignored expanduser when expandvars was false, so generated lines with a
+word starting with ~ have no result for that case, DIFFERENCES lists
+the results expected instead.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import imp
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+
+BASELINE = "b9e4899" # Commit with the multi-pass parser
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_corpus.json")
+
+# Environment the lines are parsed in, also set by test_parse.py
+ENVIRON = {
+    "HOME": "/home/user",
+    "FOO": "foo",
+    "BAR": "bar baz",
+    "EMPTY": "",
+    "A1": "x",
+    "_U": "under",
+}
+
+# (expanduser, expandvars) combinations, as names in the corpus
+OPTIONS = {
+    "user,vars": (True, True),
+    "user": (True, False),
+    "vars": (False, True),
+    "none": (False, False),
+}
+
+# Hand-written lines for the cases the generated ones rarely hit
+LINES = [
+    "", " ", "   echo   a   b   ", "echo", "a b c",
+    "'a b'", '"a b"', "'a'b\"c\"", "a\\ b", "\\a\\b", "'\\'", '"\\""', '"\\\\"', '"a\\b"',
+    "''", '""', "a '' b", '"" ""', "'a\"b'", "\"a'b\"",
+    "~", "~/", "~/x y", "~:a", "a~", "x ~ y", "'~'", "\\~/x", '"~"/x', "~user", "~~",
+    "$", "$$", "$FOO", "$FOO$BAR", "${FOO}", "${FOO}x", "$FOOx", "${FOO", "${", "$}", "${}",
+    "$A1", "$_U", "$EMPTY", "$MISSING", "a$FOO-b", "$FOO:$BAR", "x$", "x${",
+    "'$FOO'", '"$FOO"', '"$BAR"', "\\$FOO", "$'FOO'", '$"FOO"', '"$FOO"$FOO', "'$'$FOO",
+    '"${FOO}"', "${FOO}${BAR}", "$F\\OO", '$FO"O"', "~$FOO", "$HOME/x", "~/$FOO",
+    "a*b", "[ab]", "?", "'*'", "\\*",
+    "'unclosed", '"unclosed', "trailing\\", "a 'b", 'a "b\\"',
+]
+
+# Lines whose result with expanduser and without expandvars differs
+# from the baseline, with the expected result
+DIFFERENCES = [
+    ("~", ["/home/user"]),
+    ("~/x", ["/home/user/x"]),
+    ("~:a ~", ["/home/user:a", "/home/user"]),
+    ("~/$FOO '~'/x", ["/home/user/$FOO", "/home/user/x"]),
+]
+
+ALPHABET = "aabb1_$${}~/:-*   '\"\\" # Characters of the generated lines, weighted
+
+def load_baseline():
+    source = subprocess.check_output(["git", "show", BASELINE + ":bin/sh.py"])
+    module = imp.new_module("baseline_sh")
+    exec(compile(source, "baseline/sh.py", "exec"), module.__dict__)
+    return module
+
+def generate(count, seed):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(ALPHABET) for i in range(rng.randint(1, 16))) for j in range(count)]
+
+def parse(baseline, line, expanduser, expandvars):
+    try:
+        return baseline.parse_cmd(line, expanduser, expandvars, doglob=False)
+    except ValueError as err:
+        return "{}: {!s}".format(type(err).__name__, err)
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", action="store", default=600, type=int,
+                        help="number of generated lines")
+    parser.add_argument("--seed", action="store", default=3, type=int,
+                        help="seed for the generated lines")
+    ns = parser.parse_args(args)
+    
+    baseline = load_baseline()
+    os.environ.clear()
+    os.environ.update(ENVIRON)
+    
+    cases = []
+    for line in LINES + generate(ns.count, ns.seed):
+        results = {}
+        for name, (expanduser, expandvars) in sorted(OPTIONS.items()):
+            results[name] = parse(baseline, line, expanduser, expandvars)
+        
+        if isinstance(results["none"], unicode):
+            # Syntax errors don't depend on the options
+            cases.append({"line": line, "error": results["none"]})
+            continue
+        if any(word.startswith("~") for word in results["user"]):
+            # The baseline ignored expanduser here, see DIFFERENCES
+            del results["user"]
+        cases.append({"line": line, "results": results})
+    
+    differences = []
+    for line, expected in DIFFERENCES:
+        differences.append({
+            "line": line,
+            "options": "user",
+            "baseline": parse(baseline, line, True, False),
+            "expected": expected,
+        })
+    
+    # One case per line keeps the file short and its diffs readable
+    def dump(items):
+        return ",\n".join("  " + json.dumps(item, sort_keys=True) for item in items)
+    
+    with io.open(CORPUS, "wb") as f:
+        f.write(b'{\n "environ": %s,\n "cases": [\n%s\n ],\n "differences": [\n%s\n ]\n}\n'
+                % (json.dumps(ENVIRON, sort_keys=True), dump(cases), dump(differences)))
+    print("{} lines, {} differences".format(len(cases), len(differences)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
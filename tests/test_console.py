@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for the collected console output of commands.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SH = os.path.join(ROOT, "bin", "sh.py")
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+import _shio
+
+class AsciiStream(object):
+    """Console that can only encode ASCII, like a Python 2 file that is
+    not a terminal.
+    """
+    
+    def __init__(self):
+        self.data = []
+    
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode("ascii")
+        self.data.append(data)
+    
+    def flush(self):
+        pass
+
+class ConsoleWriterTest(unittest.TestCase):
+    def test_failed_flush_keeps_output(self):
+        stream = AsciiStream()
+        writer = _shio.ConsoleWriter(stream, timed=False)
+        writer.write(b"bytes\n")
+        writer.write("caf\xe9\n")
+        self.assertRaises(UnicodeEncodeError, writer.flush)
+        self.assertEqual(stream.data, [b"bytes\n"])
+        self.assertEqual(writer.chunks, ["caf\xe9\n"])
+        # The command has seen the error, close drops the output
+        writer.close()
+        self.assertEqual(writer.chunks, [])
+    
+    def test_close_raises_unseen_error(self):
+        writer = _shio.ConsoleWriter(AsciiStream(), timed=False)
+        writer.write("caf\xe9\n")
+        self.assertRaises(UnicodeEncodeError, writer.close)
+
+class PipedOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="shtest")
+        with io.open(os.path.join(self.dir, "text.txt"), "wb") as f:
+            f.write("caf\xe9\n".encode("utf-8"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def test_non_ascii_output(self):
+        script = os.path.join(self.dir, "script.sh")
+        with io.open(script, "wb") as f:
+            f.write(b"cat text.txt\necho after\n")
+        env = {
+            "HOME": self.dir,
+            "PATH": "",
+            "PYPATH": os.pathsep.join([os.path.join(ROOT, "bin"), os.path.join(ROOT, "usr", "bin")]),
+        }
+        proc = subprocess.Popen([sys.executable, SH, script], cwd=self.dir, env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        # The error belongs to cat, the shell goes on
+        self.assertIn(b"UnicodeEncodeError", err)
+        self.assertNotIn(b"Traceback", err)
+        self.assertIn(b"after\n", out)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for the globbing engine.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+import _shglob
+
+class GlobstarTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="shtest")
+        os.makedirs(os.path.join(self.dir, "gl", "sub"))
+        for name in ("a.py", os.path.join("sub", "b.py")):
+            io.open(os.path.join(self.dir, "gl", name), "wb").close()
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def glob(self, pattern):
+        word = os.path.join(self.dir, pattern)
+        found = _shglob.Globber().glob(word, bytearray(len(word)))
+        return [os.path.relpath(path, self.dir) + ("/" if path.endswith("/") else "") for path in found]
+    
+    def test_trailing_globstar(self):
+        # Includes the directory itself, like bash with globstar
+        self.assertEqual(self.glob("gl/**"), ["gl/", "gl/a.py", "gl/sub", "gl/sub/b.py"])
+    
+    def test_globstar_before_pattern(self):
+        self.assertEqual(self.glob("gl/**/*.py"), ["gl/a.py", "gl/sub/b.py"])
+    
+    def test_trailing_globstar_on_file(self):
+        self.assertEqual(self.glob("gl/a.py/**"), [])
+
+if __name__ == "__main__":
+    unittest.main()
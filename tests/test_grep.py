@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for grep's output of files searched ahead.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+import grep
+
+class ResultTest(unittest.TestCase):
+    def write_all(self, result, count):
+        try:
+            for i in range(count):
+                result.write(b"line\n")
+            result.finish(True)
+        except Exception as err:
+            result.finish(error=err)
+    
+    def test_buffer_is_bounded(self):
+        result = grep._Result(maxsize=50)
+        thread = threading.Thread(target=self.write_all, args=(result, 100))
+        thread.start()
+        time.sleep(0.3)
+        # The search waits until its output has been written
+        self.assertFalse(result.done)
+        self.assertEqual(result.size, 50)
+        out = io.BytesIO()
+        result.drain(out)
+        thread.join()
+        self.assertEqual(out.getvalue(), b"line\n" * 100)
+    
+    def test_cancel(self):
+        result = grep._Result(maxsize=50)
+        thread = threading.Thread(target=self.write_all, args=(result, 100))
+        thread.start()
+        time.sleep(0.3)
+        result.cancel()
+        thread.join()
+        self.assertTrue(result.done)
+        self.assertIsInstance(result.error, grep._Cancelled)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for the command history of the interactive shell.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SH = os.path.join(ROOT, "bin", "sh.py")
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+import _shhistory
+
+class HistoryFileTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="shtest")
+        self.filename = os.path.join(self.dir, "history")
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def read(self):
+        with io.open(self.filename, "r", encoding="utf-8") as f:
+            return f.read().splitlines()
+    
+    def test_non_ascii_line(self):
+        history = _shhistory.History()
+        history.load(self.filename)
+        history.add("echo caf\xe9")
+        history.flush()
+        self.assertEqual(self.read(), ["echo caf\xe9"])
+    
+    def test_non_ascii_input(self):
+        # Lines read by the shell are written in a batch after 20 more
+        lines = ["echo caf\xe9"] + ["echo {}".format(i) for i in range(21)]
+        env = {
+            "HOME": self.dir,
+            "HISTFILE": self.filename,
+            "PATH": "",
+            "PYPATH": os.pathsep.join([os.path.join(ROOT, "bin"), os.path.join(ROOT, "usr", "bin")]),
+            "PYTHONIOENCODING": "utf-8",
+        }
+        proc = subprocess.Popen([sys.executable, SH], cwd=self.dir, env=env, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = proc.communicate("".join(line + "\n" for line in lines).encode("utf-8"))
+        self.assertNotIn(b"UnicodeDecodeError", err)
+        self.assertIn("caf\xe9\n".encode("utf-8"), out)
+        self.assertEqual(self.read(), lines)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for background jobs.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SH = os.path.join(ROOT, "bin", "sh.py")
+
+# Deletes its argument after the shell has changed directory
+SLOWRM = b"""
+import shutil, time
+def main(args):
+    time.sleep(0.5)
+    shutil.rmtree(args[0])
+"""
+
+class JobDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="shtest")
+        for name in ("a", "b"):
+            os.makedirs(os.path.join(self.dir, name, "build"))
+        with io.open(os.path.join(self.dir, "slowrm.py"), "wb") as f:
+            f.write(SLOWRM)
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def run_script(self, script):
+        path = os.path.join(self.dir, "script.sh")
+        with io.open(path, "wb") as f:
+            f.write(script)
+        env = {
+            "HOME": self.dir,
+            "PATH": "",
+            "PYPATH": os.pathsep.join([self.dir, os.path.join(ROOT, "bin"), os.path.join(ROOT, "usr", "bin")]),
+        }
+        proc = subprocess.Popen([sys.executable, SH, path], cwd=self.dir, env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return proc.communicate()
+    
+    def test_cd_while_job_runs(self):
+        out, err = self.run_script(b"cd a\nslowrm build > log.txt &\ncd ../b\npwd\nwait\n")
+        self.assertEqual(out.splitlines()[0], os.path.join(self.dir, "b").encode("utf-8"))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "a", "build")))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "b", "build")))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "a", "log.txt")))
+
+if __name__ == "__main__":
+    unittest.main()
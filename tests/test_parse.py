@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests that compare parse_cmd with the results of the baseline parser
+recorded in parse_corpus.json by make_parse_corpus.py.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, "tests", "parse_corpus.json")
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+import sh
+
+# (expanduser, expandvars) for the option names in the corpus
+OPTIONS = {
+    "user,vars": (True, True),
+    "user": (True, False),
+    "vars": (False, True),
+    "none": (False, False),
+}
+
+with io.open(CORPUS, "rb") as f:
+    corpus = json.load(f)
+
+class ParseCorpusTest(unittest.TestCase):
+    def setUp(self):
+        self.environ = dict(os.environ)
+        os.environ.clear()
+        os.environ.update(corpus["environ"])
+    
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+    
+    def parse(self, line, options):
+        expanduser, expandvars = OPTIONS[options]
+        try:
+            return sh.parse_cmd(line, expanduser, expandvars, doglob=False)
+        except ValueError as err:
+            return "{}: {!s}".format(type(err).__name__, err)
+    
+    def test_cases(self):
+        for case in corpus["cases"]:
+            if "error" in case:
+                for options in OPTIONS:
+                    self.assertEqual(self.parse(case["line"], options), case["error"], (case["line"], options))
+            else:
+                for options, expected in case["results"].items():
+                    self.assertEqual(self.parse(case["line"], options), expected, (case["line"], options))
+    
+    def test_differences(self):
+        # expandvars=False used to drop the tilde expansion as well
+        for case in corpus["differences"]:
+            result = self.parse(case["line"], case["options"])
+            self.assertEqual(result, case["expected"], case["line"])
+            self.assertNotEqual(result, case["baseline"], case["line"])
+
+if __name__ == "__main__":
+    unittest.main()
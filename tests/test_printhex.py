@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for printhex dumps and their conversion back to binary.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+sys.path.insert(0, os.path.join(ROOT, "usr", "bin"))
+import printhex
+
+class UndumpTest(unittest.TestCase):
+    def undump(self, text):
+        out = io.BytesIO()
+        printhex.undump(io.BytesIO(text.encode("utf-8")), out)
+        return out.getvalue()
+    
+    def test_round_trip(self):
+        data = bytes(bytearray(range(256))) + b"|x|"
+        self.assertEqual(self.undump(printhex.dump_block(data, 0)), data)
+    
+    def test_wide_offsets(self):
+        # The offset column is wider from 4 GiB on
+        data = bytes(bytearray(range(48)))
+        for offset in (0xFFFFFFF0, 0xFFFFFFFFF0, 0xFFFFFFFFFFF0):
+            text = printhex.dump_block(data, offset)
+            self.assertIn("0x{:X} | ".format(offset + 16), text)
+            self.assertEqual(self.undump(text), data)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for the argument parser of the commands.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+import _shargs
+
+COMMAND = """
+import _shargs
+parser = _shargs.Parser(description="A command.")
+parser.add_argument("-n", action="store_true")
+"""
+
+class ProgTest(unittest.TestCase):
+    def command_parser(self, filename):
+        namespace = {"__file__": filename}
+        exec(compile(COMMAND, filename, "exec"), namespace)
+        return namespace["parser"]
+    
+    def test_prog_from_file(self):
+        # Commands in pipelines don't set sys.argv
+        parser = self.command_parser("/usr/bin/foo.py")
+        old_argv = sys.argv
+        sys.argv = ["/bin/sh.py"]
+        try:
+            self.assertEqual(parser.argparser().prog, "foo.py")
+            self.assertTrue(parser.argparser().format_usage().startswith("usage: foo.py "))
+        finally:
+            sys.argv = old_argv
+    
+    def test_explicit_prog(self):
+        self.assertEqual(_shargs.Parser(prog="bar").argparser().prog, "bar")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests that run the interactive shell in a pseudo-terminal.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import os
+import select
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+try:
+    import pty
+    import readline
+except ImportError:
+    pty = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SH = os.path.join(ROOT, "bin", "sh.py")
+
+@unittest.skipIf(pty is None, "needs pty and readline")
+class InteractiveTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix="shtest")
+        self.pid, self.fd = pty.fork()
+        if self.pid == 0:
+            os.environ.update({
+                "HOME": self.home,
+                "HISTFILE": "",
+                "PATH": "",
+                "PYPATH": os.pathsep.join([os.path.join(ROOT, "bin"), os.path.join(ROOT, "usr", "bin")]),
+            })
+            os.execv(sys.executable, [sys.executable, SH])
+        self.output = b""
+        self.read(1.0)
+    
+    def tearDown(self):
+        try:
+            os.kill(self.pid, 9)
+        except OSError:
+            pass
+        os.waitpid(self.pid, 0)
+        os.close(self.fd)
+        shutil.rmtree(self.home)
+    
+    def read(self, seconds):
+        end = time.time() + seconds
+        while time.time() < end:
+            if select.select([self.fd], [], [], 0.1)[0]:
+                try:
+                    self.output += os.read(self.fd, 4096)
+                except OSError:
+                    return
+    
+    def type(self, keys, seconds=1.0):
+        os.write(self.fd, keys)
+        self.read(seconds)
+    
+    def test_tab_completes_command(self):
+        self.type(b"echo first\n")
+        self.type(b"histo\t\n")
+        # history ran and shows the completed line
+        self.assertIn(b"2  history", self.output)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+########################################################################.......
+
+"""Tests for the file system engine shared by cp, mv and rm.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "bin"))
+import _shfs
+
+def _fail():
+    raise OSError("unrelated task failed")
+
+class SharedPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="shtest")
+        self.src = os.path.join(self.dir, "src")
+        os.makedirs(os.path.join(self.src, "sub"))
+        for name in ("a", os.path.join("sub", "b")):
+            with io.open(os.path.join(self.src, name), "wb") as f:
+                f.write(b"data\n")
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def test_move_tree_ignores_other_errors(self):
+        # mv moves single files on the same pool before the trees
+        with _shfs.WorkerPool(2) as pool:
+            pool.submit(_fail)
+            pool.wait()
+            dst = os.path.join(self.dir, "dst")
+            self.assertEqual(_shfs.move_tree(self.src, dst, pool, _shfs.Progress()), 0)
+            self.assertEqual(len(pool.errors), 1)
+        self.assertFalse(os.path.exists(self.src))
+        self.assertTrue(os.path.isfile(os.path.join(dst, "sub", "b")))
+
+if __name__ == "__main__":
+    unittest.main()
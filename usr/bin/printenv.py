@@ -6,15 +6,17 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import os
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("variables", action="store", nargs="*",
+                    help="variables to be printed")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("variables", action="store", nargs="*",
-                   help="variables to be printed")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     print(ns.variables)
     
@@ -1,41 +1,115 @@
 #!/usr/bin/env python
 ########################################################################.......
 
-"""Print the given files' content and hexadecimal byte values.
+"""Print the given files' content and hexadecimal byte values. With no
+files, or when a file is -, stdin is read.
 """
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
+import binascii
 import sys
 
+import _shargs
+
 INVISIBLE = range(0x20) + [0x81, 0x8d, 0x8f, 0x90, 0x9d]
+# Maps invisible bytes to ? and leaves all others unchanged
+VISIBLE = bytes(bytearray(ord("?") if i in INVISIBLE else i for i in range(256)))
+
+BLOCKSIZE = 64 * 1024 # Bytes dumped at once, must be a multiple of 16
+LINEFORMAT = "0x%08X | %-48s | %-16s\n"
+
+def dump_block(block, offset):
+    """Return the dump of block, which starts at offset, as a string of
+    lines.
+    """
+    
+    # Hex bytes separated by spaces, without formatting every byte
+    hexed = binascii.hexlify(block).upper()
+    spaced = bytearray(len(block) * 3)
+    spaced[0::3] = hexed[0::2]
+    spaced[1::3] = hexed[1::2]
+    spaced[2::3] = b" " * len(block)
+    spaced = spaced.decode("ascii")
+    
+    # Decoding as Latin-1 to get a visual representation for most
+    # bytes that would otherwise be non-printable.
+    text = block.translate(VISIBLE).decode("windows-1252")
+    
+    return "".join([LINEFORMAT % (offset + i, spaced[i*3:i*3+47], text[i:i+16])
+                    for i in range(0, len(block), 16)])
+
+def dump(f, out, skip=0, length=None):
+    """Write the dump of file f to out, starting at offset skip and
+    ending after length bytes, or at the end of the file.
+    """
+    
+    if skip:
+        try:
+            f.seek(skip)
+        except (AttributeError, IOError):
+            # Not seekable, read up to the offset instead
+            remaining = skip
+            while remaining > 0:
+                skipped = len(f.read(min(remaining, BLOCKSIZE)))
+                if not skipped:
+                    break
+                remaining -= skipped
+    
+    offset = skip
+    while length is None or offset - skip < length:
+        size = BLOCKSIZE if length is None else min(BLOCKSIZE, skip + length - offset)
+        block = f.read(size)
+        if not block:
+            break
+        out.write(dump_block(block, offset))
+        offset += len(block)
+
+def undump(f, out):
+    """Convert the dump in file f back to binary and write it to out.
+    Lines that are not part of a dump are ignored.
+    """
+    
+    lines = []
+    for line in f:
+        # The offset widens past 8 digits at 4 GiB, so the hex bytes are
+        # found by the separators, not by their column
+        fields = line.split(b"|", 2)
+        if line.startswith(b"0x") and len(fields) == 3:
+            lines.append(fields[1].replace(b" ", b""))
+        if len(lines) >= BLOCKSIZE // 16:
+            out.write(binascii.unhexlify(b"".join(lines)))
+            lines = []
+    out.write(binascii.unhexlify(b"".join(lines)))
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("-s", "--skip", action="store", default=0, type=lambda s: int(s, 0),
+                    help="start at this byte offset (decimal or 0x hex)")
+parser.add_argument("-n", "--length", action="store", default=None, type=lambda s: int(s, 0),
+                    help="dump at most this many bytes")
+parser.add_argument("-r", "--reverse", action="store_true",
+                    help="convert a dump back to binary")
+parser.add_argument("file", action="store", nargs="*", default=["-"], type=unicode,
+                    help="files to be printed, defaults to stdin")
 
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("file", action="store", nargs="+", type=unicode,
-                   help="one or more files to be printed")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     status = 0
     
     for filename in ns.file:
         try:
-            with open(filename, "rb") as f:
-                i = 0
-                chunk = f.read(16)
-                while chunk:
-                    # Decoding as Latin-1 to get a visual representation for most
-                    # bytes that would otherwise be non-printable.
-                    strchunk = "".join("?" if ord(c) in INVISIBLE else c.decode("windows-1252")
-                                       for c in chunk)
-                    hexchunk = " ".join("{:0>2X}".format(ord(c)) for c in chunk)
-                    print("0x{:>08X} | {:<48} | {:<16}".format(i, hexchunk, strchunk))
-                    i += 16
-                    chunk = f.read(16)
-                
+            f = sys.stdin if filename == "-" else open(filename, "rb")
+            try:
+                if ns.reverse:
+                    undump(f, sys.stdout)
+                else:
+                    dump(f, sys.stdout, ns.skip, ns.length)
+            finally:
+                if f is not sys.stdin:
+                    f.close()
         except Exception as err:
-            print("cat: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
+            print("printhex: {}: {!s}".format(type(err).__name__, err), file=sys.stderr)
             status = 1
     
     sys.exit(status)
@@ -6,14 +6,16 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import console
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("image", action="store", help="image to show")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("image", action="store", help="image to show")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     console.show_image(ns.image)
     
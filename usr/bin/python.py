@@ -6,11 +6,20 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import code
-import os
 import sys
 
+import _shargs
+import _shcache
+
+parser = _shargs.Parser(description=__doc__)
+# file and args are not actually used and are added only to generate
+# a meaningful help message.
+parser.add_argument("file", action="store", nargs="?", default="", type=unicode,
+                    help="script to be executed")
+parser.add_argument("args", action="store", nargs="*", default=[], type=unicode,
+                    help="script runtime arguments")
+
 def main(args):
     # Need to split args between python command and script runtime args
     # because otherwise argparse will process the script's flags as well.
@@ -22,14 +31,7 @@ def main(args):
             script_args = args[i:]
             break
     
-    p = argparse.ArgumentParser(description=__doc__)
-    # file and args are not actually used and are added only to generate
-    # a meaningful help message.
-    p.add_argument("file", action="store", nargs="?", default="", type=unicode,
-                   help="script to be executed")
-    p.add_argument("args", action="store", nargs="*", default=[], type=unicode,
-                   help="script runtime arguments")
-    ns = p.parse_args(python_args)
+    ns = parser.parse_args(python_args)
     
     status = 0
     
@@ -38,10 +40,8 @@ def main(args):
         try:
             sys.argv = script_args
             pyfile = script_args[0]
-            with open(pyfile, "rU") as f:
-                scriptcode = compile(f.read(), os.path.abspath(pyfile),
-                                        "exec", dont_inherit=True)
-                exec(scriptcode, {"__name__": "__main__"})
+            scriptcode = _shcache.compile_file(pyfile)
+            exec(scriptcode, {"__name__": "__main__"})
         except SystemExit as ex:
             status = ex.code
         except BaseException as err:
@@ -6,14 +6,16 @@
 
 from __future__ import division, print_function, unicode_literals
 
-import argparse
 import console
 import sys
 
+import _shargs
+
+parser = _shargs.Parser(description=__doc__)
+parser.add_argument("file", action="store", help="file to open")
+
 def main(args):
-    p = argparse.ArgumentParser(description=__doc__)
-    p.add_argument("file", action="store", help="file to open")
-    ns = p.parse_args(args)
+    ns = parser.parse_args(args)
     
     console.quicklook(ns.file)
     